@@ -0,0 +1,81 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import firebase_admin
+from firebase_admin import auth as firebase_auth
+
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", 10000))
+# Google rotates the signing certificates every few hours and serves them with a max-age,
+# refreshing well inside that keeps cert fetches off the request path
+AUTH_CERT_REFRESH_SECONDS = int(os.getenv("AUTH_CERT_REFRESH_SECONDS", 30 * 60))
+# Retry a failed fetch sooner, the API isn't ready until one succeeded
+AUTH_CERT_RETRY_SECONDS = int(os.getenv("AUTH_CERT_RETRY_SECONDS", 10))
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_prefetch_thread = None
+_certs_fetched_at = 0.0
+
+
+def _token_key(id_token: str) -> str:
+    # Never keep raw bearer tokens around in memory longer than needed
+    return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+
+def verify_id_token(id_token: str):
+    """Verify a Firebase ID token, answering repeat tokens from memory until they expire"""
+    key = _token_key(id_token)
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            decoded, expires_at = entry
+            if now < expires_at:
+                _cache.move_to_end(key)
+                return decoded
+            del _cache[key]
+
+    decoded = firebase_auth.verify_id_token(id_token)
+
+    with _lock:
+        _cache[key] = (decoded, decoded.get('exp', now))
+        _cache.move_to_end(key)
+        while len(_cache) > AUTH_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return decoded
+
+
+def _prefetch_certs():
+    # firebase_admin fetches the public certs through a cache-control aware session,
+    # requesting them here fills that cache before a user request has to wait on it
+    from firebase_admin import _token_gen
+
+    client = firebase_auth._get_client(firebase_admin.get_app())
+    client._token_verifier.request(_token_gen.ID_TOKEN_CERT_URI)
+
+
+def _prefetch_loop():
+    global _certs_fetched_at
+    while True:
+        try:
+            _prefetch_certs()
+            _certs_fetched_at = time.time()
+        except Exception as e:
+            print(f"Warning: Failed to prefetch Firebase auth certificates: {e}")
+            time.sleep(AUTH_CERT_RETRY_SECONDS)
+            continue
+        time.sleep(AUTH_CERT_REFRESH_SECONDS)
+
+
+def start_cert_prefetch():
+    global _prefetch_thread
+    if _prefetch_thread is None:
+        _prefetch_thread = threading.Thread(target=_prefetch_loop, name="auth-cert-prefetch", daemon=True)
+        _prefetch_thread.start()
+
+
+def certs_ready():
+    """Whether the public certs have been fetched, so token checks don't wait on Google"""
+    return _certs_fetched_at > 0
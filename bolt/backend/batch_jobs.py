@@ -0,0 +1,109 @@
+import os
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from llm_engine import generate_manim_code
+from llm_client import LLM_API_CONCURRENCY
+from job_queue import submit_render_job, get_job, scheduler
+from scene_validator import SceneValidationError
+import quota
+
+# Most prompts accepted in one POST /generate/batch
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", 30))
+# Batch renders of one user that may run at the same time, 0 means as many as there are idle workers
+BATCH_MAX_INFLIGHT = int(os.getenv("BATCH_MAX_INFLIGHT", 0))
+
+# generate_manim_code blocks on the API process's LLM client, whose semaphore and token bucket
+# keep the fan-out within its share of the Gemini rate limit. One thread per request it lets through.
+_llm_threads = ThreadPoolExecutor(max_workers=LLM_API_CONCURRENCY, thread_name_prefix="batch-llm")
+# Items keep going when the client disconnects, their generations are already paid for
+_running = set()
+
+
+def _item_result(index: int, job_id: str, job: dict):
+    job = job or {}
+    result = {
+        "index": index,
+        "job_id": job_id,
+        "status": job.get("status", "failed"),
+        "scene_file_id": job.get("scene_file_id"),
+    }
+    for field in ("video_url", "manifest_url", "poster_url", "upgrade", "error", "kill_reason", "validation_errors"):
+        if job.get(field):
+            result[field] = job[field]
+    return result
+
+
+async def _run_item(batch_id: str, index: int, uid: str, prompt: str, account_type: str,
+                    use_cache: bool, events: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    try:
+        code = await loop.run_in_executor(_llm_threads, generate_manim_code, prompt, use_cache)
+    except SceneValidationError as e:
+        # Same as a single generation: code that can't render doesn't count against the limit
+        await asyncio.to_thread(quota.refund, uid)
+        events.put_nowait({"index": index, "status": "failed", "code": "INVALID_SCENE",
+                           "error": str(e), "validation_errors": e.errors})
+        return
+    except Exception as e:
+        print(f"Batch {batch_id} item {index} failed: {str(e)}")
+        events.put_nowait({"index": index, "status": "failed", "error": str(e)})
+        return
+
+    async def finished(job_id: str):
+        job = await asyncio.to_thread(get_job, uid, job_id)
+        events.put_nowait(_item_result(index, job_id, job))
+
+    def on_finished(job_id: str):
+        # Called from the worker pool's callback thread
+        loop.call_soon_threadsafe(lambda: _track(loop.create_task(finished(job_id))))
+
+    try:
+        job_id, scene_file_id, wait = await asyncio.to_thread(
+            submit_render_job, uid, code, None, account_type, prompt,
+            on_finished=on_finished, batch_id=batch_id,
+            max_inflight=BATCH_MAX_INFLIGHT or None,
+        )
+    except Exception as e:
+        print(f"Batch {batch_id} item {index} could not be queued: {str(e)}")
+        events.put_nowait({"index": index, "status": "failed", "error": str(e)})
+        return
+    events.put_nowait({"index": index, "job_id": job_id, "status": "queued",
+                       "scene_file_id": scene_file_id, "estimated_wait": wait})
+
+
+def max_prompts():
+    """Most prompts one batch may have, every item must fit in the background queue at once"""
+    return min(BATCH_MAX_PROMPTS, scheduler.max_background_depth)
+
+
+def _track(task: asyncio.Task):
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+def start_batch(uid: str, prompts: list, account_type: str, use_cache: bool = True):
+    """Start generating and rendering every prompt concurrently, on the running event loop.
+
+    Returns (batch_id, updates): an async iterator of per item updates in the order they
+    happen. Each item reports "queued" once its code is generated and its render queued,
+    then its final job state ("done", "failed", "killed"), or just "failed" if generation
+    failed. The quota must already be charged for len(prompts).
+    """
+    batch_id = str(uuid.uuid4())[:8]
+    events = asyncio.Queue()
+    for index, prompt in enumerate(prompts):
+        _track(asyncio.create_task(_run_item(batch_id, index, uid, prompt, account_type, use_cache, events)))
+
+    async def updates():
+        pending = set(range(len(prompts)))
+        while pending:
+            event = await events.get()
+            if event["index"] not in pending:
+                # A cached render can finish before its "queued" update is posted
+                continue
+            if event["status"] != "queued":
+                pending.discard(event["index"])
+            yield event
+
+    return batch_id, updates()
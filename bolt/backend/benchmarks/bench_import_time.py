@@ -0,0 +1,102 @@
+"""Measure how long importing the API takes in a fresh interpreter, the floor of every cold start.
+
+Each run imports main in a new process with `python -X importtime`, using a throwaway
+service account key, so nothing needs credentials or network (importing main must not
+touch the network). Reports the import time across runs and the slowest modules.
+
+Usage (from bolt/backend):
+    python benchmarks/bench_import_time.py --runs 5 --top 15
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_service_account(path: str):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption()).decode("ascii")
+    with open(path, "w") as f:
+        json.dump({
+            "type": "service_account",
+            "project_id": "bench",
+            "private_key_id": "bench",
+            "private_key": pem,
+            "client_email": "bench@bench.iam.gserviceaccount.com",
+            "client_id": "0",
+            "token_uri": "https://oauth2.googleapis.com/token",
+        }, f)
+
+
+def parse_importtime(stderr: str):
+    """{module: (self us, cumulative us)} from -X importtime output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def import_once(env: dict):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Importing main failed:\n{result.stderr[-4000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="how many of the slowest modules to list")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    try:
+        key_path = os.path.join(workdir, "serviceAccountKey.json")
+        write_service_account(key_path)
+        env = dict(os.environ, FIREBASE_CREDENTIALS=key_path, RAZORPAY_KEY_ID="rzp_bench",
+                   RAZORPAY_KEY_SECRET="bench", GEMINI_API_KEY="bench",
+                   PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, "metrics"))
+        os.makedirs(env["PROMETHEUS_MULTIPROC_DIR"])
+
+        runs = [import_once(env) for _ in range(args.runs)]
+        totals = [run["main"][1] / 1000 for run in runs]
+        print(f"import main over {args.runs} runs: median {statistics.median(totals):.1f} ms, "
+              f"min {min(totals):.1f} ms, max {max(totals):.1f} ms")
+
+        # Median self time per module, the cost each one adds on top of its imports
+        names = set().union(*runs)
+        self_ms = {name: statistics.median(run[name][0] for run in runs if name in run) / 1000 for name in names}
+        cumulative_ms = {name: statistics.median(run[name][1] for run in runs if name in run) / 1000
+                         for name in names}
+        print(f"\nslowest {args.top} top-level modules (cumulative ms):")
+        top_level = {name: ms for name, ms in cumulative_ms.items() if "." not in name and name != "main"}
+        for name, ms in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {ms:8.1f}  {name}")
+        print(f"\nslowest {args.top} modules (self ms):")
+        for name, ms in sorted(self_ms.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {ms:8.1f}  {name}")
+
+        # Only needed on first use, none of these should load with the app
+        print()
+        for heavy in ("razorpay", "google.cloud.storage", "manim"):
+            print(f"{heavy} imported: {'yes' if heavy in names else 'no'}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
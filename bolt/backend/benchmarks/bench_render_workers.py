@@ -0,0 +1,104 @@
+"""Compare wall time of rendering short scenes through the manim CLI vs a warm render worker.
+
+Usage (from bolt/backend):
+    python benchmarks/bench_render_workers.py --runs 5 --quality low_quality
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render_worker import WarmRenderer
+
+SCENE_CODE = """
+from manim import *
+
+class MorphScene(Scene):
+    def construct(self):
+        circle = Circle()
+        self.play(Create(circle))
+        square = Square()
+        self.play(Transform(circle, square))
+        self.wait(0.5)
+"""
+
+CLI_FLAGS = {
+    'low_quality': '-ql',
+    'medium_quality': '-qm',
+    'high_quality': '-qh',
+    'production_quality': '-qp',
+    'fourk_quality': '-qk',
+}
+
+
+def _write_scene(workdir: str, i: int):
+    path = os.path.join(workdir, f"scene_bench_{i}.py")
+    with open(path, "w") as f:
+        f.write(SCENE_CODE)
+    return path
+
+
+def bench_cli(workdir: str, runs: int, quality: str):
+    times = []
+    for i in range(runs):
+        path = _write_scene(workdir, i)
+        start = time.perf_counter()
+        subprocess.run(
+            ["manim", path, "MorphScene", CLI_FLAGS[quality], "--media_dir", os.path.join(workdir, "media_cli")],
+            check=True,
+            capture_output=True,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_warm(workdir: str, runs: int, quality: str):
+    renderer = WarmRenderer()
+    # Startup is paid once per worker lifetime, not per job, so keep it out of the per-job numbers
+    start = time.perf_counter()
+    renderer.start()
+    startup = time.perf_counter() - start
+
+    times = []
+    try:
+        for i in range(runs):
+            path = _write_scene(workdir, runs + i)
+            start = time.perf_counter()
+            renderer.render(path, "MorphScene", quality, os.path.join(workdir, "media_warm"))
+            times.append(time.perf_counter() - start)
+    finally:
+        renderer.stop()
+    return startup, times
+
+
+def _summary(times):
+    return f"mean {statistics.mean(times):.2f}s  median {statistics.median(times):.2f}s  min {min(times):.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--quality", default="low_quality", choices=sorted(CLI_FLAGS))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        cli_times = bench_cli(workdir, args.runs, args.quality)
+        startup, warm_times = bench_warm(workdir, args.runs, args.quality)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.runs} renders at {args.quality}")
+    print(f"  cli : {_summary(cli_times)}")
+    print(f"  warm: {_summary(warm_times)}  (one-off worker startup {startup:.2f}s)")
+    print(f"  speedup (median): {statistics.median(cli_times) / statistics.median(warm_times):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
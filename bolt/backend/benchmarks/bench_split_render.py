@@ -0,0 +1,102 @@
+"""Compare wall time of rendering one long scene in a single warm worker vs split across processes.
+
+Renders the same scene once unsplit and once per process count, and checks that every
+split render decodes to the same frames as the unsplit one (ffmpeg framemd5).
+
+Usage (from bolt/backend):
+    python benchmarks/bench_split_render.py --animations 24 --quality high_quality --processes 2,4,8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import split_render
+from render_worker import get_renderer
+
+SCENE_HEADER = """
+from manim import *
+
+class LongScene(Scene):
+    def construct(self):
+        shape = Square(color=BLUE)
+        self.play(Create(shape))
+"""
+
+# One step of the scene, repeated --animations times
+SCENE_STEP = """
+        self.play(shape.animate.rotate(PI / 3).shift(RIGHT * {dx}).set_color({color}), run_time={run_time})
+        self.play(Transform(shape, {target}(color={color}).shift(LEFT * {dx})), run_time={run_time})
+"""
+
+COLORS = ["RED", "GREEN", "YELLOW", "PURPLE", "ORANGE", "TEAL"]
+TARGETS = ["Circle", "Square", "Triangle", "RegularPolygon"]
+
+
+def write_scene(workdir: str, animations: int, run_time: float):
+    lines = [SCENE_HEADER]
+    for i in range(max(1, animations // 2)):
+        lines.append(SCENE_STEP.format(dx=(-1) ** i * 0.5, color=COLORS[i % len(COLORS)],
+                                       target=TARGETS[i % len(TARGETS)], run_time=run_time))
+    path = os.path.join(workdir, "scene_split_bench.py")
+    with open(path, "w") as f:
+        f.write("".join(lines))
+    return path
+
+
+def framemd5(path: str):
+    result = subprocess.run(["ffmpeg", "-loglevel", "error", "-i", path, "-map", "0:v", "-f", "framemd5", "-"],
+                            capture_output=True, text=True, check=True)
+    return [line.rsplit(",", 1)[-1].strip() for line in result.stdout.splitlines() if not line.startswith("#")]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--animations", type=int, default=24)
+    parser.add_argument("--run-time", type=float, default=1.0, help="seconds per animation")
+    parser.add_argument("--quality", default="high_quality")
+    parser.add_argument("--processes", default=",".join(str(n) for n in (2, 4, 8) if n <= (os.cpu_count() or 1)),
+                        help="comma separated process counts to try")
+    parser.add_argument("--min-seconds", type=float, default=0, help="RENDER_SPLIT_MIN_SECONDS for the runs")
+    args = parser.parse_args()
+    counts = [int(n) for n in args.processes.split(",") if n]
+
+    workdir = tempfile.mkdtemp(prefix="bench_split_")
+    try:
+        path = write_scene(workdir, args.animations, args.run_time)
+        # Start every renderer up front, worker startup isn't part of a render
+        for renderer in split_render._renderers(max(counts + [1])):
+            renderer.start()
+
+        # Each run gets a fresh media dir so no run reuses another's partial movie files
+        baseline, movie = timed(get_renderer().render, path, "LongScene", args.quality,
+                                os.path.join(workdir, "media_single"))
+        reference = framemd5(movie)
+        print(f"{args.animations} animations of {args.run_time:g}s at {args.quality}, {os.cpu_count()} cores")
+        print(f"  1 process : {baseline:7.2f}s")
+
+        for n in counts:
+            elapsed, movie = timed(split_render.render, path, "LongScene", args.quality,
+                                   os.path.join(workdir, f"media_split{n}"), processes=n, min_seconds=args.min_seconds)
+            same = framemd5(movie) == reference
+            print(f"  {n} processes: {elapsed:7.2f}s  speedup {baseline / elapsed:5.2f}x  "
+                  f"(frames {'identical' if same else 'DIFFER'})")
+    finally:
+        for renderer in split_render._renderers(len(split_render._helpers) + 1):
+            renderer.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
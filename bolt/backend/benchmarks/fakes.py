@@ -0,0 +1,471 @@
+"""Offline stand-ins for Firebase, Gemini, Razorpay and manim used by the load test.
+
+install() must run before main (or anything importing firebase_config) is imported:
+it points the backend at an in-memory Realtime Database and Storage bucket, a stub
+Gemini server and a renderer that only sleeps, so the request paths can be measured
+without credentials or network.
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCENE_TEMPLATE = """from manim import *
+
+class MorphScene(Scene):
+    def construct(self):
+        label = Text("bench {n}")
+        circle = Circle()
+        self.play(Create(circle), Write(label))
+        self.play(Transform(circle, Square()))
+        self.wait(0.5)
+"""
+
+
+def _copy(value):
+    # Round trip through JSON like the real database does, so non-JSON values fail here too
+    return None if value is None else json.loads(json.dumps(value))
+
+
+def _etag(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _split(path: str):
+    return [part for part in (path or "").split("/") if part]
+
+
+def _order_key(item, child):
+    key, value = item
+    value = value.get(child) if isinstance(value, dict) and child else value
+    # Realtime Database ordering: missing, false, true, numbers, strings, objects
+    if value is None:
+        return (0, 0, key)
+    if isinstance(value, bool):
+        return (1, int(value), key)
+    if isinstance(value, (int, float)):
+        return (2, value, key)
+    if isinstance(value, str):
+        return (3, value, key)
+    return (4, 0, key)
+
+
+class FakeDatabase:
+    """In-memory Realtime Database with the Reference surface the backend uses"""
+
+    def __init__(self, latency: float = 0.0):
+        # Seconds slept per operation to stand in for the round trip to Firebase
+        self.latency = latency
+        self.root = {}
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def reference(self, path: str = "/", url=None, app=None):
+        return FakeReference(self, _split(path))
+
+    def reset_counters(self):
+        with self._lock:
+            self.reads = 0
+            self.writes = 0
+
+    def _wait(self, write: bool):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            if write:
+                self.writes += 1
+            else:
+                self.reads += 1
+
+    def _get(self, parts):
+        node = self.root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            node = child
+        if value is None or value == {}:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+        self._prune(parts[:-1])
+
+    def _prune(self, parts):
+        # Empty objects don't exist in the real database
+        while parts and self._get(parts) == {}:
+            parent = self._get(parts[:-1])
+            parent.pop(parts[-1], None)
+            parts = parts[:-1]
+
+    def _resolve(self, parts, value):
+        """Apply server values ({'.sv': {'increment': n}}) against the current data"""
+        if isinstance(value, dict):
+            increment = value.get(".sv", {}).get("increment") if isinstance(value.get(".sv"), dict) else None
+            if increment is not None:
+                current = self._get(parts)
+                return (current if isinstance(current, (int, float)) else 0) + increment
+            return {k: self._resolve(parts + [k], v) for k, v in value.items()}
+        return value
+
+
+class FakeReference:
+    def __init__(self, database: FakeDatabase, parts):
+        self._db = database
+        self._parts = parts
+
+    @property
+    def key(self):
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self):
+        return "/" + "/".join(self._parts)
+
+    def child(self, path: str):
+        return FakeReference(self._db, self._parts + _split(path))
+
+    def get(self, etag: bool = False, shallow: bool = False):
+        self._db._wait(write=False)
+        with self._db._lock:
+            value = _copy(self._db._get(self._parts))
+        if shallow and isinstance(value, dict):
+            value = {k: (True if isinstance(v, dict) else v) for k, v in value.items()}
+        if etag:
+            return value, _etag(value)
+        return value
+
+    def set(self, value):
+        self._db._wait(write=True)
+        with self._db._lock:
+            self._db._set(self._parts, self._db._resolve(self._parts, _copy(value)))
+
+    def update(self, value: dict):
+        if not value:
+            raise ValueError("Dictionary must not be empty")
+        self._db._wait(write=True)
+        with self._db._lock:
+            for path, child_value in value.items():
+                parts = self._parts + _split(path)
+                self._db._set(parts, self._db._resolve(parts, _copy(child_value)))
+
+    def delete(self):
+        self._db._wait(write=True)
+        with self._db._lock:
+            self._db._set(self._parts, None)
+
+    def push(self, value=""):
+        key = f"-bench{time.time_ns():x}"
+        ref = self.child(key)
+        ref.set(value)
+        return ref
+
+    def transaction(self, transaction_update):
+        self._db._wait(write=True)
+        with self._db._lock:
+            new_value = transaction_update(_copy(self._db._get(self._parts)))
+            self._db._set(self._parts, _copy(new_value))
+        return new_value
+
+    def set_if_unchanged(self, expected_etag: str, value):
+        self._db._wait(write=True)
+        with self._db._lock:
+            current = _copy(self._db._get(self._parts))
+            if _etag(current) != expected_etag:
+                return False, current, _etag(current)
+            value = _copy(value)
+            self._db._set(self._parts, value)
+            return True, value, _etag(value)
+
+    def order_by_child(self, path: str):
+        return FakeQuery(self, path)
+
+    def order_by_key(self):
+        return FakeQuery(self, None)
+
+
+class FakeQuery:
+    def __init__(self, ref: FakeReference, child):
+        self._ref = ref
+        self._child = child
+        self._start = None
+        self._end = None
+        self._first = None
+        self._last = None
+
+    def start_at(self, value):
+        self._start = value
+        return self
+
+    def end_at(self, value):
+        self._end = value
+        return self
+
+    def equal_to(self, value):
+        self._start = self._end = value
+        return self
+
+    def limit_to_first(self, limit: int):
+        self._first = limit
+        return self
+
+    def limit_to_last(self, limit: int):
+        self._last = limit
+        return self
+
+    def get(self):
+        value = self._ref.get()
+        if not isinstance(value, dict):
+            return None
+        items = sorted(value.items(), key=lambda item: _order_key(item, self._child))
+
+        def ordered(item):
+            key, child_value = item
+            return child_value.get(self._child) if isinstance(child_value, dict) and self._child else key
+
+        if self._start is not None:
+            items = [item for item in items if ordered(item) is not None and ordered(item) >= self._start]
+        if self._end is not None:
+            items = [item for item in items if ordered(item) is None or ordered(item) <= self._end]
+        if self._first is not None:
+            items = items[:self._first]
+        if self._last is not None:
+            items = items[-self._last:] if self._last else []
+        return dict(items) or None
+
+
+class FakeBlob:
+    def __init__(self, bucket, name: str, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.metadata = None
+        self.content_type = None
+        self.cache_control = None
+
+    def exists(self):
+        return self.name in self.bucket.objects
+
+    def reload(self):
+        _, self.metadata, self.content_type = self.bucket.objects[self.name]
+
+    def upload_from_string(self, data, content_type=None, if_generation_match=None):
+        from google.api_core.exceptions import PreconditionFailed
+
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.bucket.lock:
+            if if_generation_match == 0 and self.name in self.bucket.objects:
+                raise PreconditionFailed("Object already exists")
+            self.bucket.objects[self.name] = (data, dict(self.metadata or {}), content_type or self.content_type)
+
+    def upload_from_filename(self, filename: str, content_type=None, if_generation_match=None):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type, if_generation_match)
+
+    def download_as_bytes(self):
+        return self.bucket.objects[self.name][0]
+
+    def delete(self):
+        self.bucket.objects.pop(self.name, None)
+
+    @property
+    def public_url(self):
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}"
+
+
+class FakeBucket:
+    """In-memory Storage bucket, objects are (bytes, metadata, content_type)"""
+
+    def __init__(self, name: str = "bench-bucket"):
+        self.name = name
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def blob(self, name: str, chunk_size=None):
+        return FakeBlob(self, name, chunk_size)
+
+
+class FakeRenderer:
+    """Stands in for a warm manim process: sleeps, then writes a placeholder video"""
+
+    def __init__(self, seconds: float = 1.0, video_bytes: int = 256 * 1024):
+        self.seconds = seconds
+        self.video_bytes = video_bytes
+
+    def render(self, file_path: str, scene_name: str, quality: str, media_dir: str, on_start=None):
+        # No process of its own to report to on_start, so bench renders can't be killed
+        time.sleep(self.seconds)
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        video_dir = os.path.join(media_dir, "videos", stem, quality)
+        os.makedirs(video_dir, exist_ok=True)
+        video_path = os.path.join(video_dir, f"{scene_name}.mp4")
+        with open(video_path, "wb") as f:
+            f.write(os.urandom(self.video_bytes))
+        return video_path
+
+
+class _FakeRazorpayResource:
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    def fetch(self, resource_id, *args, **kwargs):
+        return {"id": resource_id, "entity": self.kind, "status": "active"}
+
+    def create(self, data=None, *args, **kwargs):
+        return {"id": f"{self.kind}_bench{time.time_ns():x}", "entity": self.kind, "status": "created", **(data or {})}
+
+    def cancel(self, resource_id, *args, **kwargs):
+        return {"id": resource_id, "entity": self.kind, "status": "cancelled"}
+
+
+class FakeRazorpayClient:
+    def __init__(self, auth=None, **kwargs):
+        self.plan = _FakeRazorpayResource("plan")
+        self.order = _FakeRazorpayResource("order")
+        self.subscription = _FakeRazorpayResource("subscription")
+        self.payment = _FakeRazorpayResource("payment")
+
+
+def verify_bench_token(id_token: str, *args, **kwargs):
+    """Tokens are "bench:<uid>", standing in for Firebase ID tokens"""
+    if not id_token.startswith("bench:"):
+        raise ValueError("Not a bench token")
+    return {"uid": id_token[len("bench:"):], "exp": time.time() + 3600}
+
+
+class StubGeminiServer:
+    """Answers generateContent/streamGenerateContent with a valid scene after a fixed latency"""
+
+    def __init__(self, latency: float = 1.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.requests += 1
+                    code = SCENE_TEMPLATE.format(n=stub.requests)
+
+                if ":streamGenerateContent" in self.path:
+                    self._stream(code)
+                    return
+
+                time.sleep(stub.latency)
+                body = json.dumps(_candidate(f"```python\n{code}```")).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, code: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                lines = f"```python\n{code}```".splitlines(keepends=True)
+                for line in lines:
+                    time.sleep(stub.latency / len(lines))
+                    self.wfile.write(f"data: {json.dumps(_candidate(line))}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.close_connection = True
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-gemini", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _candidate(text: str):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class FakeBackend:
+    def __init__(self, database, bucket, renderer, executor):
+        self.database = database
+        self.bucket = bucket
+        self.renderer = renderer
+        self.executor = executor
+
+
+def install(workdir: str, gemini_base_url: str, db_latency: float = 0.0, render_seconds: float = 1.0,
+            video_bytes: int = 256 * 1024, max_workers: int = 4):
+    """Patch the backend's external services with the fakes above and return them"""
+    os.environ.update({
+        "GEMINI_API_KEY": "bench",
+        "GEMINI_BASE_URL": gemini_base_url,
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite3"),
+        "RAZORPAY_KEY_ID": "rzp_bench",
+        "RAZORPAY_KEY_SECRET": "bench",
+        "RENDER_BACKEND": "warm",
+        "RENDER_WORKSPACE_DIR": os.path.join(workdir, "render_workspaces"),
+        "VIDEO_STORE": "firebase",
+        "MAX_CONCURRENT_RENDERS": str(max_workers),
+    })
+
+    import razorpay
+    import firebase_admin
+    from firebase_admin import auth, credentials, db, storage
+
+    database = FakeDatabase(db_latency)
+    bucket = FakeBucket()
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    credentials.Certificate = lambda *args, **kwargs: None
+    db.reference = database.reference
+    storage.bucket = lambda name=None, app=None: bucket
+    auth.verify_id_token = verify_bench_token
+    razorpay.Client = FakeRazorpayClient
+
+    import video_upload
+    import manim_engine
+    import job_queue
+    import auth_cache
+
+    # The placeholder videos aren't real MP4s, skip the ffmpeg remux
+    video_upload.faststart = lambda video_path: video_path
+    renderer = FakeRenderer(render_seconds, video_bytes)
+    manim_engine.get_renderer = lambda: renderer
+    # Spawned job processes wouldn't see any of these patches, run jobs on threads instead
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bench-job")
+    job_queue.get_executor = lambda: executor
+    auth_cache._prefetch_certs = lambda: None
+
+    return FakeBackend(database, bucket, renderer, executor)
@@ -0,0 +1,279 @@
+"""Drive the API at a fixed request rate against offline fakes and report latency.
+
+Firebase (Realtime Database, Storage, Auth), Gemini, Razorpay and manim are replaced by
+the stand-ins in benchmarks/fakes.py, so this runs without credentials or network. Requests
+go straight into the ASGI app on this process's event loop, which is also where the
+event-loop lag is sampled.
+
+Usage (from bolt/backend):
+    python benchmarks/load_test.py --rps 20 --duration 30
+    python benchmarks/load_test.py --mix generate=0,code=0,my-codes=1,usage-stats=1 --db-latency-ms 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import contextlib
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import fakes
+
+DEFAULT_MIX = "generate=1,code=1,my-codes=4,usage-stats=4"
+LAG_SAMPLE_SECONDS = 0.01
+
+
+def _parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"generate", "code", "my-codes", "usage-stats"}
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0], "max": values[0]}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(values)}
+
+
+def seed(uids, codes_per_user: int, tier: str):
+    """Give every bench user a quota node and some finished scenes to list and edit"""
+    from firebase_admin import db
+    import code_index
+
+    scenes = {}
+    start = datetime.now() - timedelta(days=1)
+    for uid in uids:
+        db.reference(f'users/{uid}').update({'accountType': tier, 'quota': {'accountType': tier}})
+        scenes[uid] = []
+        for i in range(codes_per_user):
+            file_id = f"seed{i:04d}"
+            code_index.write_scene(uid, file_id, {
+                'code': fakes.SCENE_TEMPLATE.format(n=f"{uid} {i}"),
+                'prompt': f"seeded scene {i}",
+                'title': f"seeded scene {i}",
+                'status': 'completed',
+                'video_url': f"https://example.invalid/{uid}/{file_id}.mp4",
+                'render_time': 0.1,
+                'timestamp': (start + timedelta(seconds=i)).isoformat(),
+            }, replace=True)
+            scenes[uid].append(file_id)
+    return scenes
+
+
+async def _lag_monitor(samples, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_SAMPLE_SECONDS
+        await asyncio.sleep(LAG_SAMPLE_SECONDS)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def _request(client, endpoint: str, uid: str, scenes, rng: random.Random, n: int):
+    headers = {"Authorization": f"Bearer bench:{uid}"}
+    if endpoint == "generate":
+        return await client.post("/generate", json={"prompt": f"bench prompt {n}"}, headers=headers)
+    if endpoint == "code":
+        file_id = rng.choice(scenes[uid])
+        code = fakes.SCENE_TEMPLATE.format(n=f"edit {n}")
+        return await client.put(f"/code/{file_id}", json={"code": code}, headers=headers)
+    if endpoint == "my-codes":
+        return await client.get("/my-codes", headers=headers)
+    return await client.get("/usage-stats", headers=headers)
+
+
+async def run_load(app, uids, scenes, args):
+    weights = _parse_mix(args.mix)
+    endpoints = [name for name, weight in weights.items() if weight > 0]
+    rng = random.Random(args.seed)
+    results = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lag_samples = []
+    stop = asyncio.Event()
+
+    transport = httpx.ASGITransport(app=app)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits,
+                                 timeout=args.timeout) as client:
+        monitor = asyncio.create_task(_lag_monitor(lag_samples, stop))
+
+        async def one(n: int, endpoint: str, uid: str):
+            start = time.perf_counter()
+            try:
+                response = await _request(client, endpoint, uid, scenes, rng, n)
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            results[endpoint].append(time.perf_counter() - start)
+            statuses[endpoint][status] += 1
+
+        # Open loop: requests start on schedule whether or not earlier ones have finished,
+        # so a slow server shows up as latency instead of a lower offered rate
+        total = int(args.rps * args.duration)
+        tasks = []
+        started = time.perf_counter()
+        for n in range(total):
+            delay = started + n / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            endpoint = rng.choices(endpoints, weights=[weights[e] for e in endpoints])[0]
+            tasks.append(asyncio.create_task(one(n, endpoint, rng.choice(uids))))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+        stop.set()
+        await monitor
+    return results, statuses, lag_samples, elapsed
+
+
+def drain_jobs(backend, uids, timeout: float):
+    """Wait for queued jobs to settle and return their end-to-end durations"""
+    deadline = time.time() + timeout
+    while True:
+        jobs = [
+            job for uid in uids
+            for job in (backend.database.root.get('users', {}).get(uid, {}).get('jobs') or {}).values()
+        ]
+        pending = [job for job in jobs if job.get('status') not in ('done', 'failed')]
+        if not pending or time.time() > deadline:
+            break
+        time.sleep(0.2)
+
+    durations = defaultdict(list)
+    for job in jobs:
+        if job.get('status') in ('done', 'failed'):
+            took = datetime.fromisoformat(job['updated_at']) - datetime.fromisoformat(job['created_at'])
+            durations[job['status']].append(took.total_seconds())
+    return durations, len(pending)
+
+
+def _ms(value):
+    return None if value is None else round(value * 1000, 1)
+
+
+def build_report(args, results, statuses, lag_samples, elapsed, db_ops, job_durations, jobs_pending):
+    completed = sum(len(latencies) for latencies in results.values())
+    all_latencies = [latency for latencies in results.values() for latency in latencies]
+    return {
+        "config": {
+            "rps": args.rps, "duration": args.duration, "users": args.users, "mix": args.mix,
+            "llm_latency": args.llm_latency, "render_seconds": args.render_seconds,
+            "db_latency_ms": args.db_latency_ms, "workers": args.workers,
+        },
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else None,
+        "requests": completed,
+        "latency_ms": {k: _ms(v) for k, v in _percentiles(all_latencies).items()},
+        "endpoints": {
+            endpoint: {
+                "requests": len(latencies),
+                "statuses": {str(k): v for k, v in statuses[endpoint].items()},
+                "latency_ms": {k: _ms(v) for k, v in _percentiles(latencies).items()},
+            }
+            for endpoint, latencies in sorted(results.items())
+        },
+        "event_loop_lag_ms": {k: _ms(v) for k, v in _percentiles(lag_samples).items()},
+        "db_ops_per_request": {
+            "reads": round(db_ops[0] / completed, 2) if completed else None,
+            "writes": round(db_ops[1] / completed, 2) if completed else None,
+        },
+        "jobs": {
+            status: {"count": len(durations), **{k: _ms(v) for k, v in _percentiles(durations).items()}}
+            for status, durations in job_durations.items()
+        },
+        "jobs_unfinished": jobs_pending,
+    }
+
+
+def print_report(report):
+    print(f"\nthroughput: {report['throughput_rps']} req/s over {report['requests']} requests")
+    overall = report["latency_ms"]
+    print(f"latency ms: p50={overall['p50']} p95={overall['p95']} p99={overall['p99']} max={overall['max']}")
+    print(f"\n{'endpoint':<14}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}  statuses")
+    for endpoint, row in report["endpoints"].items():
+        lat = row["latency_ms"]
+        codes = ", ".join(f"{k}: {v}" for k, v in sorted(row["statuses"].items()))
+        print(f"{endpoint:<14}{row['requests']:>7}{lat['p50']:>10}{lat['p95']:>10}{lat['p99']:>10}  {codes}")
+    lag = report["event_loop_lag_ms"]
+    print(f"\nevent loop lag ms: p50={lag['p50']} p95={lag['p95']} p99={lag['p99']} max={lag['max']}")
+    ops = report["db_ops_per_request"]
+    print(f"database ops per request: reads={ops['reads']} writes={ops['writes']}")
+    for status, row in report["jobs"].items():
+        print(f"jobs {status}: {row['count']} (end to end ms p50={row['p50']} p95={row['p95']})")
+    if report["jobs_unfinished"]:
+        print(f"jobs still running at exit: {report['jobs_unfinished']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=20, help="offered requests per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tier", default="free", help="account type of every bench user")
+    parser.add_argument("--codes-per-user", type=int, default=30, help="scenes seeded for each user")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="stub Gemini response time in seconds")
+    parser.add_argument("--render-seconds", type=float, default=2.0, help="fake render duration")
+    parser.add_argument("--db-latency-ms", type=float, default=10, help="simulated Firebase round trip")
+    parser.add_argument("--workers", type=int, default=4, help="MAX_CONCURRENT_RENDERS")
+    parser.add_argument("--timeout", type=float, default=60, help="per request timeout in seconds")
+    parser.add_argument("--drain", type=float, default=0, help="seconds to wait for queued jobs afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the backend's own logging")
+    args = parser.parse_args()
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = tempfile.mkdtemp(prefix="bolt-loadtest-")
+    cwd = os.getcwd()
+    stub = fakes.StubGeminiServer(latency=args.llm_latency).start()
+    try:
+        # The caches and workspaces are relative, keep them out of the tree
+        os.chdir(workdir)
+        backend = fakes.install(workdir, stub.base_url, db_latency=args.db_latency_ms / 1000,
+                                render_seconds=args.render_seconds, max_workers=args.workers)
+
+        log = sys.stdout if args.verbose else open(os.devnull, "w")
+        with contextlib.redirect_stdout(log):
+            import main as api
+
+            uids = [f"bench-user-{i}" for i in range(args.users)]
+            latency = backend.database.latency
+            backend.database.latency = 0
+            scenes = seed(uids, args.codes_per_user, args.tier)
+            backend.database.latency = latency
+            backend.database.reset_counters()
+
+            results, statuses, lag_samples, elapsed = asyncio.run(run_load(api.app, uids, scenes, args))
+            db_ops = (backend.database.reads, backend.database.writes)
+            job_durations, jobs_pending = drain_jobs(backend, uids, args.drain)
+        backend.executor.shutdown(wait=False, cancel_futures=True)
+
+        report = build_report(args, results, statuses, lag_samples, elapsed, db_ops, job_durations, jobs_pending)
+        print_report(report)
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(report, f, indent=2)
+    finally:
+        stub.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
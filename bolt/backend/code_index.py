@@ -0,0 +1,102 @@
+from firebase_admin import db
+
+# users/{uid}/code_index/{file_id} mirrors the small fields of users/{uid}/codes/{file_id}
+# so listings never download code bodies or render stderr
+INDEX_FIELDS = ('title', 'timestamp', 'status', 'render_time', 'video_url', 'manifest_url', 'poster_url')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Users whose users/{uid}/code_index_backfilled marker this process has already seen
+_backfilled = set()
+
+
+def _index_fields(fields: dict):
+    return {k: v for k, v in fields.items() if k in INDEX_FIELDS}
+
+
+def write_scene(uid: str, file_id: str, fields: dict, replace: bool = False):
+    """Write a scene record and its index entry in one atomic multi-path update.
+
+    replace=True overwrites both nodes, otherwise only the given fields change.
+    """
+    if replace:
+        updates = {
+            f'codes/{file_id}': fields,
+            f'code_index/{file_id}': _index_fields(fields),
+        }
+    else:
+        updates = {f'codes/{file_id}/{k}': v for k, v in fields.items()}
+        updates.update({f'code_index/{file_id}/{k}': v for k, v in _index_fields(fields).items()})
+    db.reference(f'users/{uid}').update(updates)
+
+
+def get_entry(uid: str, file_id: str):
+    entry = db.reference(f'users/{uid}/code_index/{file_id}').get()
+    if entry is None:
+        # Scenes written before the index existed
+        record = db.reference(f'users/{uid}/codes/{file_id}').get()
+        entry = _index_fields(record) if record else None
+    return entry
+
+
+def backfill(uid: str):
+    """Build the index from the full codes node, once per user that predates it.
+
+    The index entries and the code_index_backfilled marker are written in one update.
+    """
+    codes = db.reference(f'users/{uid}/codes').get() or {}
+    index = {file_id: _index_fields(record) for file_id, record in codes.items() if isinstance(record, dict)}
+    updates = {f'code_index/{file_id}': entry for file_id, entry in index.items()}
+    updates['code_index_backfilled'] = True
+    db.reference(f'users/{uid}').update(updates)
+    return index
+
+
+def ensure_backfilled(uid: str):
+    """Backfill the index unless the user's marker says it already was.
+
+    The index not being empty isn't enough: scenes saved since it existed are in it, older ones aren't.
+    """
+    if uid in _backfilled:
+        return
+    if not db.reference(f'users/{uid}/code_index_backfilled').get():
+        backfill(uid)
+    _backfilled.add(uid)
+
+
+def encode_cursor(entry_id: str, entry: dict):
+    return f"{entry.get('timestamp', '')}|{entry_id}"
+
+
+def list_page(uid: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+    """Newest-first page of index entries older than cursor.
+
+    Returns (entries, next_cursor) where entries is a list of (file_id, entry) and
+    next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    ensure_backfilled(uid)
+    query = db.reference(f'users/{uid}/code_index').order_by_child('timestamp')
+    before_ts, before_id = None, None
+    if cursor:
+        before_ts, _, before_id = cursor.partition('|')
+        # end_at is inclusive, entries sharing the cursor's timestamp are filtered below
+        query = query.end_at(before_ts)
+    # One extra entry tells whether there is another page, plus slack for the cursor entry itself
+    result = query.limit_to_last(limit + 2).get()
+
+    entries = sorted(
+        (result or {}).items(),
+        key=lambda item: (item[1].get('timestamp', ''), item[0]),
+        reverse=True,
+    )
+    if cursor:
+        entries = [
+            (file_id, entry) for file_id, entry in entries
+            if (entry.get('timestamp', ''), file_id) < (before_ts, before_id)
+        ]
+
+    page = entries[:limit]
+    next_cursor = encode_cursor(*page[-1]) if len(entries) > limit else None
+    return page, next_cursor
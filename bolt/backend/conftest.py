@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The backend modules import each other by bare name, as they do when the app runs from here
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# A manual script that renders and uploads for real, not a test
+collect_ignore = ["test_firebase.py"]
@@ -1,9 +1,23 @@
+import os
 import firebase_admin
 from firebase_admin import credentials
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate("serviceAccountKey.json")
-firebase_app = firebase_admin.initialize_app(cred, {
+FIREBASE_CREDENTIALS = os.getenv("FIREBASE_CREDENTIALS", "serviceAccountKey.json")
+FIREBASE_OPTIONS = {
     'storageBucket': 'prompmotion-auth.firebasestorage.app',
     'databaseURL': 'https://prompmotion-auth-default-rtdb.firebaseio.com/'
-}) 
\ No newline at end of file
+}
+
+
+def init_app():
+    """Initialize the default Firebase app once per process, whichever module gets here first.
+
+    Only reads the key file: connections and access tokens are made on first use, the API
+    warms them in the background (see readiness.py).
+    """
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    return firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS), FIREBASE_OPTIONS)
+
+
+firebase_app = init_app()
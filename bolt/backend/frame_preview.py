@@ -0,0 +1,139 @@
+import os
+import queue
+import base64
+import tempfile
+import threading
+import subprocess
+import render_cache
+from tracing import span
+from render_scheduler import QueueFull
+from render_worker import WarmRenderer
+from video_upload import get_video_store
+
+# Still previews for the code editor: the scene runs with every animation skipped and only
+# the sampled frames are drawn, at low resolution, in warm renderers owned by the API process.
+# Previews never touch the render queue, the full video renders when the code is saved.
+FRAME_PREVIEW_WORKERS = int(os.getenv("FRAME_PREVIEW_WORKERS", 2))
+FRAME_PREVIEW_TIMEOUT_SECONDS = float(os.getenv("FRAME_PREVIEW_TIMEOUT_SECONDS", 20))
+# How long a preview waits for a free renderer before it is turned away with 429
+FRAME_PREVIEW_WAIT_SECONDS = float(os.getenv("FRAME_PREVIEW_WAIT_SECONDS", 5))
+FRAME_PREVIEW_WIDTH = int(os.getenv("FRAME_PREVIEW_WIDTH", 640))
+FRAME_PREVIEW_MAX_FRAMES = int(os.getenv("FRAME_PREVIEW_MAX_FRAMES", 8))
+# Format of the posters galleries show instead of loading videos, and the default for previews
+POSTER_FORMAT = os.getenv("POSTER_FORMAT", "webp")
+
+IMAGE_FORMATS = ("webp", "png")
+
+_idle = queue.Queue()
+_renderers = []
+_lock = threading.Lock()
+
+
+def start():
+    """Start every preview renderer ahead of the first preview, so it doesn't pay for importing manim"""
+    with _lock:
+        while len(_renderers) < FRAME_PREVIEW_WORKERS:
+            renderer = WarmRenderer()
+            renderer.start()
+            _renderers.append(renderer)
+            _idle.put(renderer)
+
+
+def stop():
+    with _lock:
+        for renderer in _renderers:
+            renderer.stop()
+
+
+def _acquire():
+    try:
+        return _idle.get_nowait()
+    except queue.Empty:
+        pass
+    with _lock:
+        if len(_renderers) < FRAME_PREVIEW_WORKERS:
+            renderer = WarmRenderer()
+            _renderers.append(renderer)
+            return renderer
+    try:
+        return _idle.get(timeout=FRAME_PREVIEW_WAIT_SECONDS)
+    except queue.Empty:
+        raise QueueFull("All preview renderers are busy", retry_after=max(1, int(FRAME_PREVIEW_WAIT_SECONDS)))
+
+
+def upload_poster(image_path: str, dest_path: str):
+    """Upload a poster image and return its URL, None if the upload failed"""
+    content_type = f"image/{os.path.splitext(image_path)[1].lstrip('.')}"
+    try:
+        return get_video_store().upload(image_path, dest_path, content_type=content_type)
+    except Exception as e:
+        print(f"Warning: Failed to upload poster {dest_path}: {e}")
+        return None
+
+
+def extract_poster(video_path: str, image_path: str):
+    """Write the last frame of a rendered video as a poster image, returning False if ffmpeg failed"""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-sseof", "-1", "-i", video_path,
+             "-vf", f"scale={FRAME_PREVIEW_WIDTH}:-2", "-update", "1", image_path],
+            capture_output=True, text=True,
+        )
+    except OSError as e:
+        print(f"Warning: Failed to extract a poster from {video_path}: {e}")
+        return False
+    if result.returncode != 0:
+        print(f"Warning: Failed to extract a poster from {video_path}: {result.stderr.strip()}")
+        return False
+    return True
+
+
+def publish_poster(video_path: str, dest_path: str):
+    """Extract and upload the poster of a rendered video, returning its URL or None"""
+    image_path = f"{os.path.splitext(video_path)[0]}.poster.{POSTER_FORMAT}"
+    try:
+        if not extract_poster(video_path, image_path):
+            return None
+        return upload_poster(image_path, dest_path)
+    finally:
+        try:
+            os.remove(image_path)
+        except FileNotFoundError:
+            pass
+
+
+def render_preview(code: str, scene_name: str, count: int = 1, image_format: str = POSTER_FORMAT):
+    """Render count stills of the scene, the last one being its final frame.
+
+    Returns {"frames": [{"time", "image"}], "poster_url"} with each image as a data URI. The
+    final frame is also uploaded as the scene's poster, under the code's content address.
+    Raises RenderKilled or RenderError like a full render, QueueFull when no renderer frees up.
+    """
+    key = render_cache.make_key(code, scene_name, ["frames", str(FRAME_PREVIEW_WIDTH)])
+    with tempfile.TemporaryDirectory(prefix="frame-preview-") as workdir:
+        file_path = os.path.join(workdir, "scene_preview.py")
+        with open(file_path, "w") as f:
+            f.write(code)
+
+        renderer = _acquire()
+        try:
+            with span("preview.frames"):
+                frames = renderer.render_frames(file_path, scene_name, os.path.join(workdir, "media"),
+                                                count, FRAME_PREVIEW_WIDTH, image_format,
+                                                timeout=FRAME_PREVIEW_TIMEOUT_SECONDS)
+        finally:
+            _idle.put(renderer)
+
+        poster_path = os.path.join(workdir, f"poster.{image_format}")
+        with open(poster_path, "wb") as f:
+            f.write(frames[-1][1])
+        with span("preview.upload"):
+            poster_url = upload_poster(poster_path, f"previews/{key}/poster.{image_format}")
+
+    return {
+        "frames": [
+            {"time": time, "image": f"data:image/{image_format};base64,{base64.b64encode(image).decode('ascii')}"}
+            for time, image in frames
+        ],
+        "poster_url": poster_url,
+    }
@@ -0,0 +1,164 @@
+import os
+import re
+import subprocess
+from video_upload import upload_files
+from render_worker import RENDER_TIMEOUT_SECONDS
+
+# Full quality renders are also published as an HLS ladder, so players can start at a low
+# rendition and step up to what the screen and connection can use instead of always
+# downloading the 4K60 MP4. The MP4 stays available as video_url for downloads.
+HLS_ENABLED = os.getenv("HLS_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", 4))
+HLS_X264_PRESET = os.getenv("HLS_X264_PRESET", "medium")
+HLS_UPLOAD_WORKERS = int(os.getenv("HLS_UPLOAD_WORKERS", 16))
+
+# (height, video kbps). Scenes are flat colours and sharp edges, which x264's animation
+# tuning compresses far below the usual camera footage ladders.
+HLS_LADDER = [
+    (360, 500),
+    (720, 1500),
+    (1080, 3000),
+    (2160, 8000),
+]
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".mp4": "video/mp4",
+    ".ts": "video/mp2t",
+}
+
+# URI lines and URI="..." attributes (EXT-X-MAP, EXT-X-MEDIA) in a playlist
+_URI_ATTR = re.compile(r'URI="([^"]+)"')
+
+
+def renditions_for(source_height: int):
+    """Rungs of the ladder up to the rendered height, the tier's render quality caps the top"""
+    ladder = [(height, kbps) for height, kbps in HLS_LADDER if height <= source_height]
+    return ladder or [HLS_LADDER[0]]
+
+
+def _has_audio(video_path: str):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a", "-show_entries", "stream=index", "-of", "csv=p=0", video_path],
+        capture_output=True, text=True,
+    )
+    return bool(result.stdout.strip())
+
+
+def encode(video_path: str, out_dir: str, source_height: int, fps: int):
+    """Encode video_path into an HLS ladder under out_dir with one ffmpeg run, returning master.m3u8's path"""
+    ladder = renditions_for(source_height)
+    audio = _has_audio(video_path)
+    # Keyframes exactly on segment boundaries, so every rendition's segments line up for switching
+    gop = max(1, fps * HLS_SEGMENT_SECONDS)
+
+    splits = "".join(f"[v{i}]" for i in range(len(ladder)))
+    filters = [f"[0:v]split={len(ladder)}{splits}"]
+    filters += [f"[v{i}]scale=-2:{height}:flags=lanczos[out{i}]" for i, (height, _) in enumerate(ladder)]
+
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-filter_complex", ";".join(filters)]
+    stream_map = []
+    for i, (height, kbps) in enumerate(ladder):
+        command += [
+            "-map", f"[out{i}]",
+            f"-c:v:{i}", "libx264",
+            f"-b:v:{i}", f"{kbps}k",
+            f"-maxrate:v:{i}", f"{int(kbps * 1.1)}k",
+            f"-bufsize:v:{i}", f"{kbps * 2}k",
+        ]
+        if audio:
+            command += ["-map", "0:a:0", f"-c:a:{i}", "aac", f"-b:a:{i}", "128k"]
+            stream_map.append(f"v:{i},a:{i},name:{height}p")
+        else:
+            stream_map.append(f"v:{i},name:{height}p")
+    command += [
+        "-preset", HLS_X264_PRESET, "-tune", "animation", "-profile:v", "high", "-pix_fmt", "yuv420p",
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "%v", "seg_%04d.m4s"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(out_dir, "%v", "index.m3u8"),
+    ]
+
+    os.makedirs(out_dir, exist_ok=True)
+    result = subprocess.run(command, capture_output=True, text=True, timeout=RENDER_TIMEOUT_SECONDS)
+    if result.returncode != 0:
+        raise RuntimeError(f"HLS encoding failed: {result.stderr.strip()}")
+    return os.path.join(out_dir, "master.m3u8")
+
+
+def _rewrite_playlist(playlist_path: str, urls: dict):
+    """Point a playlist's references at uploaded URLs.
+
+    Firebase download URLs carry the whole object path in one escaped segment plus a token,
+    so references relative to the playlist's own URL can't resolve.
+    """
+    base = os.path.dirname(playlist_path)
+
+    def absolute(uri: str):
+        return urls.get(os.path.normpath(os.path.join(base, uri)), uri)
+
+    lines = []
+    with open(playlist_path) as f:
+        for line in f.read().splitlines():
+            if line and not line.startswith("#"):
+                line = absolute(line)
+            else:
+                line = _URI_ATTR.sub(lambda m: f'URI="{absolute(m.group(1))}"', line)
+            lines.append(line)
+    with open(playlist_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _upload(paths: list, out_dir: str, dest_prefix: str, urls: dict):
+    files = [
+        (path, f"{dest_prefix}/{os.path.relpath(path, out_dir)}",
+         CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"))
+        for path in paths
+    ]
+    for path, url in zip(paths, upload_files(files, HLS_UPLOAD_WORKERS)):
+        urls[os.path.normpath(path)] = url
+
+
+def upload(out_dir: str, dest_prefix: str):
+    """Upload an encoded ladder and return the master playlist's URL.
+
+    Segments go first, all at once, then the rendition playlists rewritten to their URLs,
+    then the master playlist pointing at those.
+    """
+    master = os.path.join(out_dir, "master.m3u8")
+    playlists, media = [], []
+    for root, _, names in os.walk(out_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            if path == master:
+                continue
+            (playlists if name.endswith(".m3u8") else media).append(path)
+
+    urls = {}
+    _upload(media, out_dir, dest_prefix, urls)
+    for playlist in playlists:
+        _rewrite_playlist(playlist, urls)
+    _upload(playlists, out_dir, dest_prefix, urls)
+    _rewrite_playlist(master, urls)
+    _upload([master], out_dir, dest_prefix, urls)
+    return urls[os.path.normpath(master)]
+
+
+def publish(video_path: str, out_dir: str, dest_prefix: str, source_height: int, fps: int):
+    """Encode and upload the ladder for a rendered video, returning the manifest URL or None on failure.
+
+    The MP4 is still there to fall back on, so a failed ladder doesn't fail the render.
+    """
+    try:
+        encode(video_path, out_dir, source_height, fps)
+        return upload(out_dir, dest_prefix)
+    except (OSError, RuntimeError, subprocess.SubprocessError) as e:
+        print(f"Warning: HLS ladder for {video_path} failed, serving the MP4 only: {e}")
+        return None
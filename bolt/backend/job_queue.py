@@ -0,0 +1,336 @@
+import os
+import uuid
+import signal
+import socket
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from firebase_admin import db
+from llm_engine import generate_manim_code
+from manim_engine import (
+    save_and_render, upgrade_render, get_render_settings, render_cache_key, PREVIEW_QUALITY, RENDER_BACKEND
+)
+from render_worker import warm_up
+import llm_client
+from scene_validator import validate_scene_code, SceneValidationError
+import render_cache
+import quota
+from render_scheduler import FairScheduler, QueueFull
+import tracing
+import code_index
+
+# Number of LLM/render jobs that may run at the same time on this host
+MAX_CONCURRENT_RENDERS = int(os.getenv("MAX_CONCURRENT_RENDERS", os.cpu_count() or 1))
+
+JOB_STATUSES = ("queued", "generating", "rendering", "uploading", "done", "failed", "killed")
+FINISHED_STATUSES = ("done", "failed", "killed")
+
+# Renders are cancelled by killing their process group, which only works on the host running them
+HOSTNAME = socket.gethostname()
+
+_executor = None
+# Jobs submitted from this process that haven't finished: job_id -> (uid, file_id)
+_active = {}
+_active_lock = threading.Lock()
+
+
+def _init_worker():
+    llm_client.use_job_worker_share()
+    # Each job worker keeps its own warm manim process, start it before the first job arrives
+    if RENDER_BACKEND == "warm":
+        warm_up()
+
+
+def get_executor():
+    """Create the worker pool on first use so importing this module stays cheap"""
+    global _executor
+    if _executor is None:
+        # spawn instead of fork: the parent holds firebase/grpc threads that don't survive a fork
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_CONCURRENT_RENDERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+# Paid tiers get workers in proportion to their daily limits, so a pro job doesn't wait
+# behind a queue of free ones
+scheduler = FairScheduler(lambda: get_executor(), MAX_CONCURRENT_RENDERS, quota.ACCOUNT_LIMITS)
+
+
+def check_admission(uid: str, batch_size: int = 0):
+    """Raise QueueFull when a job from uid would be refused, before charging for it.
+
+    A batch of batch_size jobs is admitted as a whole while the background queue has room
+    for all of them, its items then run as background jobs outside the per-user caps.
+    """
+    if batch_size:
+        scheduler.admit_background(batch_size)
+    else:
+        scheduler.admit(uid)
+
+
+def _retire_executor(executor):
+    # The pool keeps no pids once shut down, take them first
+    pids = list(executor._processes or {})
+    executor.shutdown(wait=False, cancel_futures=True)
+    for pid in pids:
+        tracing.mark_process_dead(pid)
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _retire_executor(_executor)
+        _executor = None
+
+
+def _discard_broken_executor():
+    """A worker died and took the pool down with it, the next job starts a new one"""
+    global _executor
+    # Every job of the broken pool fails at once, only the first replaces it
+    if _executor is not None and _executor._broken:
+        _retire_executor(_executor)
+        _executor = None
+
+
+def _job_ref(uid: str, job_id: str):
+    return db.reference(f'users/{uid}/jobs/{job_id}')
+
+
+def set_job_status(uid: str, job_id: str, status: str, **fields):
+    fields['status'] = status
+    fields['updated_at'] = datetime.now().isoformat()
+    _job_ref(uid, job_id).update(fields)
+
+
+def get_job(uid: str, job_id: str):
+    return _job_ref(uid, job_id).get()
+
+
+def _stage_timings():
+    # Seconds per stage so far, '.' isn't allowed in RTDB keys
+    timings = tracing.current_timings()
+    return {stage.replace('.', ':'): round(seconds, 3) for stage, seconds in (timings or {}).items()}
+
+
+def _cancel_requested(uid: str, job_id: str):
+    return bool(_job_ref(uid, job_id).child('cancel_requested').get())
+
+
+def _render_started(uid: str, job_id: str):
+    # Where the render runs, for cancel_job. Cleared again when the job (or its upgrade) finishes
+    return lambda pgid: _job_ref(uid, job_id).update({'render_pgid': pgid, 'render_host': HOSTNAME})
+
+
+def _finish_job(uid: str, job_id: str, result: dict):
+    fields = {'render_pgid': None, 'render_host': None}
+    timings = _stage_timings()
+    if timings:
+        fields['timings'] = timings
+    if result.get("status") == "completed":
+        set_job_status(uid, job_id, "done", video_url=result["video_url"],
+                       manifest_url=result.get("manifest_url"), poster_url=result.get("poster_url"), **fields)
+    elif result.get("status") == "killed":
+        reason = result["reason"]
+        if reason == "killed" and _cancel_requested(uid, job_id):
+            reason = "cancelled"
+            # Only while the record is still this render's: a newer edit that superseded it owns it otherwise
+            if result.get("owns_record"):
+                code_index.write_scene(uid, result["file_id"], {'kill_reason': reason})
+        set_job_status(uid, job_id, "killed", kill_reason=reason, error=result["error"], **fields)
+    else:
+        fields['error'] = result.get("error") or result.get("video_url", "")
+        if result.get("validation_errors"):
+            fields['validation_errors'] = result["validation_errors"]
+        set_job_status(uid, job_id, "failed", **fields)
+
+
+def _render_for_account(job_id: str, uid: str, code: str, prompt: str, file_id: str, account_type: str):
+    """Render at the account's quality, previewing first on progressive tiers"""
+    settings = get_render_settings(account_type)
+    quality = settings['quality']
+    on_status = lambda status: set_job_status(uid, job_id, status)
+    on_start = _render_started(uid, job_id)
+
+    try:
+        scene_name = validate_scene_code(code)
+    except SceneValidationError:
+        # save_and_render records the validation errors without rendering
+        scene_name = None
+
+    # No point in a preview when the full quality video is already cached or the code can't render.
+    # A hit is remembered in process, so the render below finds it without another read.
+    cached = None
+    if scene_name is not None and settings['progressive']:
+        cached = render_cache.peek(render_cache_key(code, quality, scene_name))
+    if scene_name is None or not settings['progressive'] or cached:
+        result = save_and_render(code, uid, prompt, file_id, on_status=on_status, quality=quality,
+                                 on_start=on_start)
+        _finish_job(uid, job_id, result)
+        return
+
+    result = save_and_render(code, uid, prompt, file_id, on_status=on_status,
+                             quality=PREVIEW_QUALITY, preview=True, on_start=on_start)
+    _finish_job(uid, job_id, result)
+    if result.get("status") != "completed" or _cancel_requested(uid, job_id):
+        return
+
+    # The job is done from the user's point of view, the upgrade keeps this worker busy
+    # so full quality renders still count against MAX_CONCURRENT_RENDERS
+    _job_ref(uid, job_id).update({'upgrade': 'rendering'})
+    # The peek above already missed, the upgrade doesn't read the cache again
+    upgrade = upgrade_render(code, uid, file_id, quality, on_start=on_start, cache_checked=True)
+    update = {'upgrade': 'done' if upgrade["status"] == "completed" else upgrade["status"],
+              'render_pgid': None, 'render_host': None}
+    if upgrade["status"] == "completed":
+        update['video_url'] = upgrade["video_url"]
+        update['manifest_url'] = upgrade.get("manifest_url")
+        update['poster_url'] = upgrade.get("poster_url")
+    _job_ref(uid, job_id).update(update)
+
+
+def run_generate_job(job_id: str, uid: str, prompt: str, file_id: str, account_type: str = 'free',
+                     use_cache: bool = True):
+    """Worker entry point for POST /generate: LLM generation followed by render + upload"""
+    try:
+        with tracing.collect():
+            set_job_status(uid, job_id, "generating")
+            code = generate_manim_code(prompt, use_cache=use_cache)
+            if _cancel_requested(uid, job_id):
+                set_job_status(uid, job_id, "killed", kill_reason="cancelled", error="Cancelled before rendering")
+                return
+            set_job_status(uid, job_id, "rendering")
+            _render_for_account(job_id, uid, code, prompt, file_id, account_type)
+    except SceneValidationError as e:
+        print(f"Job {job_id} produced invalid scene code: {str(e)}")
+        # The generation never produced renderable code, give its quota back
+        quota.refund(uid)
+        set_job_status(uid, job_id, "failed", error=str(e), validation_errors=e.errors)
+    except Exception as e:
+        print(f"Job {job_id} failed: {str(e)}")
+        set_job_status(uid, job_id, "failed", error=str(e))
+
+
+def run_render_job(job_id: str, uid: str, code: str, file_id: str, account_type: str = 'free', prompt: str = ""):
+    """Worker entry point for PUT /code and streamed generations: render already written code"""
+    try:
+        with tracing.collect():
+            set_job_status(uid, job_id, "rendering")
+            _render_for_account(job_id, uid, code, prompt, file_id, account_type)
+    except Exception as e:
+        print(f"Job {job_id} failed: {str(e)}")
+        set_job_status(uid, job_id, "failed", error=str(e))
+
+
+def _submit(uid: str, kind: str, file_id: str, account_type: str, fn, *args,
+            on_finished=None, batch_id: str = None, max_inflight: int = None):
+    """Queue a job with the fair scheduler, returning (job_id, estimated wait in seconds).
+
+    Raises QueueFull, before anything is written, when the queue can't take it. Batch
+    items (batch_id set) were admitted with their batch and are always queued.
+    on_finished(job_id) is called in this process once the worker is done with the job.
+    """
+    job_id = str(uuid.uuid4())
+
+    def _on_done(f):
+        with _active_lock:
+            _active.pop(job_id, None)
+        if f.cancelled():
+            # Dropped from the queue by cancel_job before a worker picked it up
+            set_job_status(uid, job_id, "killed", kill_reason="cancelled", error="Cancelled before it started")
+        # The job functions catch their own errors, so this only fires when the
+        # worker process itself died (OOM kill, segfault in cairo, ...)
+        exc = f.exception() if not f.cancelled() else None
+        if exc is not None:
+            print(f"Worker crashed while running job {job_id}: {str(exc)}")
+            set_job_status(uid, job_id, "failed", error=f"Worker crashed: {str(exc)}")
+            if isinstance(exc, BrokenProcessPool):
+                _discard_broken_executor()
+        if on_finished:
+            on_finished(job_id)
+
+    # A new render of a scene makes any earlier one still running for it pointless
+    with _active_lock:
+        superseded = [j for j, (u, f) in _active.items() if u == uid and f == file_id]
+    for old_job_id in superseded:
+        cancel_job(uid, old_job_id)
+
+    # Written before queueing, the worker may pick the job up right away
+    now = datetime.now().isoformat()
+    job_ref = _job_ref(uid, job_id)
+    job = {
+        'kind': kind,
+        'status': 'queued',
+        'scene_file_id': file_id,
+        'created_at': now,
+        'updated_at': now,
+    }
+    if batch_id:
+        job['batch_id'] = batch_id
+    job_ref.set(job)
+    with _active_lock:
+        _active[job_id] = (uid, file_id)
+    try:
+        wait = scheduler.submit(job_id, uid, account_type, fn, args, on_done=_on_done,
+                                max_inflight=max_inflight, background=batch_id is not None)
+    except QueueFull:
+        with _active_lock:
+            _active.pop(job_id, None)
+        job_ref.delete()
+        raise
+    return job_id, wait
+
+
+def cancel_job(uid: str, job_id: str):
+    """Stop a job: drop it if it hasn't started, otherwise kill its render's process group.
+
+    Returns the job record, or None if there is no such job. A job that has already
+    finished (and has no upgrade running) is returned unchanged.
+    """
+    job = get_job(uid, job_id)
+    if not job:
+        return None
+    if job.get('status') in FINISHED_STATUSES and job.get('upgrade') != 'rendering':
+        return job
+
+    _job_ref(uid, job_id).update({'cancel_requested': True})
+    job['cancel_requested'] = True
+
+    if scheduler.cancel(job_id):
+        # Its on_done has marked it killed and told whoever waits on it
+        return get_job(uid, job_id)
+
+    # Running: the worker records the process group of the render in progress. Killing it
+    # makes the render return as killed, and the worker marks job and scene accordingly.
+    pgid = job.get('render_pgid')
+    if pgid and job.get('render_host') == HOSTNAME:
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    return job
+
+
+def submit_generate_job(uid: str, prompt: str, account_type: str = 'free', use_cache: bool = True):
+    """Returns (job_id, scene_file_id, estimated wait in seconds), raises QueueFull"""
+    file_id = str(uuid.uuid4())[:8]
+    job_id, wait = _submit(uid, "generate", file_id, account_type, run_generate_job,
+                           prompt, file_id, account_type, use_cache)
+    return job_id, file_id, wait
+
+
+def submit_render_job(uid: str, code: str, file_id: str = None, account_type: str = 'free', prompt: str = "",
+                      **options):
+    """Returns (job_id, scene_file_id, estimated wait in seconds), raises QueueFull.
+
+    options (on_finished, batch_id, max_inflight) are passed on to _submit.
+    """
+    if file_id is None:
+        file_id = str(uuid.uuid4())[:8]
+    job_id, wait = _submit(uid, "render", file_id, account_type, run_render_job,
+                           code, file_id, account_type, prompt, **options)
+    return job_id, file_id, wait
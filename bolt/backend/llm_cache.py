@@ -0,0 +1,106 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", 256))
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+_conn = None
+
+
+def _get_conn():
+    global _conn
+    if _conn is None:
+        # Several render workers share the file, WAL lets readers proceed while one writes
+        _conn = sqlite3.connect(LLM_CACHE_PATH, timeout=5, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, code TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        _conn.commit()
+    return _conn
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+def make_key(prompt: str, system_prompt: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (normalize_prompt(prompt), system_prompt, model):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _remember(key: str, code: str, created_at: float):
+    _memory[key] = (code, created_at)
+    _memory.move_to_end(key)
+    while len(_memory) > LLM_CACHE_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def get(key: str):
+    """Return the cached code for key, or None if missing or expired"""
+    now = time.time()
+    with _lock:
+        hit = _memory.get(key)
+        if hit is not None:
+            code, created_at = hit
+            if now - created_at < LLM_CACHE_TTL_SECONDS:
+                _memory.move_to_end(key)
+                return code
+            del _memory[key]
+
+        try:
+            conn = _get_conn()
+            row = conn.execute(
+                "SELECT code, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            code, created_at = row
+            if now - created_at >= LLM_CACHE_TTL_SECONDS:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache read failed: {e}")
+            return None
+
+        _remember(key, code, created_at)
+        return code
+
+
+def put(key: str, code: str):
+    now = time.time()
+    with _lock:
+        _remember(key, code, now)
+        try:
+            conn = _get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, code, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, code, now, now),
+            )
+            # Drop expired rows and keep only the most recently used LLM_CACHE_MAX_ENTRIES
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - LLM_CACHE_TTL_SECONDS,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key NOT IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT ?)",
+                (LLM_CACHE_MAX_ENTRIES,),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache write failed: {e}")
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+import httpx
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# Processes with their own client: one per job worker (MAX_CONCURRENT_RENDERS, read as job_queue
+# does) plus the API process. The default concurrency leaves the API process a few requests.
+LLM_JOB_WORKERS = int(os.getenv("MAX_CONCURRENT_RENDERS", os.cpu_count() or 1))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", max(8, LLM_JOB_WORKERS + 4)))
+# Token bucket: sustained requests per second and how many may burst above it
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", 5))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", max(10, LLM_MAX_CONCURRENCY)))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 60))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 20))
+# Send a second, identical request if the first hasn't answered after this many seconds (0 disables)
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", 0))
+
+# The limits above are for the whole host: Gemini enforces them per API key, and the API
+# process and every job worker each have their own client. A job worker runs one generation
+# at a time and gets a concurrency of 1, the API process (streams, batches) the rest, and each
+# gets the fraction of the rate and burst that matches its fraction of the concurrency, so
+# the shares add up to exactly the configured limits. Every process needs a whole request
+# of concurrency and burst, configurations that can't give it one are refused.
+if LLM_MAX_CONCURRENCY < LLM_JOB_WORKERS + 1:
+    raise ValueError(f"LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY} can't be shared by {LLM_JOB_WORKERS} job workers "
+                     f"and the API process, it must be at least MAX_CONCURRENT_RENDERS + 1")
+if LLM_RATE_BURST < LLM_MAX_CONCURRENCY:
+    raise ValueError(f"LLM_RATE_BURST={LLM_RATE_BURST} must be at least LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY}, "
+                     f"so a job worker's share of the burst is a whole request")
+LLM_API_CONCURRENCY = LLM_MAX_CONCURRENCY - LLM_JOB_WORKERS
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# This process's concurrency share, see use_job_worker_share
+_concurrency = LLM_API_CONCURRENCY
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _retry_after_seconds(response: httpx.Response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int):
+    # Full jitter: spreads retries from many callers instead of syncing them into a new burst
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+class GeminiClient:
+    """Async Gemini client sharing one keep-alive connection pool, with rate limiting,
+    retries on 429/5xx and optional hedged requests"""
+
+    def __init__(self, api_key: str, base_url: str = GEMINI_BASE_URL,
+                 max_concurrency: int = None, hedge_after: float = LLM_HEDGE_AFTER):
+        max_concurrency = max_concurrency or _concurrency
+        share = max_concurrency / LLM_MAX_CONCURRENCY
+        self.hedge_after = hedge_after
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Content-Type": "application/json", "x-goog-api-key": api_key or ""},
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_concurrency * 2, max_keepalive_connections=max_concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(LLM_RATE_PER_SECOND * share, LLM_RATE_BURST * share)
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _post_with_retries(self, path: str, body: dict):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    response = await self._http.post(path, json=body)
+            except httpx.TransportError:
+                if attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff_seconds(attempt))
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                delay = _retry_after_seconds(response)
+                await asyncio.sleep(delay if delay is not None else _backoff_seconds(attempt))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def generate_content(self, model: str, body: dict):
+        path = f"/models/{model}:generateContent"
+        if not self.hedge_after:
+            return await self._post_with_retries(path, body)
+
+        # Hedge: if the first request is slow, race an identical second one and keep the winner
+        first = asyncio.ensure_future(self._post_with_retries(path, body))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(self._post_with_retries(path, body))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def stream_generate_content(self, model: str, body: dict):
+        """Yield each JSON chunk of a streamGenerateContent response.
+
+        Failures are retried like generate_content, but only until the first chunk
+        has been yielded, since the caller has already consumed partial output by then.
+        """
+        path = f"/models/{model}:streamGenerateContent"
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            await self._bucket.acquire()
+            yielded = False
+            try:
+                async with self._semaphore:
+                    async with self._http.stream("POST", path, params={"alt": "sse"}, json=body) as response:
+                        if response.status_code in RETRY_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                            delay = _retry_after_seconds(response)
+                            await asyncio.sleep(delay if delay is not None else _backoff_seconds(attempt))
+                            continue
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            try:
+                                chunk = json.loads(line[len("data:"):])
+                            except ValueError:
+                                continue
+                            yielded = True
+                            yield chunk
+                        return
+            except httpx.TransportError:
+                if yielded or attempt == LLM_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff_seconds(attempt))
+
+
+# Sync callers (render workers, the SSE endpoint's threadpool generator) share one client per
+# process running on a background event loop, so the connection pool survives between calls
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def use_job_worker_share():
+    """Limit this process to a job worker's share of the LLM limits, before its first request"""
+    global _concurrency
+    _concurrency = 1
+
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-client-loop", daemon=True).start()
+    return _loop
+
+
+def get_client(api_key: str):
+    global _client
+    loop = _get_loop()
+    with _loop_lock:
+        if _client is None:
+            async def _create():
+                return GeminiClient(api_key)
+            _client = asyncio.run_coroutine_threadsafe(_create(), loop).result()
+    return _client
+
+
+def run_sync(coro):
+    """Run a client coroutine on the background loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def iter_sync(agen):
+    """Iterate an async generator from synchronous code"""
+    loop = _get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(agen.aclose(), loop).result()
@@ -1,37 +1,36 @@
 import os
-import requests
+import re
 from dotenv import load_dotenv
+import llm_cache
+import llm_client
+from tracing import span
+from scene_validator import validate_scene_code
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = "gemini-2.0-flash"
 
-def generate_manim_code(prompt: str) -> str:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={GEMINI_API_KEY}"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-
-    # Broader system prompt for diverse 2D animation
-    system_prompt = (
-        "You are a Python expert specialized in using the Manim Community Edition to create 2D animations. "
-        "Given a user's description of a 2D animation, return a complete, well-paced Scene class. "
-        "You can use any Manim objects like shapes, text, formulas, number lines, graphs, etc. "
-        "Ensure clarity, pacing (~6–10 seconds), and appropriate use of animations like Create, Transform, Write, FadeIn, etc."
-        "generate only the Python code needed to create the animation using Manim. "
-        "Do not include explanations, comments, markdown formatting, or any extra text. "
-        "Return only the valid code."
+# Broader system prompt for diverse 2D animation
+SYSTEM_PROMPT = (
+    "You are a Python expert specialized in using the Manim Community Edition to create 2D animations. "
+    "Given a user's description of a 2D animation, return a complete, well-paced Scene class. "
+    "You can use any Manim objects like shapes, text, formulas, number lines, graphs, etc. "
+    "Ensure clarity, pacing (~6–10 seconds), and appropriate use of animations like Create, Transform, Write, FadeIn, etc."
+    "generate only the Python code needed to create the animation using Manim. "
+    "Do not include explanations, comments, markdown formatting, or any extra text. "
+    "Return only the valid code."
 
-    )
+)
 
+def _request_body(prompt: str):
     enriched_prompt = (
         f"{prompt}\n\nMake sure the animation is visually clear, expressive, and timed well."
     )
 
-    full_prompt = system_prompt + "\n\n" + enriched_prompt
+    full_prompt = SYSTEM_PROMPT + "\n\n" + enriched_prompt
 
-    data = {
+    return {
         "contents": [
             {
                 "parts": [
@@ -42,10 +41,32 @@ def generate_manim_code(prompt: str) -> str:
             }
         ]
     }
-    
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    res_json = response.json()
+
+def strip_code_fences(generated_text: str) -> str:
+    if generated_text.startswith("```python"):
+        generated_text = generated_text.removeprefix("```python").strip()
+    elif generated_text.startswith("```"):
+        generated_text = generated_text.removeprefix("```").strip()
+
+    if generated_text.endswith("```"):
+        generated_text = generated_text[:-3].strip()
+    return generated_text
+
+def generate_manim_code(prompt: str, use_cache: bool = True) -> str:
+    # Repeat prompts are answered from the cache, use_cache=False asks the model for a fresh variation
+    cache_key = llm_cache.make_key(prompt, SYSTEM_PROMPT, GEMINI_MODEL)
+    if use_cache:
+        with span("llm.cache"):
+            cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    data = _request_body(prompt)
+
+    # Pooled client: keep-alive connections, timeouts, rate limiting and retries on 429/5xx
+    client = llm_client.get_client(GEMINI_API_KEY)
+    with span("llm.generate"):
+        res_json = llm_client.run_sync(client.generate_content(GEMINI_MODEL, data))
 
     # Debug print if needed
     #print("Full response JSON:", res_json)
@@ -56,17 +77,109 @@ def generate_manim_code(prompt: str) -> str:
         raise ValueError("Failed to parse Gemini response.") from e
 
     # Strip code fences
-    if generated_text.startswith("```python"):
-        generated_text = generated_text.removeprefix("```python").strip()
-    elif generated_text.startswith("```"):
-        generated_text = generated_text.removeprefix("```").strip()
+    generated_text = strip_code_fences(generated_text)
 
-    if generated_text.endswith("```"):
-        generated_text = generated_text[:-3].strip()
-
-    # Optional: Validate that it contains a Scene class
-    if "class" not in generated_text or "Scene" not in generated_text:
-        raise ValueError("The response does not contain a valid Manim Scene class.")
+    # Parse the code and check for a Scene subclass before it can reach a render worker
+    with span("llm.validate"):
+        validate_scene_code(generated_text)
 
     #print("Generated Manim code:\n", generated_text)
+    with span("llm.cache_store"):
+        llm_cache.put(cache_key, generated_text)
     return generated_text
+
+SCENE_CLASS_RE = re.compile(r"^class\s+(\w+)\s*\(([^)]*Scene[^)]*)\)\s*:", re.MULTILINE)
+
+class IncrementalCode:
+    """Strips code fences from a streamed response as it grows.
+
+    feed() returns only text that can no longer change: an opening fence line is
+    dropped once complete, and a trailing line that could still become the closing
+    fence is held back until more text arrives.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.emitted = ""
+        self.scene_class = None
+
+    def _stable_text(self):
+        text = self.raw
+        if text.startswith("`"):
+            newline = text.find("\n")
+            if newline == -1:
+                return ""
+            text = text[newline + 1:].lstrip()
+        text = text.rstrip()
+        last_newline = text.rfind("\n")
+        if text[last_newline + 1:].lstrip().startswith("`"):
+            text = text[:last_newline + 1].rstrip()
+        return text
+
+    def feed(self, chunk: str) -> str:
+        self.raw += chunk
+        stable = self._stable_text()
+        if not stable.startswith(self.emitted):
+            return ""
+        delta = stable[len(self.emitted):]
+        self.emitted = stable
+        if self.scene_class is None:
+            match = SCENE_CLASS_RE.search(stable)
+            if match:
+                self.scene_class = match.group(1)
+        return delta
+
+    def finish(self):
+        """Return (code, delta, reset): delta completes what was emitted, unless reset is True
+        in which case code replaces everything sent so far"""
+        code = strip_code_fences(self.raw)
+        if code.startswith(self.emitted):
+            return code, code[len(self.emitted):], False
+        return code, "", True
+
+def stream_manim_code(prompt: str, use_cache: bool = True):
+    """Generate scene code with streamGenerateContent, yielding events as the model writes.
+
+    Yields ("code", delta) for new code text, ("scene", class_name) once a Scene subclass
+    has been seen, ("reset", code) if final fence stripping changed already sent text,
+    and finally ("done", code) with the complete validated code.
+    """
+    cache_key = llm_cache.make_key(prompt, SYSTEM_PROMPT, GEMINI_MODEL)
+    if use_cache:
+        with span("llm.cache"):
+            cached = llm_cache.get(cache_key)
+        if cached is not None:
+            yield ("code", cached)
+            match = SCENE_CLASS_RE.search(cached)
+            if match:
+                yield ("scene", match.group(1))
+            yield ("done", cached)
+            return
+
+    client = llm_client.get_client(GEMINI_API_KEY)
+    code = IncrementalCode()
+    for chunk in llm_client.iter_sync(client.stream_generate_content(GEMINI_MODEL, _request_body(prompt))):
+        try:
+            text = chunk["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            # Safety and usage-only chunks carry no text
+            continue
+        scene_class = code.scene_class
+        delta = code.feed(text)
+        if delta:
+            yield ("code", delta)
+        if scene_class is None and code.scene_class is not None:
+            yield ("scene", code.scene_class)
+
+    generated_text, delta, reset = code.finish()
+    if reset:
+        yield ("reset", generated_text)
+    elif delta:
+        yield ("code", delta)
+
+    with span("llm.validate"):
+        validate_scene_code(generated_text)
+
+    with span("llm.cache_store"):
+        llm_cache.put(cache_key, generated_text)
+    yield ("done", generated_text)
@@ -1,45 +1,85 @@
 # backend/main.py
-from fastapi import FastAPI, Request, HTTPException, Depends
+import tracing  # first: sets up metrics storage before anything records into it
+from fastapi import FastAPI, Request, Response, HTTPException, Depends
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from llm_engine import generate_manim_code
-from manim_engine import save_and_render
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from llm_engine import stream_manim_code
+from job_queue import (
+    submit_generate_job, submit_render_job, get_job, cancel_job, check_admission, shutdown_executor, QueueFull
+)
+from scene_validator import validate_scene_code, SceneValidationError
+from render_worker import RenderError, RenderKilled
+from video_upload import VIDEO_STORE, VIDEO_STORE_DIR
+import auth_cache
+import quota
+import code_index
+import usage_stats
+import render_workspace
+import batch_jobs
+import frame_preview
+import readiness
+# Imported for its side effect: initializes the Firebase app
+import firebase_config  # noqa: F401
+import razorpay_config
 from fastapi.staticfiles import StaticFiles
-import re
 import os
-from firebase_admin import db, auth as firebase_auth, credentials
-import firebase_admin
+import asyncio
+from contextlib import asynccontextmanager
+from firebase_admin import db
 from datetime import datetime
-from typing import Optional
-import razorpay
-from razorpay_config import razorpay_client, SUBSCRIPTION_PLANS, SUBSCRIPTION_PLAN_IDS
+from typing import Optional, List
+from razorpay_config import SUBSCRIPTION_PLANS, SUBSCRIPTION_PLAN_IDS
 from dotenv import load_dotenv
 import hmac
 import hashlib
 import json
+import time
 
 load_dotenv()
 
-# Initialize Firebase with Realtime Database (only once)
-if not firebase_admin._apps:
-    cred = credentials.Certificate("../serviceAccountKey.json")
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': 'https://prompmotion-auth-default-rtdb.firebaseio.com/'
-    })
-
 class PromptInput(BaseModel):
     prompt: str
+    fresh: bool = False  # skip the prompt cache and ask the LLM for a new variation
+
+class BatchPromptInput(BaseModel):
+    prompts: List[str]
+    fresh: bool = False
 
-app = FastAPI()
-app.mount("/media", StaticFiles(directory="media"), name="media")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing here waits on the network: /health answers right away, /ready once the
+    # dependencies have been warmed in the background
+    auth_cache.start_cert_prefetch()
+    render_workspace.start_janitor()
+    frame_preview.start()
+    warm_up = asyncio.create_task(readiness.warm_up())
+    yield
+    warm_up.cancel()
+    shutdown_executor()
+    frame_preview.stop()
 
-# Add debugging middleware
-@app.middleware("http")
-async def debug_middleware(request: Request, call_next):
-    print(f"Request headers: {request.headers}")
-    response = await call_next(request)
-    print(f"Response headers: {response.headers}")
-    return response
+app = FastAPI(lifespan=lifespan)
+if VIDEO_STORE == "local":
+    # Serve the local fake object store used instead of Firebase Storage in local runs
+    os.makedirs(VIDEO_STORE_DIR, exist_ok=True)
+    app.mount("/video_store", StaticFiles(directory=VIDEO_STORE_DIR), name="video_store")
+
+if tracing.TRACING_ENABLED:
+    @app.middleware("http")
+    async def request_metrics(request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Label by route template (/jobs/{job_id}), not the raw path
+            route = request.scope.get("route")
+            tracing.observe_request(request.method, getattr(route, "path", "unmatched"), status,
+                                    time.perf_counter() - start)
 
 # Configure CORS
 origins = [
@@ -59,65 +99,192 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+@app.get("/metrics")
+def metrics():
+    if not tracing.TRACING_ENABLED:
+        raise HTTPException(status_code=404, detail="Tracing is disabled")
+    body, content_type = tracing.render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/health")
 async def health_check():
+    # Liveness only, never touches a dependency
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-def get_current_user(request: Request):
+@app.get("/ready")
+async def ready_check(response: Response):
+    ready, checks = readiness.status()
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "starting", "checks": checks, "timestamp": datetime.now().isoformat()}
+
+def verify_token(request: Request):
+    """Shared auth dependency: the decoded Firebase ID token of the caller"""
     auth_header = request.headers.get('Authorization')
     if not auth_header or not auth_header.startswith('Bearer '):
         raise HTTPException(status_code=401, detail="Missing or invalid auth header")
     id_token = auth_header.split(' ')[1]
     try:
-        decoded_token = firebase_auth.verify_id_token(id_token)
-        return decoded_token['uid']
+        # Cached until the token's exp, so polling endpoints don't re-verify signatures
+        with tracing.span("auth.verify"):
+            return auth_cache.verify_id_token(id_token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid auth token")
 
-ACCOUNT_LIMITS = {
-    'free': 5,
-    'plus': 25,
-    'pro': 60,
-}
-
-def can_generate(uid, account_type):
-    today = datetime.now().strftime('%Y-%m-%d')
-    usage_ref = db.reference(f'users/{uid}/dailyUsage/{today}')
-    usage = usage_ref.get() or 0
-    limit = ACCOUNT_LIMITS.get(account_type, 5)
-    if usage >= limit:
-        return False, usage, limit
-    usage_ref.set(usage + 1)
-    return True, usage + 1, limit
+def get_current_user(decoded_token: dict = Depends(verify_token)):
+    return decoded_token['uid']
 
-@app.post("/generate")
-async def generate_video(data: PromptInput, uid: str = Depends(get_current_user)):
-    # Get account type
-    account_type = db.reference(f'users/{uid}/accountType').get() or 'free'
-    allowed, usage, limit = can_generate(uid, account_type)
+def charge_generation(uid: str, count: int = 1):
+    """Count generations against the user's daily quota, raising 403 if they don't all fit"""
+    # Check and increment in one conditional write, concurrent requests can't both pass the limit
+    with tracing.span("quota.charge"):
+        allowed, usage, limit, account_type = quota.charge(uid, count)
     if not allowed:
+        message = f"Daily limit reached ({limit} generations for {account_type} tier)."
+        if count > 1:
+            message = f"{count} generations don't fit in today's remaining {max(0, limit - usage)} ({limit} for {account_type} tier)."
         raise HTTPException(
             status_code=403,
             detail={
                 "code": "LIMIT_REACHED",
-                "message": f"Daily limit reached ({limit} generations for {account_type} tier).",
+                "message": message,
                 "usage": usage,
                 "limit": limit,
                 "account_type": account_type
             }
         )
-    code = generate_manim_code(data.prompt)
-    result = save_and_render(code, uid, data.prompt)
-    video_url = result["video_url"]
-    scene_file_id = result["file_id"]
+    return account_type, usage, limit
+
+def queue_full_error(e: QueueFull):
+    return HTTPException(
+        status_code=429,
+        detail={"code": "QUEUE_FULL", "message": str(e), "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def admit(uid: str, batch_size: int = 0):
+    """Turn the request away with 429 while the render queue is saturated, before charging for it"""
+    try:
+        check_admission(uid, batch_size)
+    except QueueFull as e:
+        raise queue_full_error(e)
+
+@app.post("/generate")
+def generate_video(data: PromptInput, uid: str = Depends(get_current_user)):
+    admit(uid)
+    account_type, usage, limit = charge_generation(uid)
+    # LLM generation and rendering run in the worker pool, poll GET /jobs/{job_id} for progress
+    try:
+        job_id, scene_file_id, wait = submit_generate_job(uid, data.prompt, account_type, use_cache=not data.fresh)
+    except QueueFull as e:
+        quota.refund(uid)
+        raise queue_full_error(e)
     return {
-        "video_url": video_url,
+        "job_id": job_id,
+        "status": "queued",
         "scene_file_id": scene_file_id,
+        "estimated_wait": wait,
         "usage": usage,
         "limit": limit,
         "account_type": account_type
     }
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate/stream")
+def generate_video_stream(data: PromptInput, uid: str = Depends(get_current_user)):
+    """Stream generated code to the client as server-sent events, then queue its render"""
+    admit(uid)
+    account_type, usage, limit = charge_generation(uid)
+
+    def events():
+        try:
+            for event, payload in stream_manim_code(data.prompt, use_cache=not data.fresh):
+                if event == "code":
+                    yield sse_event("code", {"delta": payload})
+                elif event == "scene":
+                    yield sse_event("scene", {"class_name": payload})
+                elif event == "reset":
+                    yield sse_event("reset", {"code": payload})
+                elif event == "done":
+                    # Already validated by stream_manim_code. Queue the render the moment the stream closes, poll GET /jobs/{job_id} for the video
+                    job_id, scene_file_id, wait = submit_render_job(uid, payload, None, account_type, data.prompt)
+                    yield sse_event("done", {
+                        "job_id": job_id,
+                        "status": "queued",
+                        "scene_file_id": scene_file_id,
+                        "estimated_wait": wait,
+                        "usage": usage,
+                        "limit": limit,
+                        "account_type": account_type
+                    })
+        except SceneValidationError as e:
+            quota.refund(uid)
+            yield sse_event("error", {"code": "INVALID_SCENE", "message": str(e), "errors": e.errors})
+        except QueueFull as e:
+            # The queue filled up while the code streamed, it can still be rendered with PUT /code later
+            quota.refund(uid)
+            yield sse_event("error", {"code": "QUEUE_FULL", "message": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            print(f"Error streaming generation: {str(e)}")
+            yield sse_event("error", {"message": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/generate/batch")
+async def generate_video_batch(data: BatchPromptInput, uid: str = Depends(get_current_user)):
+    """Generate and render a list of prompts at once, streaming each item's result as it finishes"""
+    if not data.prompts:
+        raise HTTPException(status_code=400, detail="No prompts given")
+    if len(data.prompts) > batch_jobs.max_prompts():
+        raise HTTPException(status_code=400, detail=f"At most {batch_jobs.max_prompts()} prompts per batch")
+    await run_in_threadpool(admit, uid, len(data.prompts))
+    account_type, usage, limit = await run_in_threadpool(charge_generation, uid, len(data.prompts))
+
+    # Started here rather than in the stream, so the batch finishes even if the client goes away
+    batch_id, updates = batch_jobs.start_batch(uid, data.prompts, account_type, use_cache=not data.fresh)
+
+    async def events():
+        yield sse_event("batch", {
+            "batch_id": batch_id,
+            "count": len(data.prompts),
+            "usage": usage,
+            "limit": limit,
+            "account_type": account_type
+        })
+        finished = {}
+        async for update in updates:
+            yield sse_event("item", update)
+            if update["status"] != "queued":
+                finished[update["status"]] = finished.get(update["status"], 0) + 1
+        yield sse_event("done", {"batch_id": batch_id, **finished})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/jobs/{job_id}")
+def get_job_status(job_id: str, uid: str = Depends(get_current_user)):
+    job = get_job(uid, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, **job}
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job_endpoint(job_id: str, uid: str = Depends(get_current_user)):
+    # Frees the render worker right away, the job ends up "killed" with kill_reason "cancelled"
+    job = cancel_job(uid, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, **job}
+
 @app.get("/code/{scene_file_id}")
 def get_code(scene_file_id: str, uid: str = Depends(get_current_user)):
     # Get code from Firebase Realtime Database
@@ -137,149 +304,111 @@ def update_code(scene_file_id: str, update: CodeUpdate, uid: str = Depends(get_c
     print(f"Received code for scene {scene_file_id}:")
     print(update.code[:1000])  # Print first 1000 chars for sanity check
 
-    # Update code in Firebase and render new video in place
-    result = save_and_render(update.code, uid, "", scene_file_id)
-    video_url = result["video_url"]
-    new_scene_file_id = result["file_id"]
+    # Reject code that can't render before it takes a slot in the render pool
+    try:
+        validate_scene_code(update.code)
+    except SceneValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"code": "INVALID_SCENE", "message": str(e), "errors": e.errors}
+        )
+
+    # Re-render in place in the worker pool, poll GET /jobs/{job_id} for the new video
+    account_type = quota.get_account_type(uid)
+    try:
+        job_id, scene_file_id, wait = submit_render_job(uid, update.code, scene_file_id, account_type)
+    except QueueFull as e:
+        raise queue_full_error(e)
 
-    print(f"Updated code and rendered new video with ID: {new_scene_file_id}")
+    print(f"Queued render job {job_id} for scene {scene_file_id}")
 
     return {
-        "status": "updated",
-        "video_url": video_url,
-        "scene_file_id": new_scene_file_id
+        "status": "queued",
+        "job_id": job_id,
+        "scene_file_id": scene_file_id,
+        "estimated_wait": wait
     }
 
-@app.get("/my-codes")
-def list_my_codes(uid: str = Depends(get_current_user)):
-    # List all codes for the current user
-    codes_ref = db.reference(f'users/{uid}/codes')
-    codes_data = codes_ref.get()
-    if not codes_data:
-        return {"codes": []}
-    # Return a list of code entries with their scene_file_id
-    return {"codes": [
-        {"scene_file_id": k, **v} for k, v in codes_data.items()
-    ]}
+class PreviewInput(BaseModel):
+    code: str
+    frames: int = 1  # 1 is the last frame, more are sampled evenly across the scene
+    format: str = frame_preview.POSTER_FORMAT
 
-# --- USAGE STATS ENDPOINTS ---
-def reset_daily_limits(uid: str, account_type: str):
-    """Reset daily usage limits for a user"""
-    today = datetime.now().strftime('%Y-%m-%d')
-    usage_ref = db.reference(f'users/{uid}/dailyUsage/{today}')
-    current_usage = usage_ref.get() or 0
-    
-    # Get the limit based on account type
-    limit = ACCOUNT_LIMITS.get(account_type, 5)
-    
-    # Update usage stats with remaining animations
-    stats_ref = db.reference(f'usage_stats/{uid}')
-    stats = stats_ref.get() or {
-        'totalAnimations': 0,
-        'remainingAnimations': limit,
-        'totalRenderTime': 0,
-        'averageRenderTime': 0,
-        'lastUpdated': datetime.now().isoformat(),
-        'account_type': account_type
+@app.post("/code/{scene_file_id}/preview")
+def preview_code(scene_file_id: str, data: PreviewInput, uid: str = Depends(get_current_user)):
+    # Stills in about a second, without saving the code or rendering the video (PUT /code does that)
+    if not 1 <= data.frames <= frame_preview.FRAME_PREVIEW_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"frames must be between 1 and {frame_preview.FRAME_PREVIEW_MAX_FRAMES}")
+    if data.format not in frame_preview.IMAGE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(frame_preview.IMAGE_FORMATS)}")
+    try:
+        scene_name = validate_scene_code(data.code)
+    except SceneValidationError as e:
+        raise HTTPException(
+            status_code=422,
+            detail={"code": "INVALID_SCENE", "message": str(e), "errors": e.errors}
+        )
+
+    try:
+        preview = frame_preview.render_preview(data.code, scene_name, data.frames, data.format)
+    except QueueFull as e:
+        raise queue_full_error(e)
+    except RenderKilled as e:
+        raise HTTPException(status_code=422, detail={"code": "RENDER_KILLED", "reason": e.reason, "message": str(e)})
+    except RenderError as e:
+        raise HTTPException(status_code=422, detail={"code": "RENDER_FAILED", "message": str(e)})
+
+    # Previewing the saved code of a scene rendered before posters existed gives it one
+    if preview["poster_url"]:
+        entry = code_index.get_entry(uid, scene_file_id)
+        if entry and not entry.get('poster_url') and \
+                db.reference(f'users/{uid}/codes/{scene_file_id}/code').get() == data.code:
+            code_index.write_scene(uid, scene_file_id, {'poster_url': preview["poster_url"]})
+    return preview
+
+@app.get("/my-codes")
+def list_my_codes(limit: int = code_index.DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                  uid: str = Depends(get_current_user)):
+    # Newest first from the metadata index, fetch the code itself with GET /code/{scene_file_id}
+    entries, next_cursor = code_index.list_page(uid, limit, cursor)
+    return {
+        "codes": [{"scene_file_id": k, **v} for k, v in entries],
+        "next_cursor": next_cursor
     }
-    
-    # Calculate remaining animations
-    remaining = max(0, limit - current_usage)
-    stats['remainingAnimations'] = remaining
-    stats['lastUpdated'] = datetime.now().isoformat()
-    stats_ref.set(stats)
-    
-    return remaining
 
+# --- USAGE STATS ENDPOINTS ---
 @app.get("/usage-stats")
-async def get_usage_stats(request: Request):
+def get_usage_stats(uid: str = Depends(get_current_user)):
     try:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="No token provided")
-        id_token = auth_header.split("Bearer ")[1]
-        decoded_token = firebase_auth.verify_id_token(id_token)
-        uid = decoded_token["uid"]
-
-        # Get user's account type
-        user_ref = db.reference(f'users/{uid}')
-        user_data = user_ref.get() or {}
-        account_type = user_data.get('accountType', 'free')
-        
-        # Reset daily limits and get updated stats
-        remaining = reset_daily_limits(uid, account_type)
-        
-        # Get the limit based on account type
-        limit = ACCOUNT_LIMITS.get(account_type, 5)
-
-        ref = db.reference(f'usage_stats/{uid}')
-        stats = ref.get()
-        if not stats:
-            stats = {
-                'totalAnimations': 0,
-                'remainingAnimations': remaining,
-                'totalRenderTime': 0,
-                'averageRenderTime': 0,
-                'lastUpdated': datetime.now().isoformat(),
-                'account_type': account_type,
-                'limit': limit
-            }
-            ref.set(stats)
-        else:
-            # Update remaining animations and account type
-            stats['remainingAnimations'] = remaining
-            stats['account_type'] = account_type
-            stats['limit'] = limit
-            ref.update(stats)
-
-        return stats
+        return usage_stats.get_stats(uid)
     except Exception as e:
         print(f"Error getting usage stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recent-activity")
-async def get_recent_activity(request: Request):
+def get_recent_activity(response: Response, limit: int = 10, cursor: Optional[str] = None,
+                        uid: str = Depends(get_current_user)):
     try:
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(status_code=401, detail="No token provided")
-        id_token = auth_header.split("Bearer ")[1]
-        decoded_token = firebase_auth.verify_id_token(id_token)
-        uid = decoded_token["uid"]
-        # Fetch from codes instead of animations
-        ref = db.reference(f'users/{uid}/codes')
-        codes = ref.get()
-        if not codes:
-            return []
-        activity_list = []
-        for file_id, code_data in codes.items():
-            activity_list.append({
+        entries, next_cursor = code_index.list_page(uid, limit, cursor)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return [
+            {
                 'id': file_id,
                 'name': code_data.get('title', 'Untitled'),
                 'date': code_data.get('timestamp', ''),
                 'duration': code_data.get('render_time', '0'),
-                'status': code_data.get('status', 'completed')
-            })
-        activity_list.sort(key=lambda x: x['date'], reverse=True)
-        return activity_list[:10]
+                'status': code_data.get('status', 'completed'),
+                'poster_url': code_data.get('poster_url')
+            }
+            for file_id, code_data in entries
+        ]
     except Exception as e:
         print(f"Error getting recent activity: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Note: save_and_render should be updated in manim_engine.py to update usage stats as in the app/main.py version.
 
-async def verify_token(request: Request):
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        raise HTTPException(status_code=401, detail='Invalid authorization header')
-    
-    token = auth_header.split('Bearer ')[1]
-    try:
-        decoded_token = firebase_auth.verify_id_token(token)
-        return decoded_token
-    except Exception as e:
-        raise HTTPException(status_code=401, detail='Invalid token')
-
 @app.post("/api/create-razorpay-order")
 async def create_razorpay_order(request: Request):
     try:
@@ -308,11 +437,17 @@ async def create_razorpay_order(request: Request):
         if plan not in SUBSCRIPTION_PLAN_IDS:
             print(f"No plan ID found for plan: {plan}")
             raise HTTPException(status_code=400, detail=f"No plan ID found for plan: {plan}")
-        
+
+        # Checked once per RAZORPAY_PLAN_CHECK_TTL instead of at import
+        plans = await razorpay_config.validate_plans()
+        if not plans["valid"]:
+            raise HTTPException(status_code=503, detail=f"Payments are unavailable right now: {plans['error']}")
+
+        import razorpay
         try:
             print(f"Using plan ID: {SUBSCRIPTION_PLAN_IDS[plan]}")
             # Create a subscription
-            subscription = razorpay_client.subscription.create({
+            subscription = razorpay_config.get_client().subscription.create({
                 "plan_id": SUBSCRIPTION_PLAN_IDS[plan],
                 "customer_notify": 1,
                 "quantity": 1,
@@ -390,15 +525,9 @@ async def razorpay_webhook(request: Request):
                     'current_period_end': subscription['end_at'],
                 }
             })
+            quota.set_account_type(uid, plan)
             print(f"Activated {plan} subscription for user {uid}")
-            # Update usage_stats for the new plan
-            limit = ACCOUNT_LIMITS.get(plan, 5)
-            usage_stats_ref = db.reference(f'usage_stats/{uid}')
-            usage_stats = usage_stats_ref.get() or {}
-            usage_stats['account_type'] = plan
-            usage_stats['limit'] = limit
-            usage_stats['remainingAnimations'] = max(0, limit - (db.reference(f"users/{uid}/dailyUsage/{datetime.now().strftime('%Y-%m-%d')}").get() or 0))
-            usage_stats_ref.set(usage_stats)
+            usage_stats.set_plan(uid, plan)
     
     elif event_type == 'subscription.charged':
         # Handle successful payment for subscription renewal
@@ -434,14 +563,8 @@ async def razorpay_webhook(request: Request):
                     'current_period_end': None,
                 }
             })
-            # Update usage_stats for free plan
-            limit = ACCOUNT_LIMITS.get('free', 5)
-            usage_stats_ref = db.reference(f'usage_stats/{uid}')
-            usage_stats = usage_stats_ref.get() or {}
-            usage_stats['account_type'] = 'free'
-            usage_stats['limit'] = limit
-            usage_stats['remainingAnimations'] = max(0, limit - (db.reference(f"users/{uid}/dailyUsage/{datetime.now().strftime('%Y-%m-%d')}").get() or 0))
-            usage_stats_ref.set(usage_stats)
+            quota.set_account_type(uid, 'free')
+            usage_stats.set_plan(uid, 'free')
             print(f"Cancelled subscription for user {uid}")
     
     return {"status": "success"}
@@ -471,7 +594,7 @@ async def cancel_subscription(request: Request):
         
         # Cancel the subscription in Razorpay
         try:
-            razorpay_client.subscription.cancel(subscription_id)
+            razorpay_config.get_client().subscription.cancel(subscription_id)
         except Exception as e:
             print(f"Error cancelling Razorpay subscription: {str(e)}")
             raise HTTPException(status_code=400, detail="Failed to cancel subscription in Razorpay. Please try again or contact support.")
@@ -488,14 +611,8 @@ async def cancel_subscription(request: Request):
             }
         })
         
-        # Update usage_stats for free plan
-        limit = ACCOUNT_LIMITS.get('free', 5)
-        usage_stats_ref = db.reference(f'usage_stats/{uid}')
-        usage_stats = usage_stats_ref.get() or {}
-        usage_stats['account_type'] = 'free'
-        usage_stats['limit'] = limit
-        usage_stats['remainingAnimations'] = max(0, limit - (db.reference(f"users/{uid}/dailyUsage/{datetime.now().strftime('%Y-%m-%d')}").get() or 0))
-        usage_stats_ref.set(usage_stats)
+        quota.set_account_type(uid, 'free')
+        usage_stats.set_plan(uid, 'free')
         
         return {"success": True, "message": "Successfully cancelled subscription and downgraded to free tier"}
     except HTTPException:
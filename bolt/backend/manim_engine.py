@@ -1,26 +1,218 @@
 import os
+import signal
 import subprocess
 import uuid
-from firebase_admin import storage, db
+from firebase_admin import db
 from datetime import datetime
-from firebase_config import firebase_app
-import shutil
+# Imported for its side effect: initializes the Firebase app
+import firebase_config  # noqa: F401
+import render_cache
+import render_workspace
+import code_index
+import usage_stats
+import split_render
+import hls
+import frame_preview
+from concurrent.futures import ThreadPoolExecutor
+from tracing import span
+from render_worker import get_renderer, apply_rlimits, RenderError, RenderKilled, RENDER_TIMEOUT_SECONDS
+from scene_validator import validate_scene_code, SceneValidationError
+from video_upload import upload_video
 
-OUTPUT_DIR = "Video_codes"
+# "warm" renders in a long-lived worker with manim pre-imported, "cli" spawns the manim CLI per job
+RENDER_BACKEND = os.getenv("RENDER_BACKEND", "warm")
 
-def save_and_render(code: str, uid: str, prompt: str = "", file_id: str = None):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    if file_id is None:
-        file_id = str(uuid.uuid4())[:8]
-    file_path = f"{OUTPUT_DIR}/scene_{file_id}.py"
-    video_folder = f"media/videos/scene_{file_id}/2160p60"
+# manim quality presets: CLI flag, config name and the folder manim writes the video to
+RENDER_QUALITIES = {
+    'low': {'flag': '-ql', 'config': 'low_quality', 'folder': '480p15'},
+    'medium': {'flag': '-qm', 'config': 'medium_quality', 'folder': '720p30'},
+    'high': {'flag': '-qh', 'config': 'high_quality', 'folder': '1080p60'},
+    'production': {'flag': '-qp', 'config': 'production_quality', 'folder': '1440p60'},
+    'fourk': {'flag': '-qk', 'config': 'fourk_quality', 'folder': '2160p60'},
+}
+
+# What each account type gets, matching SUBSCRIPTION_PLANS in razorpay_config.py.
+# Progressive tiers get a fast low quality preview first and the full render afterwards.
+TIER_RENDER_SETTINGS = {
+    'free': {'quality': 'medium', 'progressive': False},
+    'plus': {'quality': 'fourk', 'progressive': True},
+    'pro': {'quality': 'fourk', 'progressive': True},
+}
+
+PREVIEW_QUALITY = 'low'
+
+def get_render_settings(account_type: str):
+    return TIER_RENDER_SETTINGS.get(account_type, TIER_RENDER_SETTINGS['free'])
+
+def render_cache_key(code: str, quality: str, scene_name: str):
+    return render_cache.make_key(code, scene_name, [RENDER_QUALITIES[quality]['flag']])
+
+def _render_cli(file_path: str, scene_name: str, media_dir: str, video_folder: str, quality: str, on_start=None):
+    # New session: the manim process and the ffmpeg it starts can be killed as one group
+    process = subprocess.Popen(
+        ["manim", file_path, scene_name, RENDER_QUALITIES[quality]['flag'], "--media_dir", media_dir],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        apply_rlimits(process.pid)
+    except (OSError, AttributeError) as e:
+        print(f"Warning: Failed to set render limits: {e}")
+    if on_start:
+        on_start(process.pid)
+
+    try:
+        stdout, stderr = process.communicate(timeout=RENDER_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.communicate()
+        return {"status": "killed", "reason": "timeout",
+                "error": f"Render took longer than {RENDER_TIMEOUT_SECONDS:g}s"}
+
+    if process.returncode != 0:
+        print("❌ Manim render failed.")
+        print("STDOUT:", stdout)
+        print("STDERR:", stderr)
+        if process.returncode == -signal.SIGXCPU:
+            return {"status": "killed", "reason": "cpu_limit", "error": "Render used too much CPU time"}
+        if process.returncode < 0:
+            return {"status": "killed", "reason": "killed",
+                    "error": f"Render process was killed by signal {-process.returncode}"}
+        if "MemoryError" in stderr:
+            return {"status": "killed", "reason": "memory_limit", "error": "Render used too much memory"}
+        return {"status": "failed", "error": stderr}
+
+    # Now check the folder for mp4 files
+    try:
+        print(video_folder)
+        files = os.listdir(video_folder)
+        print(files)
+    except FileNotFoundError:
+        print("⚠️ Render folder not found.")
+        return {"status": "failed", "error": "Render folder not found"}
+
+    mp4_files = [f for f in files if f.endswith(".mp4")]
+    if not mp4_files:
+        print("⚠️ No .mp4 files found after rendering.")
+        return {"status": "failed", "error": "No MP4 files found"}
+
+    video_file = mp4_files[0]  # take first mp4 found
+    return {"status": "completed", "video_path": f"{video_folder}/{video_file}"}
+
+def _render_and_upload(code: str, file_id: str, quality: str, scene_name: str, on_status=None, on_start=None,
+                       cache_checked: bool = False):
+    """Render code at the given quality and upload it, or reuse an identical earlier render.
+
+    cache_checked=True means the caller already peeked and found no cached render, it isn't read again.
+    Returns a dict with status ('completed', 'failed' or 'killed'), and video_url, manifest_url
+    (None without an HLS ladder), poster_url, render_time and cached on success or error on
+    failure (plus reason when killed).
+    """
+    # Identical code with identical render settings produces the same video, reuse it
+    cache_key = render_cache_key(code, quality, scene_name)
+    with span("render.cache_lookup"):
+        cached = render_cache.lookup(cache_key, read=not cache_checked)
+    if cached:
+        print(f"Render cache hit for scene {file_id}: {cached['blob_path']}")
+        return {"status": "completed", "video_url": cached['video_url'], "manifest_url": cached.get('manifest_url'),
+                "poster_url": cached.get('poster_url'), "render_time": 0, "cached": True}
+
+    # The janitor in the API process keeps the workspaces within their budget
+    with render_workspace.open_workspace(file_id) as workspace:
+        result = _render_in_workspace(workspace, code, file_id, quality, scene_name, cache_key, on_status, on_start)
+        if result["status"] != "completed":
+            render_workspace.discard_partials(workspace)
+    return result
+
+def _render_in_workspace(workspace: str, code: str, file_id: str, quality: str, scene_name: str, cache_key: str,
+                         on_status=None, on_start=None):
+    file_path = f"{workspace}/scene_{file_id}.py"
+    media_dir = f"{workspace}/media"
+    video_folder = f"{media_dir}/videos/scene_{file_id}/{RENDER_QUALITIES[quality]['folder']}"
 
     # Save code to file before running manim
     with open(file_path, "w") as f:
         f.write(code)
 
-    code_ref = db.reference(f'users/{uid}/codes/{file_id}')
-    existing = code_ref.get()
+    # Run manim render first
+    start_time = datetime.now()
+    if RENDER_BACKEND == "warm":
+        # Long scenes can be split across several warm renderers, see split_render.py
+        render = split_render.render if split_render.enabled() else get_renderer().render
+        try:
+            with span("render.manim"):
+                video_path = render(file_path, scene_name, RENDER_QUALITIES[quality]['config'],
+                                    media_dir, on_start=on_start)
+        except RenderKilled as e:
+            print(f"Render of scene {file_id} stopped ({e.reason}): {str(e)}")
+            return {"status": "killed", "reason": e.reason, "error": str(e)}
+        except RenderError as e:
+            print("❌ Manim render failed.")
+            print("ERROR:", str(e))
+            return {"status": "failed", "error": str(e)}
+    else:
+        with span("render.manim"):
+            result = _render_cli(file_path, scene_name, media_dir, video_folder, quality, on_start)
+        if result["status"] != "completed":
+            return result
+        video_path = result["video_path"]
+
+    # After successful render, calculate render time
+    end_time = datetime.now()
+    render_time = (end_time - start_time).total_seconds() / 60  # in minutes (float)
+    video_file = os.path.basename(video_path)
+
+    if on_status:
+        on_status("uploading")
+
+    # Upload video to Firebase Storage under its content address so that
+    # later edits of this scene never overwrite a video other records point at
+    blob_path = f'renders/{cache_key}/{video_file}'
+    manifest_url = None
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        # The poster and HLS ladder are made while the MP4 uploads. Previews are replaced within
+        # minutes, they get no ladder.
+        poster = pool.submit(frame_preview.publish_poster, video_path,
+                             f'renders/{cache_key}/poster.{frame_preview.POSTER_FORMAT}')
+        ladder = None
+        if hls.HLS_ENABLED and quality != PREVIEW_QUALITY:
+            height, fps = (int(n) for n in RENDER_QUALITIES[quality]['folder'].split('p'))
+            ladder = pool.submit(hls.publish, video_path, f"{workspace}/hls", f'renders/{cache_key}/hls', height, fps)
+        with span("render.upload"):
+            video_url = upload_video(video_path, blob_path)
+        print(f"Uploaded video to Firebase Storage: {blob_path}")
+        if ladder is not None:
+            with span("render.hls"):
+                manifest_url = ladder.result()
+        poster_url = poster.result()
+
+    with span("render.cache_store"):
+        render_cache.store(
+            cache_key, blob_path, video_url,
+            render_time=render_time,
+            size_bytes=os.path.getsize(video_path),
+            file_name=video_file,
+            quality=quality,
+            manifest_url=manifest_url,
+            poster_url=poster_url
+        )
+
+    return {"status": "completed", "video_url": video_url, "manifest_url": manifest_url, "poster_url": poster_url,
+            "render_time": render_time, "cached": False}
+
+def save_and_render(code: str, uid: str, prompt: str = "", file_id: str = None, on_status=None,
+                    quality: str = 'fourk', preview: bool = False, on_start=None):
+    if file_id is None:
+        file_id = str(uuid.uuid4())[:8]
+
+    # The index entry has title and timestamp without downloading the code body
+    with span("render.db_read"):
+        existing = code_index.get_entry(uid, file_id)
 
     if existing:
         # Preserve original title and timestamp
@@ -31,102 +223,80 @@ def save_and_render(code: str, uid: str, prompt: str = "", file_id: str = None):
         timestamp = datetime.now().isoformat()
 
     # Store or update code in Firebase Realtime Database under user
-    code_ref.set({
-        'code': code,
-        'timestamp': timestamp,
-        'status': 'processing',
-        'title': title
-    })
+    with span("render.db_write"):
+        code_index.write_scene(uid, file_id, {
+            'code': code,
+            'timestamp': timestamp,
+            'status': 'processing',
+            'title': title
+        }, replace=True)
 
-    # Run manim render first
-    start_time = datetime.now()
+    # Fail in milliseconds on code manim could never render, instead of after spawning a render
     try:
-        result = subprocess.run(
-            ["manim", file_path, "MorphScene", "-qk"],
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-    except subprocess.CalledProcessError as e:
-        print("❌ Manim render failed.")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        code_ref.update({'status': 'failed', 'error': e.stderr})
-        return {"video_url": f"Error during rendering: {e.stderr}", "file_id": file_id}
+        with span("render.validate"):
+            scene_name = validate_scene_code(code)
+    except SceneValidationError as e:
+        code_index.write_scene(uid, file_id, {'status': 'failed', 'error': str(e), 'validation_errors': e.errors})
+        return {"video_url": f"Invalid scene code: {e}", "file_id": file_id, "status": "failed",
+                "error": str(e), "validation_errors": e.errors}
 
-    # After successful render, calculate render time
-    end_time = datetime.now()
-    render_time = (end_time - start_time).total_seconds() / 60  # in minutes (float)
+    result = _render_and_upload(code, file_id, quality, scene_name, on_status, on_start)
+    if result["status"] == "killed":
+        # A newer edit may already own the record (it cancelled this render), leave it alone then.
+        # owns_record tells the caller whether it may still update the record.
+        owns_record = db.reference(f'users/{uid}/codes/{file_id}/code').get() == code
+        if owns_record:
+            code_index.write_scene(uid, file_id, {
+                'status': 'killed', 'kill_reason': result["reason"], 'error': result["error"]
+            })
+        return {"video_url": f"Render stopped: {result['error']}", "file_id": file_id, "owns_record": owns_record,
+                **result}
+    if result["status"] != "completed":
+        code_index.write_scene(uid, file_id, {'status': 'failed', 'error': result["error"]})
+        return {"video_url": f"Error during rendering: {result['error']}", "file_id": file_id, **result}
 
-    # Now check the folder for mp4 files
-    try:
-        print(video_folder)
-        files = os.listdir(video_folder)
-        print(files)
-        mp4_files = [f for f in files if f.endswith(".mp4")]
-        if not mp4_files:
-            print("⚠️ No .mp4 files found after rendering.")
-            code_ref.update({'status': 'failed', 'error': 'No MP4 files found'})
-            return {"video_url": "", "file_id": file_id}
-        
-        video_file = mp4_files[0]  # take first mp4 found
-        video_path = f"{video_folder}/{video_file}"
-        
-        # Upload video to Firebase Storage under user
-        bucket = storage.bucket()
-        blob = bucket.blob(f'videos/{uid}/{file_id}/{video_file}')
-        
-        # Upload the file
-        blob.upload_from_filename(video_path)
-        print(f"Uploaded video to Firebase Storage: {blob.name}")
-        
-        # Make the blob publicly accessible
-        blob.make_public()
-        print(f"Blob public URL: {blob.public_url}")
-        
-        # Get the public URL
-        video_url = blob.public_url
-        
-        # Update status in database
-        code_ref.update({
+    # Update status in database
+    with span("render.db_write"):
+        code_index.write_scene(uid, file_id, {
             'status': 'completed',
-            'video_url': video_url,
-            'render_time': render_time,
+            'video_url': result["video_url"],
+            # None removes a stale manifest or poster left by an earlier render of this scene
+            'manifest_url': result["manifest_url"],
+            'poster_url': result["poster_url"],
+            'render_time': result["render_time"],
+            'quality': quality,
+            'preview': preview,
+            'cached': result["cached"],
             'title': title,
             'timestamp': timestamp
         })
 
-        # --- USAGE STATS UPDATE ---
-        usage_ref = db.reference(f'usage_stats/{uid}')
-        stats = usage_ref.get() or {
-            'totalAnimations': 0,
-            'remainingAnimations': 5,  # Default to free tier limit
-            'totalRenderTime': 0,
-            'averageRenderTime': 0,
-            'lastUpdated': datetime.now().isoformat(),
-            'account_type': 'free'
-        }
-        
-        # Update total stats
-        stats['totalAnimations'] = stats.get('totalAnimations', 0) + 1
-        stats['remainingAnimations'] = max(0, stats.get('remainingAnimations', 5) - 1)
-        stats['totalRenderTime'] = stats.get('totalRenderTime', 0) + render_time
-        stats['averageRenderTime'] = stats['totalRenderTime'] / stats['totalAnimations']
-        stats['lastUpdated'] = datetime.now().isoformat()
-        usage_ref.set(stats)
-        # --- END USAGE STATS UPDATE ---
-
-        # Clean up local files (delete video file and its parent folder)
-        try:
-            os.remove(video_path)
-            shutil.rmtree(video_folder)
-            os.remove(file_path)
-        except Exception as e:
-            print(f"Warning: Failed to clean up local files: {e}")
-        
-        return {"video_url": video_url, "file_id": file_id}
-        
-    except FileNotFoundError:
-        print("⚠️ Render folder not found.")
-        code_ref.update({'status': 'failed', 'error': 'Render folder not found'})
-        return {"video_url": "", "file_id": file_id}
\ No newline at end of file
+    with span("render.stats"):
+        usage_stats.record_render(uid, result["render_time"])
+
+    return {"video_url": result["video_url"], "manifest_url": result["manifest_url"],
+            "poster_url": result["poster_url"], "file_id": file_id, "status": "completed"}
+
+def upgrade_render(code: str, uid: str, file_id: str, quality: str, on_start=None, cache_checked: bool = False):
+    """Re-render a previewed scene at full quality and swap its video_url and manifest_url once ready"""
+    result = _render_and_upload(code, file_id, quality, validate_scene_code(code), on_start=on_start,
+                                cache_checked=cache_checked)
+    if result["status"] != "completed":
+        # Keep serving the preview, the upgrade is best effort
+        print(f"Full quality render failed for scene {file_id}: {result['error']}")
+        return {"video_url": "", "file_id": file_id, **result}
+
+    # The user may have edited the scene while we were rendering, never swap in a stale video
+    if db.reference(f'users/{uid}/codes/{file_id}/code').get() != code:
+        print(f"Scene {file_id} changed during full quality render, discarding upgrade")
+        return {"video_url": result["video_url"], "file_id": file_id, "status": "stale"}
+
+    code_index.write_scene(uid, file_id, {
+        'video_url': result["video_url"],
+        'manifest_url': result["manifest_url"],
+        'poster_url': result["poster_url"],
+        'quality': quality,
+        'preview': False
+    })
+    return {"video_url": result["video_url"], "manifest_url": result["manifest_url"],
+            "poster_url": result["poster_url"], "file_id": file_id, "status": "completed"}
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from datetime import datetime
+from firebase_admin import db
+
+ACCOUNT_LIMITS = {
+    'free': 5,
+    'plus': 25,
+    'pro': 60,
+}
+
+# How long a locally cached quota node (account type + today's usage) may be used as the
+# starting point of a conditional write. A stale entry only costs a retry, never a wrong count.
+QUOTA_CACHE_TTL_SECONDS = int(os.getenv("QUOTA_CACHE_TTL_SECONDS", 60))
+QUOTA_MAX_ATTEMPTS = 5
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _today():
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+def _quota_ref(uid: str):
+    # users/{uid}/quota = {'accountType', 'date', 'used'}: everything the check needs in one node
+    return db.reference(f'users/{uid}/quota')
+
+
+def get_limit(account_type: str):
+    return ACCOUNT_LIMITS.get(account_type, 5)
+
+
+def _load(uid: str, fresh: bool = False):
+    """The quota node and its etag, from the local cache unless stale or fresh is set"""
+    with _lock:
+        entry = _cache.get(uid)
+        if not fresh and entry is not None and time.time() - entry[2] < QUOTA_CACHE_TTL_SECONDS:
+            return entry[0], entry[1]
+
+    value, etag = _quota_ref(uid).get(etag=True)
+    value = _seed(uid, value)
+    _remember(uid, value, etag)
+    return value, etag
+
+
+def _seed(uid: str, value):
+    """Fill in users from before the quota node existed from the old locations"""
+    value = dict(value or {})
+    if 'accountType' not in value:
+        value['accountType'] = db.reference(f'users/{uid}/accountType').get() or 'free'
+    if 'date' not in value:
+        today = _today()
+        value['date'] = today
+        value['used'] = db.reference(f'users/{uid}/dailyUsage/{today}').get() or 0
+    return value
+
+
+def _remember(uid: str, value, etag):
+    with _lock:
+        _cache[uid] = (value, etag, time.time())
+
+
+def invalidate(uid: str):
+    with _lock:
+        _cache.pop(uid, None)
+
+
+def _usage_today(value):
+    return value.get('used', 0) if value.get('date') == _today() else 0
+
+
+def _update(uid: str, change):
+    """Apply change(value) -> new value or None with an etag-conditional write.
+
+    With a warm cache this is a single round trip. A concurrent request that got there
+    first makes the write fail, and the server's reply carries the current value and etag,
+    so the retry needs no extra read.
+    """
+    value, etag = _load(uid)
+    verified = False
+    for _ in range(QUOTA_MAX_ATTEMPTS):
+        new_value = change(value)
+        if new_value is None:
+            if verified:
+                return value
+            # Never refuse based on a cached copy alone, another worker may have refunded since
+            value, etag = _load(uid, fresh=True)
+            verified = True
+            new_value = change(value)
+            if new_value is None:
+                return value
+        success, current, current_etag = _quota_ref(uid).set_if_unchanged(etag, new_value)
+        if success:
+            _remember(uid, new_value, current_etag)
+            return new_value
+        value, etag = _seed(uid, current), current_etag
+        verified = True
+    invalidate(uid)
+    raise RuntimeError(f"Quota update for {uid} kept conflicting")
+
+
+def charge(uid: str, count: int = 1):
+    """Atomically count `count` generations if they all fit in the user's daily limit.
+
+    Returns (allowed, usage, limit, account_type).
+    """
+    result = {}
+
+    def change(value):
+        account_type = value.get('accountType', 'free')
+        limit = get_limit(account_type)
+        used = _usage_today(value)
+        result.update(account_type=account_type, limit=limit, usage=used, allowed=used + count <= limit)
+        if used + count > limit:
+            return None
+        result['usage'] = used + count
+        return {'accountType': account_type, 'date': _today(), 'used': used + count}
+
+    _update(uid, change)
+    return result['allowed'], result['usage'], result['limit'], result['account_type']
+
+
+def refund(uid: str, count: int = 1):
+    """Give back generations charged today"""
+    def change(value):
+        used = _usage_today(value)
+        if used == 0:
+            return None
+        return {'accountType': value.get('accountType', 'free'), 'date': _today(), 'used': max(0, used - count)}
+
+    _update(uid, change)
+
+
+def get_usage(uid: str):
+    """(account_type, usage today, limit) without writing"""
+    value, _ = _load(uid)
+    account_type = value.get('accountType', 'free')
+    return account_type, _usage_today(value), get_limit(account_type)
+
+
+def get_account_type(uid: str):
+    return get_usage(uid)[0]
+
+
+def set_account_type(uid: str, account_type: str):
+    """Keep the quota node in step with users/{uid}/accountType (Razorpay webhook, cancellation)"""
+    _quota_ref(uid).update({'accountType': account_type})
+    invalidate(uid)
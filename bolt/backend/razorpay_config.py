@@ -1,16 +1,12 @@
 import os
-import razorpay
+import time
+import asyncio
 
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
-
-# Validate Razorpay credentials
-if not RAZORPAY_KEY_ID or not RAZORPAY_KEY_SECRET:
-    raise ValueError("Razorpay credentials not found in environment variables")
-
-print(f"Initializing Razorpay with Key ID: {RAZORPAY_KEY_ID[:5]}...")
-
-razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+# How long a plan validation result is reused, and how long one may take before it counts as failed
+RAZORPAY_PLAN_CHECK_TTL = int(os.getenv("RAZORPAY_PLAN_CHECK_TTL", 60 * 60))
+RAZORPAY_PLAN_CHECK_TIMEOUT = float(os.getenv("RAZORPAY_PLAN_CHECK_TIMEOUT", 10))
 
 # Define your plans and prices (in paise, so 10000 = ₹100)
 SUBSCRIPTION_PLANS = {
@@ -28,13 +24,61 @@ SUBSCRIPTION_PLAN_IDS = {
     "pro": "plan_Qeg30w1HgpMhhZ",
 }
 
-print(f"Debug: Initialized SUBSCRIPTION_PLAN_IDS: {SUBSCRIPTION_PLAN_IDS}")
+_client = None
+# Last plan validation: {"checked_at", "valid", "error"}, and the one in flight
+_plan_check = None
+_plan_check_task = None
+
+
+def get_client():
+    """The Razorpay client, created on first use so importing the app never waits on it"""
+    global _client
+    if _client is None:
+        if not RAZORPAY_KEY_ID or not RAZORPAY_KEY_SECRET:
+            raise ValueError("Razorpay credentials not found in environment variables")
+        import razorpay
+
+        print(f"Initializing Razorpay with Key ID: {RAZORPAY_KEY_ID[:5]}...")
+        _client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+    return _client
+
 
-# Validate plan IDs
-try:
+def _fetch_plans():
+    client = get_client()
     for plan_id in SUBSCRIPTION_PLAN_IDS.values():
-        plan = razorpay_client.plan.fetch(plan_id)
+        client.plan.fetch(plan_id)
         print(f"Successfully validated plan ID: {plan_id}")
-except Exception as e:
-    print(f"Error validating Razorpay plan IDs: {str(e)}")
-    raise ValueError(f"Invalid Razorpay plan ID: {str(e)}") 
\ No newline at end of file
+
+
+async def _check_plans():
+    global _plan_check
+    try:
+        await asyncio.wait_for(asyncio.to_thread(_fetch_plans), RAZORPAY_PLAN_CHECK_TIMEOUT)
+        _plan_check = {"checked_at": time.time(), "valid": True, "error": None}
+    except asyncio.TimeoutError:
+        _plan_check = {"checked_at": time.time(), "valid": False,
+                       "error": f"Razorpay didn't answer within {RAZORPAY_PLAN_CHECK_TIMEOUT:g}s"}
+    except Exception as e:
+        _plan_check = {"checked_at": time.time(), "valid": False, "error": str(e)}
+    if not _plan_check["valid"]:
+        print(f"Error validating Razorpay plan IDs: {_plan_check['error']}")
+    return _plan_check
+
+
+async def validate_plans(force: bool = False):
+    """Check that every plan ID exists in Razorpay, reusing the result for RAZORPAY_PLAN_CHECK_TTL.
+
+    Concurrent callers share one check. Failed checks are retried on the next call.
+    """
+    global _plan_check_task
+    fresh = _plan_check and _plan_check["valid"] and time.time() - _plan_check["checked_at"] < RAZORPAY_PLAN_CHECK_TTL
+    if fresh and not force:
+        return _plan_check
+    if _plan_check_task is None or _plan_check_task.done():
+        _plan_check_task = asyncio.ensure_future(_check_plans())
+    return await asyncio.shield(_plan_check_task)
+
+
+def plan_status():
+    """The last validation result without checking again, None before the first one finished"""
+    return _plan_check
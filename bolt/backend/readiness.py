@@ -0,0 +1,71 @@
+import os
+import time
+import asyncio
+from firebase_admin import db
+import auth_cache
+import razorpay_config
+from job_queue import get_executor, MAX_CONCURRENT_RENDERS
+
+# The API answers /health as soon as it is up, and /ready once the dependencies below are warm.
+# Each probe gets READY_PROBE_TIMEOUT seconds, failed ones are retried every READY_RETRY_SECONDS.
+READY_PROBE_TIMEOUT = float(os.getenv("READY_PROBE_TIMEOUT", 30))
+READY_RETRY_SECONDS = float(os.getenv("READY_RETRY_SECONDS", 15))
+
+# Checks that must pass before the API takes traffic. Payments are reported but don't gate it.
+REQUIRED_CHECKS = ("firebase", "auth_certs", "render_workers")
+
+_checks = {}
+
+
+def _probe_firebase():
+    # A read of a node that doesn't exist: fetches the access token and opens the connection
+    db.reference('ready_probe').get()
+
+
+def _start_render_workers():
+    # The pool starts a worker (and its warm manim renderer) for each task it can't hand to an idle one
+    executor = get_executor()
+    for future in [executor.submit(os.getpid) for _ in range(MAX_CONCURRENT_RENDERS)]:
+        future.result()
+
+
+PROBES = {
+    "firebase": _probe_firebase,
+    "render_workers": _start_render_workers,
+}
+
+
+async def _run(name: str, probe):
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.to_thread(probe), READY_PROBE_TIMEOUT)
+        _checks[name] = {"ok": True, "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        print(f"Warning: Readiness check {name} failed: {error}")
+        _checks[name] = {"ok": False, "error": error}
+
+
+async def warm_up():
+    """Warm every dependency at once in the background, retrying until all of them pass"""
+    while True:
+        pending = [name for name in PROBES if not _checks.get(name, {}).get("ok")]
+        results = await asyncio.gather(
+            *(_run(name, PROBES[name]) for name in pending),
+            razorpay_config.validate_plans(),
+        )
+        if all(_checks[name]["ok"] for name in PROBES) and results[-1]["valid"]:
+            return
+        await asyncio.sleep(READY_RETRY_SECONDS)
+
+
+def status():
+    """(ready, checks) for /ready"""
+    checks = {name: dict(check) for name, check in _checks.items()}
+    checks["auth_certs"] = {"ok": auth_cache.certs_ready()}
+    plans = razorpay_config.plan_status()
+    checks["razorpay_plans"] = {"ok": bool(plans and plans["valid"]), "required": False}
+    if plans and plans["error"]:
+        checks["razorpay_plans"]["error"] = plans["error"]
+    ready = all(checks.get(name, {}).get("ok") for name in REQUIRED_CHECKS)
+    return ready, checks
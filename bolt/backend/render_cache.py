@@ -0,0 +1,106 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from importlib import metadata
+from firebase_admin import db
+import tracing
+
+# Maximum number of cache entries kept in the in-process index
+RENDER_CACHE_MAX_ENTRIES = int(os.getenv("RENDER_CACHE_MAX_ENTRIES", 1024))
+
+_index = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def _manim_version():
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+MANIM_VERSION = _manim_version()
+
+
+def normalize_source(code: str) -> str:
+    """Drop differences that can't change the rendered output (line endings, trailing whitespace)"""
+    lines = code.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n") + "\n"
+
+
+def make_key(code: str, scene_name: str, flags) -> str:
+    h = hashlib.sha256()
+    h.update(normalize_source(code).encode("utf-8"))
+    h.update(b"\0")
+    h.update(scene_name.encode("utf-8"))
+    h.update(b"\0")
+    h.update(" ".join(flags).encode("utf-8"))
+    h.update(b"\0")
+    h.update(MANIM_VERSION.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _remember(key: str, entry: dict):
+    with _lock:
+        _index[key] = entry
+        _index.move_to_end(key)
+        while len(_index) > RENDER_CACHE_MAX_ENTRIES:
+            _index.popitem(last=False)
+            _stats['evictions'] += 1
+            tracing.count_render_cache("eviction")
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+    # Hit ratios across all workers come from /metrics
+    tracing.count_render_cache("hit" if name == 'hits' else "miss")
+
+
+def peek(key: str):
+    """Return the cached render for key without counting a hit or miss"""
+    with _lock:
+        entry = _index.get(key)
+        if entry is not None:
+            _index.move_to_end(key)
+
+    if entry is None:
+        entry = db.reference(f'render_cache/{key}').get()
+        if entry:
+            _remember(key, entry)
+    return entry
+
+
+def lookup(key: str, read: bool = True):
+    """Return the cached render for key, or None.
+
+    read=False only counts a miss, for callers whose peek() for this key just found nothing.
+    """
+    entry = peek(key) if read else None
+    _count('hits' if entry else 'misses')
+    return entry
+
+
+def store(key: str, blob_path: str, video_url: str, **meta):
+    entry = {
+        'blob_path': blob_path,
+        'video_url': video_url,
+        'manim_version': MANIM_VERSION,
+        'created_at': datetime.now().isoformat(),
+        **meta,
+    }
+    db.reference(f'render_cache/{key}').set(entry)
+    _remember(key, entry)
+    return entry
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_index)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / total if total else 0.0
+    return stats
@@ -0,0 +1,254 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+# Jobs of one user that may run at the same time, the rest wait in the queue
+SCHEDULER_MAX_INFLIGHT_PER_USER = int(os.getenv("SCHEDULER_MAX_INFLIGHT_PER_USER", 2))
+# Jobs of one user that may wait in the queue before new ones are turned away
+SCHEDULER_MAX_QUEUED_PER_USER = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_USER", 5))
+# Queued jobs (all users) past which new jobs are turned away with 429, 0 means 4 per worker
+SCHEDULER_MAX_QUEUE_DEPTH = int(os.getenv("SCHEDULER_MAX_QUEUE_DEPTH", 0))
+# Queued background jobs (batch items) past which new batches are turned away, 0 means
+# 16 per worker and at least 64
+SCHEDULER_MAX_BACKGROUND_DEPTH = int(os.getenv("SCHEDULER_MAX_BACKGROUND_DEPTH", 0))
+# Starting guess for how long a job holds a worker, refined as jobs finish
+SCHEDULER_INITIAL_JOB_SECONDS = float(os.getenv("SCHEDULER_INITIAL_JOB_SECONDS", 60))
+
+
+class QueueFull(Exception):
+    """The render queue can't take this job right now, try again after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class _Job:
+    __slots__ = ("job_id", "uid", "tier", "fn", "args", "on_done", "max_inflight", "background")
+
+    def __init__(self, job_id, uid, tier, fn, args, on_done, max_inflight, background):
+        self.job_id = job_id
+        self.uid = uid
+        self.tier = tier
+        self.fn = fn
+        self.args = args
+        self.on_done = on_done
+        self.max_inflight = max_inflight
+        self.background = background
+
+    @property
+    def user_key(self):
+        # A user's background jobs are counted apart, they don't use up their interactive caps
+        return (self.uid, "background") if self.background else self.uid
+
+
+class FairScheduler:
+    """Hands jobs to a worker pool in weighted fair order instead of first come first served.
+
+    Each account type has its own queue. Whenever a worker is free the next job comes
+    from the non-empty queue that has had the least service relative to its weight
+    (stride scheduling), so with weights free=5, pro=60 a pro job waits behind roughly one
+    free job for every twelve pro jobs, while free jobs still always make progress. Users
+    already running max_inflight_per_user jobs are skipped until one of theirs finishes.
+
+    Background jobs (batch items) wait in queues of their own and only take a worker that
+    no waiting interactive job can use, so a batch fans out over idle workers without
+    holding back anyone else's jobs by more than the one it is running. They count
+    against max_background_depth instead of the interactive queue depth and caps.
+    """
+
+    def __init__(self, get_executor, slots: int, weights: dict,
+                 max_inflight_per_user: int = SCHEDULER_MAX_INFLIGHT_PER_USER,
+                 max_queued_per_user: int = SCHEDULER_MAX_QUEUED_PER_USER,
+                 max_queue_depth: int = SCHEDULER_MAX_QUEUE_DEPTH,
+                 max_background_depth: int = SCHEDULER_MAX_BACKGROUND_DEPTH):
+        self.get_executor = get_executor
+        self.slots = slots
+        self.weights = weights
+        self.max_inflight_per_user = max_inflight_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queue_depth = max_queue_depth or 4 * slots
+        self.max_background_depth = max_background_depth or max(64, 16 * slots)
+        self.job_seconds = SCHEDULER_INITIAL_JOB_SECONDS
+
+        self._queues = {tier: deque() for tier in weights}
+        self._background = {tier: deque() for tier in weights}
+        self._pass = {tier: 0.0 for tier in weights}
+        self._running = {}
+        self._running_per_user = {}
+        self._queued_per_user = {}
+        self._lock = threading.Lock()
+
+    def _tier(self, tier: str):
+        return tier if tier in self._queues else min(self.weights, key=self.weights.get)
+
+    def depth(self):
+        """Queued interactive jobs"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def background_depth(self):
+        return sum(len(queue) for queue in self._background.values())
+
+    def _check_admission(self, uid: str, per_user: bool = True, jobs: int = 1):
+        depth = self.depth()
+        if depth + jobs > self.max_queue_depth:
+            # Roughly when enough of the queue has drained to let these jobs in
+            retry_after = (depth + jobs - self.max_queue_depth) / self.slots * self.job_seconds
+            raise QueueFull("The render queue is full", max(1, math.ceil(retry_after)))
+        if per_user and self._queued_per_user.get(uid, 0) >= self.max_queued_per_user:
+            retry_after = self.job_seconds / max(1, self.max_inflight_per_user)
+            raise QueueFull(f"You already have {self.max_queued_per_user} jobs waiting",
+                            max(1, math.ceil(retry_after)))
+
+    def admit(self, uid: str, per_user: bool = True, jobs: int = 1):
+        """Raise QueueFull if jobs more jobs from uid would be turned away right now.
+
+        per_user=False only checks that all of them fit in the queue.
+        """
+        with self._lock:
+            self._check_admission(uid, per_user, jobs)
+
+    def admit_background(self, jobs: int):
+        """Raise QueueFull unless a batch of jobs background jobs fits in the background queues.
+
+        A batch is admitted as a whole, its items are then submitted with background=True.
+        """
+        with self._lock:
+            depth = self.background_depth()
+            if depth + jobs > self.max_background_depth:
+                retry_after = (depth + jobs - self.max_background_depth) / self.slots * self.job_seconds
+                raise QueueFull("The batch queue is full", max(1, math.ceil(retry_after)))
+
+    def estimated_wait(self, tier: str):
+        """Seconds a job of this tier would wait for a worker if it were queued now"""
+        with self._lock:
+            return self._estimated_wait(self._tier(tier), len(self._queues[self._tier(tier)]))
+
+    def _estimated_wait(self, tier: str, position: int):
+        if len(self._running) + self.depth() < self.slots:
+            return 0
+        # Every other queue gets served in proportion to its weight while this one
+        # works through the `position` jobs ahead of ours
+        ahead = position
+        for other, queue in self._queues.items():
+            if other != tier:
+                ahead += min(len(queue), (position + 1) * self.weights[other] / self.weights[tier])
+        return math.ceil((ahead // self.slots + 1) * self.job_seconds)
+
+    def submit(self, job_id: str, uid: str, tier: str, fn, args=(), on_done=None,
+               check: bool = True, max_inflight: int = None, background: bool = False):
+        """Queue fn(job_id, uid, *args), returning the estimated wait in seconds.
+
+        on_done(future) is called when the job finishes. Raises QueueFull instead of
+        queueing when the queue is past its depth or the user past their queued jobs,
+        unless check is False. max_inflight overrides max_inflight_per_user for this job,
+        background jobs default to every worker and are never checked (see admit_background).
+        """
+        tier = self._tier(tier)
+        with self._lock:
+            if check and not background:
+                self._check_admission(uid)
+            queue = (self._background if background else self._queues)[tier]
+            if not self._queues[tier] and not self._background[tier]:
+                # An idle tier doesn't bank credit while empty
+                busy = [self._pass[t] for t in self._queues if self._queues[t] or self._background[t]]
+                self._pass[tier] = max(self._pass[tier], min(busy)) if busy else self._pass[tier]
+            # Background jobs wait for idle workers, there is no useful estimate for them
+            wait = 0 if background else self._estimated_wait(tier, len(queue))
+            job = _Job(job_id, uid, tier, fn, args, on_done,
+                       max_inflight or (self.slots if background else self.max_inflight_per_user), background)
+            queue.append(job)
+            self._queued_per_user[job.user_key] = self._queued_per_user.get(job.user_key, 0) + 1
+        self._dispatch()
+        return wait
+
+    def cancel(self, job_id: str):
+        """Drop a job that hasn't started, True if it was still queued.
+
+        A dropped job still finishes: its on_done gets a cancelled future.
+        """
+        with self._lock:
+            job = next((job for queue in self._all_queues() for job in queue if job.job_id == job_id), None)
+            if job is None:
+                return False
+            (self._background if job.background else self._queues)[job.tier].remove(job)
+            self._unqueue(job.user_key)
+        if job.on_done:
+            future = Future()
+            future.cancel()
+            job.on_done(future)
+        return True
+
+    def is_queued(self, job_id: str):
+        with self._lock:
+            return any(job.job_id == job_id for queue in self._all_queues() for job in queue)
+
+    def _all_queues(self):
+        return [*self._queues.values(), *self._background.values()]
+
+    def _unqueue(self, user_key):
+        self._queued_per_user[user_key] -= 1
+        if not self._queued_per_user[user_key]:
+            del self._queued_per_user[user_key]
+
+    def _next_job(self):
+        # Interactive jobs first, background jobs only get workers none of them can use
+        for queues in (self._queues, self._background):
+            for tier in sorted((t for t, q in queues.items() if q), key=self._pass.get):
+                queue = queues[tier]
+                for job in queue:
+                    if self._running_per_user.get(job.user_key, 0) < job.max_inflight:
+                        queue.remove(job)
+                        self._pass[tier] += 1 / self.weights[tier]
+                        return job
+        return None
+
+    def _dispatch(self):
+        started = []
+        with self._lock:
+            while len(self._running) < self.slots:
+                job = self._next_job()
+                if job is None:
+                    break
+                self._unqueue(job.user_key)
+                self._running_per_user[job.user_key] = self._running_per_user.get(job.user_key, 0) + 1
+                self._running[job.job_id] = job
+                started.append(job)
+
+        for job in started:
+            started_at = time.monotonic()
+            try:
+                future = self.get_executor().submit(job.fn, job.job_id, job.uid, *job.args)
+            except Exception as e:
+                # Pool shut down or broken: finish the job as crashed so its slot is released
+                future = Future()
+                future.set_exception(e)
+            future.add_done_callback(lambda f, job=job, started_at=started_at: self._finished(job, f, started_at))
+
+    def _finished(self, job: _Job, future, started_at: float):
+        with self._lock:
+            self._running.pop(job.job_id, None)
+            self._running_per_user[job.user_key] -= 1
+            if not self._running_per_user[job.user_key]:
+                del self._running_per_user[job.user_key]
+            if not future.cancelled() and future.exception() is None:
+                # Moving average of how long a job holds a worker, for wait estimates
+                self.job_seconds = 0.8 * self.job_seconds + 0.2 * (time.monotonic() - started_at)
+        try:
+            if job.on_done:
+                job.on_done(future)
+        finally:
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': len(self._running),
+                'queued': {tier: len(queue) for tier, queue in self._queues.items()},
+                'background': {tier: len(queue) for tier, queue in self._background.items()},
+                'job_seconds': round(self.job_seconds, 1),
+            }
+
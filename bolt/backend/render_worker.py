@@ -0,0 +1,357 @@
+import os
+import sys
+import uuid
+import signal
+import resource
+import traceback
+import importlib.util
+import multiprocessing
+import tex_cache
+import tracing
+
+# Recycle the warm render process after this many renders or once it grows past this size,
+# so a scene that leaks memory or mutates global manim state can't poison later jobs
+RENDER_WORKER_MAX_JOBS = int(os.getenv("RENDER_WORKER_MAX_JOBS", 50))
+RENDER_WORKER_MAX_RSS_MB = int(os.getenv("RENDER_WORKER_MAX_RSS_MB", 2048))
+
+# Limits for a single render. Generated scenes can ask for an hour long run_time or redraw
+# forever, none of them may hold a core or gigabytes of RAM for longer than this.
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", 300))
+RENDER_CPU_SECONDS = int(os.getenv("RENDER_CPU_SECONDS", 600))
+RENDER_MAX_MEMORY_MB = int(os.getenv("RENDER_MAX_MEMORY_MB", 4096))
+RENDER_MAX_DURATION_SECONDS = float(os.getenv("RENDER_MAX_DURATION_SECONDS", 120))
+RENDER_MAX_FRAMES = int(os.getenv("RENDER_MAX_FRAMES", 7200))
+
+
+class RenderError(Exception):
+    pass
+
+
+class RenderKilled(RenderError):
+    """The render was stopped: a limit was hit, it timed out or its process was killed.
+
+    reason is one of timeout, cpu_limit, memory_limit, duration_limit, frame_limit or killed.
+    """
+
+    def __init__(self, reason: str, message: str):
+        self.reason = reason
+        super().__init__(message)
+
+
+def apply_rlimits(pid: int = 0):
+    """Cap address space and CPU time of a render process (pid 0 is this process)"""
+    memory = RENDER_MAX_MEMORY_MB * 1024 * 1024
+    if pid:
+        resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+        resource.prlimit(pid, resource.RLIMIT_CPU, (RENDER_CPU_SECONDS, resource.RLIM_INFINITY))
+    else:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _cpu_seconds_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _set_cpu_budget(seconds):
+    # RLIMIT_CPU counts the whole life of the process, so a warm worker moves its soft
+    # limit forward for every job (and lifts it between jobs). The hard limit stays unlimited
+    # since an unprivileged process can never raise it again.
+    soft = resource.RLIM_INFINITY if seconds is None else int(_cpu_seconds_used()) + seconds
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, resource.RLIM_INFINITY))
+
+
+def _on_cpu_limit(signum, frame):
+    raise RenderKilled("cpu_limit", f"Render used more than {RENDER_CPU_SECONDS}s of CPU time")
+
+
+def _install_scene_caps():
+    """Refuse animations that would take the scene past the duration or frame cap.
+
+    Checked for each play()/wait() once manim has computed its run time and before it renders
+    anything. That is after compile_animation_data rather than in play_internal, which a
+    frozen frame wait() never reaches.
+    """
+    from manim import Scene, config
+
+    compile_animation_data = Scene.compile_animation_data
+
+    def capped_compile_animation_data(self, *args, **kwargs):
+        result = compile_animation_data(self, *args, **kwargs)
+        total = getattr(self.renderer, "time", 0) + (getattr(self, "duration", 0) or 0)
+        if total > RENDER_MAX_DURATION_SECONDS:
+            raise RenderKilled("duration_limit", f"Scene runs longer than {RENDER_MAX_DURATION_SECONDS:g}s")
+        if total * config.frame_rate > RENDER_MAX_FRAMES:
+            raise RenderKilled("frame_limit", f"Scene needs more than {RENDER_MAX_FRAMES} frames")
+        return result
+
+    Scene.compile_animation_data = capped_compile_animation_data
+
+
+def _max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _load_scene_class(file_path: str, scene_name: str):
+    module_name = f"scene_{uuid.uuid4().hex}"
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, scene_name)
+
+
+def _scene_class_in_config(options: dict, file_path: str, scene_name: str):
+    """Load the scene inside the job's tempconfig, so config changes made at module level end with the job.
+
+    The job's own options are applied again afterwards, the scene can't override them.
+    """
+    from manim import config
+
+    scene_class = _load_scene_class(file_path, scene_name)
+    config.update(options)
+    return scene_class
+
+
+def _render_scene(file_path: str, scene_name: str, quality: str, media_dir: str, animations=None):
+    from manim import tempconfig
+
+    options = {"quality": quality, "media_dir": media_dir, "input_file": file_path}
+    if animations is not None:
+        # Only these play()/wait() calls write frames, the ones before are fast-forwarded
+        options["from_animation_number"], options["upto_animation_number"] = animations
+
+    with tempconfig(options):
+        scene = _scene_class_in_config(options, file_path, scene_name)()
+        scene.render()
+        return str(scene.renderer.file_writer.movie_file_path)
+
+
+def _count_animations(file_path: str, scene_name: str, quality: str, media_dir: str):
+    from manim import tempconfig
+
+    options = {"quality": quality, "media_dir": media_dir, "input_file": file_path, "dry_run": True}
+    with tempconfig(options):
+        scene = _scene_class_in_config(options, file_path, scene_name)(skip_animations=True)
+        run_times = []
+        play = scene.renderer.play
+
+        def timed_play(*args, **kwargs):
+            # Skipped animations still advance the renderer's clock by their run time
+            start = scene.renderer.time
+            play(*args, **kwargs)
+            run_times.append(scene.renderer.time - start)
+
+        scene.renderer.play = timed_play
+        scene.render()
+        return run_times
+
+
+def _encode_image(frame, image_format: str):
+    from io import BytesIO
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.fromarray(frame).convert("RGB").save(buffer, format=image_format, quality=80)
+    return buffer.getvalue()
+
+
+def _render_frames(file_path: str, scene_name: str, media_dir: str, count: int, width: int, image_format: str):
+    """Run the scene without writing a movie and return count stills as (time, image bytes).
+
+    Every animation is skipped to its end state, so only the sampled frames are drawn. One
+    frame is the scene's last, more are the end states of evenly spaced play()/wait() calls.
+    """
+    from manim import tempconfig
+
+    # No "quality" here: config.update sets it after pixel_width/pixel_height, overriding them
+    options = {"frame_rate": 15, "media_dir": media_dir, "input_file": file_path, "dry_run": True,
+               "pixel_width": width, "pixel_height": width * 9 // 16}
+    with tempconfig(options):
+        scene = _scene_class_in_config(options, file_path, scene_name)(skip_animations=True)
+        renderer = scene.renderer
+        captured = []
+
+        def capture():
+            renderer.update_frame(scene, ignore_skipping=True)
+            captured.append((renderer.time, renderer.get_frame().copy()))
+
+        if count > 1:
+            play = renderer.play
+
+            def sampled_play(*args, **kwargs):
+                play(*args, **kwargs)
+                capture()
+
+            renderer.play = sampled_play
+        scene.render()
+        # The final frame includes anything added after the last animation
+        if captured and captured[-1][0] == renderer.time:
+            captured.pop()
+        capture()
+
+    if len(captured) > count:
+        # Evenly spaced, always ending on the last frame
+        step = (len(captured) - 1) / (count - 1)
+        captured = [captured[round(i * step)] for i in range(count)]
+    return [(time, _encode_image(frame, image_format)) for time, frame in captured]
+
+
+_JOBS = {"render": _render_scene, "count": _count_animations, "frames": _render_frames}
+
+
+def _worker_main(conn):
+    # Own process group, so cancelling a render also kills any ffmpeg it started
+    os.setsid()
+    apply_rlimits()
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # Imported for its side effect: pay for importing manim, numpy, cairo and pango once per
+    # worker instead of once per job
+    import manim  # noqa: F401
+    _install_scene_caps()
+    # Formulas compiled by any worker on this host are reused by all of them
+    tex_cache.install()
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        kind, args = job
+        try:
+            _set_cpu_budget(RENDER_CPU_SECONDS)
+            result = _JOBS[kind](*args)
+            conn.send(("ok", result, _max_rss_mb()))
+        except RenderKilled as e:
+            conn.send(("killed", (e.reason, str(e)), _max_rss_mb()))
+        except MemoryError:
+            conn.send(("killed", ("memory_limit", f"Render needed more than {RENDER_MAX_MEMORY_MB} MB"), _max_rss_mb()))
+        except BaseException:
+            conn.send(("error", traceback.format_exc(), _max_rss_mb()))
+        finally:
+            _set_cpu_budget(None)
+
+
+class WarmRenderer:
+    """A long-lived process with manim already imported that renders one scene at a time"""
+
+    def __init__(self):
+        self._process = None
+        self._conn = None
+        self.jobs_done = 0
+
+    def start(self):
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self.jobs_done = 0
+
+    @property
+    def pid(self):
+        """Also the process group id of the render"""
+        return self._process.pid if self._process is not None else None
+
+    def kill(self):
+        """Kill the worker and everything it started, abandoning the current render"""
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.stop()
+
+    def stop(self):
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+        tracing.mark_process_dead(self._process.pid)
+        self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def render(self, file_path: str, scene_name: str, quality: str, media_dir: str = "media", on_start=None,
+               animations=None):
+        """Render scene_name from file_path and return the path of the written movie.
+
+        on_start(pgid) is called once the render is handed to the worker, killing that
+        process group cancels it. Raises RenderKilled when the render hits a limit.
+        animations=(first, last) renders only that range of play()/wait() calls, inclusive.
+        """
+        return self._run("render", (os.path.abspath(file_path), scene_name, quality, os.path.abspath(media_dir),
+                                    animations), on_start)
+
+    def count_animations(self, file_path: str, scene_name: str, quality: str, media_dir: str = "media",
+                         on_start=None):
+        """Run the scene without writing any frames and return the run time of each play()/wait() call"""
+        return self._run("count", (os.path.abspath(file_path), scene_name, quality, os.path.abspath(media_dir)),
+                         on_start)
+
+    def render_frames(self, file_path: str, scene_name: str, media_dir: str, count: int = 1, width: int = 640,
+                      image_format: str = "webp", timeout: float = RENDER_TIMEOUT_SECONDS):
+        """Stills of the scene without rendering its movie, see _render_frames"""
+        return self._run("frames", (os.path.abspath(file_path), scene_name, os.path.abspath(media_dir), count,
+                                    width, image_format), timeout=timeout)
+
+    def _run(self, kind: str, args: tuple, on_start=None, timeout: float = RENDER_TIMEOUT_SECONDS):
+        if self._process is None or not self._process.is_alive():
+            self.start()
+        if on_start:
+            on_start(self.pid)
+
+        try:
+            self._conn.send((kind, args))
+            if not self._conn.poll(timeout):
+                self.kill()
+                raise RenderKilled("timeout", f"Render took longer than {timeout:g}s")
+            status, payload, rss_mb = self._conn.recv()
+        except (EOFError, BrokenPipeError, OSError):
+            self._process.join(timeout=5)
+            exitcode = self._process.exitcode
+            self.stop()
+            if exitcode is not None and exitcode < 0:
+                # SIGKILL from a cancel or the OOM killer, SIGXCPU past the hard limit
+                raise RenderKilled("killed", f"Render process was killed by signal {-exitcode}")
+            raise RenderError("Render worker died while rendering the scene")
+
+        if status == "killed":
+            # A limit was hit mid-scene, start the next job from a clean process
+            self.stop()
+            raise RenderKilled(*payload)
+
+        self.jobs_done += 1
+        if self.jobs_done >= RENDER_WORKER_MAX_JOBS or rss_mb >= RENDER_WORKER_MAX_RSS_MB:
+            print(f"Recycling render worker after {self.jobs_done} jobs ({rss_mb:.0f} MB)")
+            self.stop()
+
+        if status != "ok":
+            raise RenderError(payload)
+        return payload
+
+
+_renderer = None
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = WarmRenderer()
+    return _renderer
+
+
+def warm_up():
+    """Start the warm renderer ahead of the first job (called by the worker pool initializer)"""
+    get_renderer().start()
@@ -0,0 +1,174 @@
+import os
+import time
+import fcntl
+import shutil
+import threading
+from contextlib import contextmanager
+import tracing
+
+# Per-scene render directories. A render holds its scene's directory exclusively, and
+# everything it writes is removed when it ends except the partial movie files of a
+# successful render, which manim reuses for the animations the next edit doesn't change.
+# Point this at a tmpfs (e.g. /dev/shm/bolt-workspaces) to keep that I/O off the disk,
+# with RENDER_WORKSPACE_MAX_BYTES sized to fit in memory.
+RENDER_WORKSPACE_DIR = os.getenv("RENDER_WORKSPACE_DIR", "render_workspaces")
+RENDER_WORKSPACE_IDLE_SECONDS = int(os.getenv("RENDER_WORKSPACE_IDLE_SECONDS", 60 * 60))
+RENDER_WORKSPACE_MAX_BYTES = int(os.getenv("RENDER_WORKSPACE_MAX_BYTES", 5 * 1024 ** 3))
+# Evict more aggressively once free space on the volume drops below this fraction
+RENDER_WORKSPACE_MIN_FREE_RATIO = float(os.getenv("RENDER_WORKSPACE_MIN_FREE_RATIO", 0.1))
+RENDER_WORKSPACE_SWEEP_INTERVAL = int(os.getenv("RENDER_WORKSPACE_SWEEP_INTERVAL", 60))
+
+LOCK_FILE = ".lock"
+PARTIAL_MOVIE_DIR = "partial_movie_files"
+
+_last_sweep = 0.0
+_janitor = None
+
+
+def workspace_path(file_id: str):
+    return os.path.join(RENDER_WORKSPACE_DIR, f"scene_{file_id}")
+
+
+@contextmanager
+def open_workspace(file_id: str):
+    """Yield the scene's workspace directory, locked against concurrent renders and eviction"""
+    path = workspace_path(file_id)
+    while True:
+        os.makedirs(path, exist_ok=True)
+        lock = open(os.path.join(path, LOCK_FILE), "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # sweep() may have evicted the workspace while we waited for the lock
+        if os.path.exists(lock.name):
+            break
+        lock.close()
+
+    with lock:
+        keep_partials = False
+        try:
+            # The lock file's mtime doubles as the last-used time for idle eviction
+            os.utime(lock.name)
+            yield path
+            keep_partials = True
+        finally:
+            _clean(path, keep_partials)
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _clean(path: str, keep_partials: bool):
+    """Remove what a render wrote: scene file, final movies, images, Tex, texts"""
+    for root, _, files in os.walk(path, topdown=False):
+        in_partials = PARTIAL_MOVIE_DIR in os.path.relpath(root, path).split(os.sep)
+        for name in files:
+            if (root == path and name == LOCK_FILE) or (in_partials and keep_partials):
+                continue
+            try:
+                os.remove(os.path.join(root, name))
+            except FileNotFoundError:
+                pass
+        if root != path:
+            try:
+                os.rmdir(root)
+            except OSError:
+                pass  # still holds partial movies
+
+
+def discard_partials(path: str):
+    """Drop the partial movie files too, for a render that failed or was killed.
+
+    manim reuses a partial movie file that already exists, and a render killed mid
+    animation can leave a truncated one behind.
+    """
+    for root, dirs, _ in os.walk(path):
+        if PARTIAL_MOVIE_DIR in dirs:
+            shutil.rmtree(os.path.join(root, PARTIAL_MOVIE_DIR), ignore_errors=True)
+            dirs.remove(PARTIAL_MOVIE_DIR)
+
+
+def _dir_size(path: str):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _try_remove(path: str):
+    """Remove a workspace unless a render currently holds it"""
+    try:
+        lock = open(os.path.join(path, LOCK_FILE), "a")
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+    with lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+
+def _under_disk_pressure():
+    usage = shutil.disk_usage(RENDER_WORKSPACE_DIR)
+    return usage.free / usage.total < RENDER_WORKSPACE_MIN_FREE_RATIO
+
+
+def sweep(force: bool = False):
+    """Evict idle workspaces, then least recently used ones until back under the disk budget.
+
+    Returns (bytes in use, workspaces) afterwards, or None if it didn't run.
+    """
+    global _last_sweep
+    now = time.time()
+    if not force and now - _last_sweep < RENDER_WORKSPACE_SWEEP_INTERVAL:
+        return None
+    _last_sweep = now
+
+    if not os.path.isdir(RENDER_WORKSPACE_DIR):
+        return 0, 0
+
+    workspaces = []
+    for name in os.listdir(RENDER_WORKSPACE_DIR):
+        path = os.path.join(RENDER_WORKSPACE_DIR, name)
+        try:
+            last_used = os.path.getmtime(os.path.join(path, LOCK_FILE))
+        except OSError:
+            last_used = 0
+        if now - last_used > RENDER_WORKSPACE_IDLE_SECONDS:
+            _try_remove(path)
+        else:
+            workspaces.append((last_used, path, _dir_size(path)))
+
+    workspaces.sort()
+    total = sum(size for _, _, size in workspaces)
+    count = len(workspaces)
+    for _, path, size in workspaces:
+        if total <= RENDER_WORKSPACE_MAX_BYTES and not _under_disk_pressure():
+            break
+        if _try_remove(path):
+            total -= size
+            count -= 1
+    return total, count
+
+
+def _janitor_loop():
+    while True:
+        try:
+            usage = sweep(force=True)
+            if usage is not None:
+                os.makedirs(RENDER_WORKSPACE_DIR, exist_ok=True)
+                tracing.set_workspace_usage(*usage, shutil.disk_usage(RENDER_WORKSPACE_DIR).free)
+        except Exception as e:
+            print(f"Render workspace sweep failed: {e}")
+        time.sleep(RENDER_WORKSPACE_SWEEP_INTERVAL)
+
+
+def start_janitor():
+    """Sweep the workspaces in the background every RENDER_WORKSPACE_SWEEP_INTERVAL seconds"""
+    global _janitor
+    if _janitor is None:
+        _janitor = threading.Thread(target=_janitor_loop, name="render-workspace-janitor", daemon=True)
+        _janitor.start()
@@ -0,0 +1,123 @@
+import ast
+
+# Top-level modules generated scenes may import. Anything else (os, subprocess, socket, ...)
+# is rejected before the code gets anywhere near a render worker.
+ALLOWED_IMPORTS = {
+    "manim", "manimlib", "numpy", "math", "cmath", "random", "itertools", "functools",
+    "operator", "collections", "typing", "dataclasses", "enum", "string", "re",
+    "decimal", "fractions", "statistics", "copy", "colour", "scipy", "__future__",
+}
+
+DISALLOWED_CALLS = {
+    "eval", "exec", "compile", "open", "__import__", "input", "breakpoint",
+    "globals", "locals", "vars", "exit", "quit",
+}
+
+# Attributes that only show up in sandbox escapes, never in a normal scene
+DISALLOWED_ATTRIBUTES = {
+    "__subclasses__", "__globals__", "__builtins__", "__code__", "__bases__", "__mro__",
+    "__getattribute__", "__dict__", "__loader__", "__spec__", "__closure__", "f_globals",
+    "f_locals", "gi_frame", "tb_frame",
+}
+
+PREFERRED_SCENE_NAME = "MorphScene"
+
+
+class SceneValidationError(ValueError):
+    """Raised when generated or submitted code can't be rendered.
+
+    errors is a list of dicts with code, message, line and col.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(
+            f"line {e['line']}: {e['message']}" if e.get('line') else e['message'] for e in errors
+        ))
+
+
+def _error(code: str, message: str, node=None):
+    return {
+        "code": code,
+        "message": message,
+        "line": getattr(node, "lineno", None),
+        "col": getattr(node, "col_offset", None),
+    }
+
+
+def _base_name(base):
+    if isinstance(base, ast.Name):
+        return base.id
+    if isinstance(base, ast.Attribute):
+        return base.attr
+    return None
+
+
+def find_scene_classes(tree):
+    """Names of classes deriving (directly or through another class in the module) from a manim Scene"""
+    scenes = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        for base in node.bases:
+            name = _base_name(base)
+            if name and (name.endswith("Scene") or name in scenes):
+                scenes.append(node.name)
+                break
+    return scenes
+
+
+def _pick_scene(tree, scenes):
+    if PREFERRED_SCENE_NAME in scenes:
+        return PREFERRED_SCENE_NAME
+    # Prefer a scene no other scene builds on, the last one defined wins
+    bases = {
+        _base_name(base)
+        for node in tree.body if isinstance(node, ast.ClassDef)
+        for base in node.bases
+    }
+    leaves = [name for name in scenes if name not in bases]
+    return (leaves or scenes)[-1]
+
+
+def validate_scene_code(code: str):
+    """Statically check scene code and return the name of the Scene class to render.
+
+    This is a fast-fail filter, not a sandbox: it catches syntax errors, missing scenes
+    and obviously unsafe imports/calls in milliseconds, before any manim process starts.
+    Raises SceneValidationError with every problem found.
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        raise SceneValidationError([{
+            "code": "SYNTAX_ERROR",
+            "message": e.msg,
+            "line": e.lineno,
+            "col": e.offset,
+        }])
+
+    errors = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] not in ALLOWED_IMPORTS:
+                    errors.append(_error("DISALLOWED_IMPORT", f"Import of '{alias.name}' is not allowed", node))
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if node.level or module.split(".")[0] not in ALLOWED_IMPORTS:
+                errors.append(_error("DISALLOWED_IMPORT", f"Import from '{module or '.'}' is not allowed", node))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in DISALLOWED_CALLS:
+            errors.append(_error("DISALLOWED_CALL", f"Call to '{node.func.id}' is not allowed", node))
+        elif isinstance(node, ast.Attribute) and node.attr in DISALLOWED_ATTRIBUTES:
+            errors.append(_error("DISALLOWED_ATTRIBUTE", f"Access to '{node.attr}' is not allowed", node))
+        elif isinstance(node, ast.Name) and node.id == "__builtins__":
+            errors.append(_error("DISALLOWED_ATTRIBUTE", "Access to '__builtins__' is not allowed", node))
+
+    scenes = find_scene_classes(tree)
+    if not scenes:
+        errors.append(_error("NO_SCENE_CLASS", "The code does not define a manim Scene subclass"))
+
+    if errors:
+        raise SceneValidationError(errors)
+    return _pick_scene(tree, scenes)
@@ -0,0 +1,118 @@
+import os
+import signal
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from tracing import span
+from render_worker import WarmRenderer, get_renderer, RenderError, RenderKilled, RENDER_TIMEOUT_SECONDS
+
+# Render long scenes in this many processes at once, each writing a disjoint range of the
+# scene's play()/wait() calls, then join the pieces with a stream copy. 0 or 1 turns it off.
+# Every job worker keeps RENDER_SPLIT_PROCESSES - 1 extra warm renderers, so size it so that
+# MAX_CONCURRENT_RENDERS * RENDER_SPLIT_PROCESSES roughly matches the cores on the host.
+RENDER_SPLIT_PROCESSES = int(os.getenv("RENDER_SPLIT_PROCESSES", 0))
+# Seconds of animation each process should get at least, shorter scenes use fewer processes
+RENDER_SPLIT_MIN_SECONDS = float(os.getenv("RENDER_SPLIT_MIN_SECONDS", 10))
+
+# The extra renderers of this job worker, started on first use and kept warm like the main one
+_helpers = []
+
+
+def enabled():
+    return RENDER_SPLIT_PROCESSES > 1
+
+
+def plan_ranges(run_times: list, processes: int, min_seconds: float = RENDER_SPLIT_MIN_SECONDS):
+    """Split animations into contiguous (first, last) ranges of about equal run time.
+
+    Returns None when the scene isn't worth splitting. Every range holds at least two
+    animations: manim reads an upper bound of 0 as "no bound".
+    """
+    total = sum(run_times)
+    parts = min(processes, int(total // min_seconds) if min_seconds > 0 else processes, len(run_times) // 2)
+    if parts < 2:
+        return None
+
+    ranges = []
+    first = 0
+    elapsed = 0.0
+    for i, run_time in enumerate(run_times):
+        elapsed += run_time
+        remaining = len(run_times) - i - 1
+        left = parts - len(ranges) - 1
+        # Close the range once it has its share of run time, leaving enough animations for the rest
+        if left and i - first >= 1 and elapsed >= total * (len(ranges) + 1) / parts and remaining >= 2 * left:
+            ranges.append((first, i))
+            first = i + 1
+    ranges.append((first, len(run_times) - 1))
+    return ranges if len(ranges) > 1 else None
+
+
+def _renderers(count: int):
+    while len(_helpers) < count - 1:
+        _helpers.append(WarmRenderer())
+    return [get_renderer()] + _helpers[:count - 1]
+
+
+def concat_movies(paths: list, output_path: str):
+    """Join movies with identical encoding settings into one, without re-encoding"""
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-c", "copy", "-movflags", "+faststart", output_path],
+            capture_output=True, text=True, timeout=RENDER_TIMEOUT_SECONDS,
+        )
+    except subprocess.TimeoutExpired:
+        raise RenderKilled("timeout", "Joining the rendered parts timed out")
+    finally:
+        os.remove(list_path)
+    if result.returncode != 0:
+        raise RenderError(f"Joining the rendered parts failed: {result.stderr}")
+    return output_path
+
+
+def render(file_path: str, scene_name: str, quality: str, media_dir: str = "media", on_start=None,
+           processes: int = RENDER_SPLIT_PROCESSES, min_seconds: float = RENDER_SPLIT_MIN_SECONDS):
+    """Render like WarmRenderer.render, splitting the scene across processes when it is long enough.
+
+    The main renderer first runs the scene without writing frames to time each animation,
+    which also trips the duration and frame caps before any real work. Its process group is
+    the one passed to on_start: killing it stops the whole render, since the other parts are
+    killed as soon as one fails.
+    """
+    main = get_renderer()
+    with span("render.split_plan"):
+        run_times = main.count_animations(file_path, scene_name, quality, media_dir, on_start=on_start)
+    ranges = plan_ranges(run_times, processes, min_seconds)
+    if ranges is None:
+        return main.render(file_path, scene_name, quality, media_dir, on_start=on_start)
+
+    renderers = _renderers(len(ranges))
+    # Separate media dirs: every part writes a movie named after the scene
+    part_dirs = [os.path.join(media_dir, f"part{i}") for i in range(len(ranges))]
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        futures = [
+            pool.submit(renderer.render, file_path, scene_name, quality, part_dir,
+                        on_start if renderer is main else None, animations)
+            for renderer, part_dir, animations in zip(renderers, part_dirs, ranges)
+        ]
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [f for f in futures if f.done() and f.exception() is not None]
+        if failed:
+            # Kill the process groups only, each part's thread cleans up its own renderer
+            for renderer, future in zip(renderers, futures):
+                if not future.done() and renderer.pid:
+                    try:
+                        os.killpg(renderer.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            wait(not_done)
+            raise failed[0].exception()
+    part_paths = [future.result() for future in futures]
+
+    print(f"Rendered {scene_name} as {len(ranges)} parts {ranges}")
+    with span("render.concat"):
+        return concat_movies(part_paths, os.path.join(media_dir, os.path.basename(part_paths[0])))
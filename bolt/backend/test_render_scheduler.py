@@ -0,0 +1,210 @@
+"""Unit tests for FairScheduler, run with `python -m pytest` from bolt/backend.
+
+Jobs run on a thread pool and block until released, so each test decides when slots free up.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from render_scheduler import FairScheduler, QueueFull
+
+TIMEOUT = 5
+
+
+class Pool:
+    """A thread pool whose jobs record their start and wait for release(job_id)"""
+
+    def __init__(self, slots: int):
+        self.executor = ThreadPoolExecutor(max_workers=slots)
+        self.started = []
+        self._gates = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def _gate(self, job_id: str):
+        with self._lock:
+            return self._gates.setdefault(job_id, threading.Event())
+
+    def job(self, job_id: str, uid: str, hold: bool = True):
+        with self._changed:
+            self.started.append(job_id)
+            self._changed.notify_all()
+        if hold:
+            assert self._gate(job_id).wait(TIMEOUT)
+
+    def release(self, job_id: str):
+        self._gate(job_id).set()
+
+    def wait_started(self, count: int):
+        with self._changed:
+            assert self._changed.wait_for(lambda: len(self.started) >= count, TIMEOUT)
+        return list(self.started)
+
+    def shutdown(self):
+        with self._lock:
+            for gate in self._gates.values():
+                gate.set()
+        self.executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def pool():
+    pool = Pool(slots=4)
+    yield pool
+    pool.shutdown()
+
+
+def make_scheduler(pool: Pool, slots: int, **options):
+    # Weights with exact reciprocals, so ties between tiers don't depend on rounding
+    options.setdefault("weights", {"free": 1, "pro": 4})
+    return FairScheduler(lambda: pool.executor, slots, **options)
+
+
+def test_tiers_are_served_in_proportion_to_their_weights(pool):
+    scheduler = make_scheduler(pool, 1, max_queue_depth=20)
+    scheduler.submit("blocker", "u0", "free", pool.job)
+    pool.wait_started(1)
+
+    # Distinct users, so only the tier weights decide the order
+    for i in range(4):
+        scheduler.submit(f"free{i}", f"f{i}", "free", pool.job, args=(False,))
+    for i in range(8):
+        scheduler.submit(f"pro{i}", f"p{i}", "pro", pool.job, args=(False,))
+    pool.release("blocker")
+    order = pool.wait_started(13)[1:]
+
+    # pro weighs four times as much as free: four pro jobs for every free one
+    assert [job_id[:-1] for job_id in order[:10]] == ["free"] + ["pro"] * 4 + ["free"] + ["pro"] * 4
+    # Within a tier jobs keep their order
+    assert [job_id for job_id in order if job_id.startswith("pro")] == [f"pro{i}" for i in range(8)]
+
+
+def test_unknown_tier_gets_the_lowest_weight(pool):
+    scheduler = make_scheduler(pool, 1)
+    scheduler.submit("blocker", "u0", "enterprise", pool.job)
+    pool.wait_started(1)
+    assert scheduler.stats()["running"] == 1
+    scheduler.submit("queued", "u1", "enterprise", pool.job)
+    assert scheduler.stats()["queued"] == {"free": 1, "pro": 0}
+
+
+def test_users_at_their_inflight_cap_are_skipped(pool):
+    scheduler = make_scheduler(pool, 3, max_inflight_per_user=1)
+    scheduler.submit("a1", "alice", "free", pool.job)
+    scheduler.submit("a2", "alice", "free", pool.job)
+    scheduler.submit("b1", "bob", "free", pool.job)
+
+    # a2 is ahead of b1 in the queue, but alice already has a job running
+    assert sorted(pool.wait_started(2)) == ["a1", "b1"]
+    assert scheduler.stats()["running"] == 2
+    assert scheduler.is_queued("a2")
+
+    pool.release("a1")
+    assert pool.wait_started(3)[-1] == "a2"
+
+
+def test_max_inflight_overrides_the_per_user_cap(pool):
+    scheduler = make_scheduler(pool, 3, max_inflight_per_user=1)
+    for i in range(3):
+        scheduler.submit(f"batch{i}", "alice", "free", pool.job, max_inflight=2)
+    assert sorted(pool.wait_started(2)) == ["batch0", "batch1"]
+    assert scheduler.is_queued("batch2")
+
+
+def test_full_queue_raises_with_retry_after(pool):
+    scheduler = make_scheduler(pool, 1, max_queue_depth=2)
+    scheduler.job_seconds = 30
+    scheduler.submit("running", "u0", "free", pool.job)
+    pool.wait_started(1)
+    scheduler.submit("q1", "u1", "free", pool.job)
+    scheduler.submit("q2", "u2", "free", pool.job)
+
+    with pytest.raises(QueueFull) as error:
+        scheduler.submit("q3", "u3", "free", pool.job)
+    # One job has to drain before there is room, one slot taking job_seconds per job
+    assert error.value.retry_after == 30
+    assert not scheduler.is_queued("q3")
+
+    with pytest.raises(QueueFull):
+        scheduler.admit("u3")
+    # Unchecked submits (admitted batch items) are always queued
+    scheduler.submit("q3", "u3", "free", pool.job, check=False)
+    assert scheduler.depth() == 3
+
+
+def test_batches_are_admitted_as_a_whole(pool):
+    scheduler = make_scheduler(pool, 2, max_queue_depth=4, max_background_depth=20)
+    scheduler.job_seconds = 10
+    # The background bound, not the interactive queue depth, limits batches
+    scheduler.admit_background(20)
+    with pytest.raises(QueueFull) as error:
+        scheduler.admit_background(21)
+    assert error.value.retry_after == 5
+
+
+def test_background_jobs_fill_idle_slots_behind_interactive_ones(pool):
+    scheduler = make_scheduler(pool, 3, max_inflight_per_user=1)
+    for i in range(5):
+        scheduler.submit(f"batch{i}", "alice", "free", pool.job, background=True)
+    # Not held to the per-user cap, the batch takes every idle slot
+    assert sorted(pool.wait_started(3)) == ["batch0", "batch1", "batch2"]
+    assert scheduler.depth() == 0 and scheduler.stats()["background"] == {"free": 2, "pro": 0}
+
+    # Interactive jobs, alice's own included, go ahead of the rest of the batch
+    scheduler.submit("bob", "bob", "free", pool.job)
+    scheduler.submit("alice", "alice", "free", pool.job)
+    pool.release("batch0")
+    pool.release("batch1")
+    assert sorted(pool.wait_started(5)[3:]) == ["alice", "bob"]
+    pool.release("batch2")
+    assert pool.wait_started(6)[-1] == "batch3"
+
+
+def test_users_past_their_queued_cap_are_turned_away(pool):
+    scheduler = make_scheduler(pool, 1, max_inflight_per_user=2, max_queued_per_user=1)
+    scheduler.job_seconds = 30
+    scheduler.submit("running", "alice", "free", pool.job)
+    pool.wait_started(1)
+    scheduler.submit("queued", "alice", "free", pool.job)
+
+    with pytest.raises(QueueFull) as error:
+        scheduler.submit("another", "alice", "free", pool.job)
+    assert error.value.retry_after == 15
+    # Other users are unaffected
+    scheduler.submit("bob", "bob", "free", pool.job)
+    # The batch check only looks at the queue depth
+    scheduler.admit("alice", per_user=False)
+
+
+def test_cancel_releases_the_queued_counts(pool):
+    scheduler = make_scheduler(pool, 1, max_queued_per_user=1)
+    finished = []
+    scheduler.submit("running", "alice", "free", pool.job)
+    pool.wait_started(1)
+    scheduler.submit("queued", "alice", "free", pool.job, on_done=finished.append)
+
+    assert scheduler.cancel("queued")
+    assert scheduler.depth() == 0
+    assert not scheduler.is_queued("queued")
+    # The dropped job still finishes, with a cancelled future
+    assert len(finished) == 1 and finished[0].cancelled()
+    # Its place in alice's queued cap is free again
+    scheduler.submit("again", "alice", "free", pool.job)
+
+    # Running or unknown jobs can't be cancelled here
+    assert not scheduler.cancel("running")
+    assert not scheduler.cancel("missing")
+
+
+def test_finished_jobs_release_their_slot(pool):
+    scheduler = make_scheduler(pool, 1, max_inflight_per_user=1)
+    done = threading.Event()
+    scheduler.submit("first", "alice", "free", pool.job)
+    scheduler.submit("second", "alice", "free", pool.job, on_done=lambda f: done.set())
+    pool.wait_started(1)
+
+    pool.release("first")
+    assert pool.wait_started(2)[-1] == "second"
+    pool.release("second")
+    assert done.wait(TIMEOUT)
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.depth() == 0
@@ -0,0 +1,254 @@
+"""Host-wide cache of compiled Tex/MathTex SVGs shared by all render workers.
+
+manim compiles every distinct formula with latex + dvisvgm into the render's own media
+folder, so the same formula is compiled again for every scene and every user. Here the
+resulting SVG is also kept under TEX_CACHE_DIR, addressed by a hash of the complete LaTeX
+document and compiler, and copied back into the render's media folder on later renders.
+
+Usage (from bolt/backend), to precompile the formulas used most in the scenes stored in the
+Realtime Database (users/*/codes):
+    python tex_cache.py warm --top 500
+Render workspaces are deleted once their render finishes, so the database is where to warm
+from; --files only reads scene files kept elsewhere, e.g. an export of the scenes.
+"""
+import os
+import ast
+import glob
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+import tempfile
+from collections import Counter
+import tracing
+
+TEX_CACHE_DIR = os.getenv("TEX_CACHE_DIR", "tex_cache")
+TEX_CACHE_MAX_BYTES = int(os.getenv("TEX_CACHE_MAX_BYTES", 1024 ** 3))
+TEX_CACHE_SWEEP_INTERVAL = int(os.getenv("TEX_CACHE_SWEEP_INTERVAL", 300))
+
+# Leftovers of writers that died between writing and renaming
+STALE_TMP_SECONDS = 60 * 60
+TEX_CLASSES = ("MathTex", "Tex", "SingleStringMathTex")
+
+_last_sweep = 0.0
+# Lookups in this process, for the warm-up report
+stats = {"hit": 0, "miss": 0}
+
+
+def make_key(expression: str, environment=None, tex_template=None):
+    from manim import config
+
+    template = tex_template or config.tex_template
+    if environment:
+        document = template.get_texcode_for_expression_in_env(expression, environment)
+    else:
+        document = template.get_texcode_for_expression(expression)
+    text = f"{template.tex_compiler}\0{template.output_format}\0{document}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str):
+    return os.path.join(TEX_CACHE_DIR, key[:2], f"{key}.svg")
+
+
+def lookup(key: str, dest: str):
+    """Copy the cached SVG to dest, False if it isn't cached"""
+    path = _cache_path(key)
+    # Copied rather than used in place, so an eviction can't pull it out from under the render
+    tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(path, tmp)
+    except FileNotFoundError:
+        return False
+    os.replace(tmp, dest)
+    try:
+        # The mtime is the last-used time for LRU eviction
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def store(key: str, svg_path: str):
+    """Add a compiled SVG. Written to a temporary name and renamed, so readers never see a partial file."""
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    try:
+        shutil.copyfile(svg_path, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Warning: Failed to store {key} in the Tex cache: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return
+    sweep()
+
+
+def sweep(force: bool = False):
+    """Evict least recently used SVGs until the cache is back under TEX_CACHE_MAX_BYTES"""
+    global _last_sweep
+    now = time.time()
+    if not force and now - _last_sweep < TEX_CACHE_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+
+    entries = []
+    for root, _, files in os.walk(TEX_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".tmp"):
+                if now - st.st_mtime > STALE_TMP_SECONDS:
+                    _remove(path)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    entries.sort()
+    for _, size, path in entries:
+        if total <= TEX_CACHE_MAX_BYTES:
+            break
+        # Another worker may be sweeping at the same time, a missing file is fine
+        _remove(path)
+        total -= size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def install():
+    """Route manim's Tex compilation through the cache, in a process that has imported manim"""
+    from pathlib import Path
+    from manim import config
+    from manim.utils import tex_file_writing
+    from manim.mobject.text import tex_mobject
+
+    compile_svg = tex_file_writing.tex_to_svg_file
+
+    def tex_to_svg_file(expression: str, environment=None, tex_template=None):
+        key = make_key(expression, environment, tex_template)
+        tex_dir = config.get_dir("tex_dir")
+        os.makedirs(tex_dir, exist_ok=True)
+        dest = os.path.join(tex_dir, f"cached_{key}.svg")
+        if lookup(key, dest):
+            stats["hit"] += 1
+            tracing.count_tex_cache("hit")
+            return Path(dest)
+
+        stats["miss"] += 1
+        tracing.count_tex_cache("miss")
+        with tracing.span("render.tex_compile"):
+            svg_path = compile_svg(expression, environment=environment, tex_template=tex_template)
+        store(key, str(svg_path))
+        return svg_path
+
+    tex_file_writing.tex_to_svg_file = tex_to_svg_file
+    # Imported by name into the Tex mobjects module, patch that reference too
+    if hasattr(tex_mobject, "tex_to_svg_file"):
+        tex_mobject.tex_to_svg_file = tex_to_svg_file
+
+
+def _call_name(node: ast.Call):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def find_formulas(code: str):
+    """(class name, strings, constant keyword arguments) of every Tex/MathTex built from literals"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    formulas = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or _call_name(node) not in TEX_CLASSES:
+            continue
+        if not node.args or not all(isinstance(a, ast.Constant) and isinstance(a.value, str) for a in node.args):
+            continue
+        if not all(kw.arg and isinstance(kw.value, ast.Constant) for kw in node.keywords):
+            continue
+        kwargs = tuple(sorted((kw.arg, kw.value.value) for kw in node.keywords))
+        formulas.append((_call_name(node), tuple(a.value for a in node.args), kwargs))
+    return formulas
+
+
+def _stored_scenes():
+    """Code of every scene in the Realtime Database"""
+    # Imported for its side effect: initializes the Firebase app
+    import firebase_config  # noqa: F401
+    from firebase_admin import db
+
+    for uid in (db.reference('users').get(shallow=True) or {}):
+        codes = db.reference(f'users/{uid}/codes').get() or {}
+        for record in codes.values():
+            if isinstance(record, dict) and record.get('code'):
+                yield record['code']
+
+
+def _files(patterns):
+    for pattern in patterns:
+        for path in glob.glob(pattern, recursive=True):
+            with open(path) as f:
+                yield f.read()
+
+
+def warm(top: int, patterns=None):
+    """Compile the `top` most used formulas into the cache"""
+    counts = Counter()
+    scenes = 0
+    for code in (_files(patterns) if patterns else _stored_scenes()):
+        scenes += 1
+        counts.update(find_formulas(code))
+    print(f"Found {len(counts)} distinct formulas in {scenes} scenes")
+
+    import manim
+    from manim import tempconfig
+
+    install()
+    failed = 0
+    workdir = tempfile.mkdtemp(prefix="tex-warm-")
+    try:
+        with tempconfig({"media_dir": workdir}):
+            for (cls_name, strings, kwargs), uses in counts.most_common(top):
+                try:
+                    getattr(manim, cls_name)(*strings, **dict(kwargs))
+                except Exception as e:
+                    failed += 1
+                    print(f"Skipping {cls_name}{strings} (used {uses}x): {e}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sweep(force=True)
+    print(f"Compiled {stats['miss']}, already cached {stats['hit']}, failed {failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="precompile the most used formulas")
+    warm_parser.add_argument("--top", type=int, default=500, help="how many of the most used formulas")
+    warm_parser.add_argument("--files", nargs="+", help="read scenes from files kept outside the render workspaces, matching these globs, instead of the database")
+    commands.add_parser("sweep", help="evict down to TEX_CACHE_MAX_BYTES now")
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        warm(args.top, args.files)
+    else:
+        sweep(force=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import os
+import time
+import random
+import shutil
+import atexit
+import tempfile
+import functools
+import contextlib
+import contextvars
+import multiprocessing
+
+# TRACING_ENABLED=0 turns spans, RTDB timing, the request log and /metrics off. Spans then
+# return a shared no-op context manager, which is all the hot paths pay.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "1").lower() not in ("0", "false", "no", "off")
+# Fraction of requests logged, slow and failed requests are always logged
+REQUEST_LOG_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_SAMPLE_RATE", 0.01))
+REQUEST_LOG_SLOW_SECONDS = float(os.getenv("REQUEST_LOG_SLOW_SECONDS", 2))
+
+# Render and LLM stages run in the job worker processes, so metrics are kept in
+# prometheus_client's multiprocess mode: every process writes to files in one directory
+# and /metrics merges them. Spawned workers inherit the directory through the environment.
+if TRACING_ENABLED:
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="bolt-metrics-")
+        atexit.register(shutil.rmtree, os.environ["PROMETHEUS_MULTIPROC_DIR"], True)
+    elif multiprocessing.parent_process() is None:
+        # Values left behind by a previous run of the server would be merged in otherwise
+        for name in os.listdir(os.environ["PROMETHEUS_MULTIPROC_DIR"]):
+            if name.endswith(".db"):
+                os.remove(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], name))
+
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+    )
+
+    # LLM calls and renders take seconds to minutes, RTDB and request handling milliseconds
+    STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+    FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    STAGE_SECONDS = Histogram(
+        "bolt_stage_seconds", "Time spent in each stage of generation and rendering",
+        ["stage"], buckets=STAGE_BUCKETS,
+    )
+    RTDB_SECONDS = Histogram(
+        "bolt_rtdb_seconds", "Realtime Database call latency",
+        ["op", "node"], buckets=FAST_BUCKETS,
+    )
+    REQUEST_SECONDS = Histogram(
+        "bolt_request_seconds", "HTTP request latency",
+        ["method", "route"], buckets=FAST_BUCKETS,
+    )
+    REQUESTS = Counter(
+        "bolt_requests_total", "HTTP requests handled",
+        ["method", "route", "status"],
+    )
+    RENDER_CACHE = Counter(
+        "bolt_render_cache_total", "Render cache hits, misses and in-process index evictions",
+        ["result"],
+    )
+    TEX_CACHE = Counter(
+        "bolt_tex_cache_total", "Tex/MathTex SVG lookups in the shared Tex cache",
+        ["result"],
+    )
+    # Set by the workspace janitor, which runs in the API process only
+    WORKSPACE_BYTES = Gauge(
+        "bolt_render_workspace_bytes", "Bytes held by render workspaces", multiprocess_mode="livemax",
+    )
+    WORKSPACES = Gauge(
+        "bolt_render_workspaces", "Render workspaces on disk", multiprocess_mode="livemax",
+    )
+    WORKSPACE_FREE_BYTES = Gauge(
+        "bolt_render_workspace_free_bytes", "Free bytes on the render workspace volume", multiprocess_mode="livemax",
+    )
+
+_timings = contextvars.ContextVar("bolt_timings", default=None)
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def _record(stage: str, elapsed: float):
+    STAGE_SECONDS.labels(stage).observe(elapsed)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0) + elapsed
+
+
+def span(stage: str):
+    """Time a stage, e.g. `with span("render.manim"):`"""
+    if not TRACING_ENABLED:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+@contextlib.contextmanager
+def collect():
+    """Gather the seconds spent per stage inside the block into the yielded dict"""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def current_timings():
+    """Stage seconds collected so far by the enclosing collect(), or None"""
+    return _timings.get()
+
+
+def _rtdb_node(path: str):
+    # Label by node type rather than full path so uids and ids don't explode the series count
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return "/"
+    if parts[0] == "users" and len(parts) > 2:
+        return f"users/{parts[2]}"
+    return parts[0]
+
+
+def _timed_rtdb(op: str, fn, path_attr: str):
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            RTDB_SECONDS.labels(op, _rtdb_node(getattr(self, path_attr, ""))).observe(elapsed)
+            timings = _timings.get()
+            if timings is not None:
+                timings["rtdb"] = timings.get("rtdb", 0) + elapsed
+    return wrapper
+
+
+def _instrument_rtdb():
+    from firebase_admin import db
+
+    # transaction() is get + set_if_unchanged underneath, those are timed individually
+    for op in ("get", "set", "set_if_unchanged", "update", "delete", "push", "get_if_changed"):
+        setattr(db.Reference, op, _timed_rtdb(op, getattr(db.Reference, op), "_pathurl"))
+    db.Query.get = _timed_rtdb("query", db.Query.get, "_pathurl")
+
+
+if TRACING_ENABLED:
+    _instrument_rtdb()
+
+
+def observe_request(method: str, route: str, status: int, elapsed: float):
+    REQUEST_SECONDS.labels(method, route).observe(elapsed)
+    REQUESTS.labels(method, route, str(status)).inc()
+    if status >= 500 or elapsed >= REQUEST_LOG_SLOW_SECONDS or random.random() < REQUEST_LOG_SAMPLE_RATE:
+        print(f"{method} {route} {status} {elapsed * 1000:.1f}ms")
+
+
+def count_render_cache(result: str):
+    """Count a render cache lookup or eviction, result is hit, miss or eviction"""
+    if TRACING_ENABLED:
+        RENDER_CACHE.labels(result).inc()
+
+
+def count_tex_cache(result: str):
+    """Count a shared Tex cache lookup, result is hit or miss"""
+    if TRACING_ENABLED:
+        TEX_CACHE.labels(result).inc()
+
+
+def mark_process_dead(pid: int):
+    """Drop the live gauge values of a process that wrote metrics and has exited"""
+    if TRACING_ENABLED:
+        multiprocess.mark_process_dead(pid)
+
+
+def set_workspace_usage(total_bytes: int, workspaces: int, free_bytes: int):
+    if TRACING_ENABLED:
+        WORKSPACE_BYTES.set(total_bytes)
+        WORKSPACES.set(workspaces)
+        WORKSPACE_FREE_BYTES.set(free_bytes)
+
+
+def render_metrics():
+    """Prometheus text exposition of all processes' metrics, and its content type"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
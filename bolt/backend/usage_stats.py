@@ -0,0 +1,130 @@
+import os
+import time
+import atexit
+import threading
+from datetime import datetime
+from firebase_admin import db
+import quota
+
+# usage_stats/{uid} holds the lifetime counters the dashboard shows. Reads are served from a
+# short-lived local copy and never write, renders add to the counters write-behind.
+USAGE_STATS_CACHE_TTL_SECONDS = int(os.getenv("USAGE_STATS_CACHE_TTL_SECONDS", 15))
+USAGE_STATS_FLUSH_SECONDS = float(os.getenv("USAGE_STATS_FLUSH_SECONDS", 5))
+
+_pending = {}
+_cache = {}
+_lock = threading.Lock()
+_flush_thread = None
+
+
+def _increment(delta):
+    # RTDB server value, applied atomically on the server so concurrent flushes never lose counts
+    return {'.sv': {'increment': delta}}
+
+
+def _plan_fields(uid: str):
+    account_type, used, limit = quota.get_usage(uid)
+    return {
+        'account_type': account_type,
+        'limit': limit,
+        'remainingAnimations': max(0, limit - used),
+    }
+
+
+def record_render(uid: str, render_time: float):
+    """Count a finished render, written with the next flush"""
+    with _lock:
+        renders, total_time = _pending.get(uid, (0, 0.0))
+        _pending[uid] = (renders + 1, total_time + render_time)
+    _start_flusher()
+
+
+def flush():
+    """Write all pending counters in one multi-path update"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+
+    now = datetime.now().isoformat()
+    updates = {}
+    for uid, (renders, total_time) in pending.items():
+        updates[f'usage_stats/{uid}/totalAnimations'] = _increment(renders)
+        updates[f'usage_stats/{uid}/totalRenderTime'] = _increment(total_time)
+        updates[f'usage_stats/{uid}/lastUpdated'] = now
+        try:
+            for key, value in _plan_fields(uid).items():
+                updates[f'usage_stats/{uid}/{key}'] = value
+        except Exception as e:
+            print(f"Warning: Failed to read quota for usage stats of {uid}: {e}")
+
+    try:
+        db.reference('/').update(updates)
+    except Exception as e:
+        print(f"Error flushing usage stats: {e}")
+        # Put the counts back, the next flush retries them
+        with _lock:
+            for uid, (renders, total_time) in pending.items():
+                more_renders, more_time = _pending.get(uid, (0, 0.0))
+                _pending[uid] = (renders + more_renders, total_time + more_time)
+        return
+
+    for uid in pending:
+        invalidate(uid)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(USAGE_STATS_FLUSH_SECONDS)
+        flush()
+
+
+def _start_flusher():
+    global _flush_thread
+    with _lock:
+        if _flush_thread is not None:
+            return
+        _flush_thread = threading.Thread(target=_flush_loop, name="usage-stats-flush", daemon=True)
+        _flush_thread.start()
+    # Render workers record counts too, don't drop them when the process exits
+    atexit.register(flush)
+
+
+def invalidate(uid: str):
+    with _lock:
+        _cache.pop(uid, None)
+
+
+def get_stats(uid: str):
+    """Dashboard view of a user's usage, computed without writing anything"""
+    with _lock:
+        entry = _cache.get(uid)
+    if entry is not None and time.time() - entry[1] < USAGE_STATS_CACHE_TTL_SECONDS:
+        stored = entry[0]
+    else:
+        stored = db.reference(f'usage_stats/{uid}').get() or {}
+        with _lock:
+            _cache[uid] = (stored, time.time())
+
+    total = stored.get('totalAnimations', 0)
+    total_time = stored.get('totalRenderTime', 0)
+    return {
+        'totalAnimations': total,
+        'totalRenderTime': total_time,
+        'averageRenderTime': total_time / total if total else 0,
+        'lastUpdated': stored.get('lastUpdated', datetime.now().isoformat()),
+        **_plan_fields(uid),
+    }
+
+
+def set_plan(uid: str, account_type: str):
+    """Reflect a plan change in the stored stats (Razorpay webhook, cancellation)"""
+    limit = quota.get_limit(account_type)
+    used = quota.get_usage(uid)[1]
+    db.reference(f'usage_stats/{uid}').update({
+        'account_type': account_type,
+        'limit': limit,
+        'remainingAnimations': max(0, limit - used),
+    })
+    invalidate(uid)
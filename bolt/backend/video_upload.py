@@ -0,0 +1,119 @@
+import os
+import uuid
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+# Resumable uploads send the file in chunks of this size, so a dropped connection
+# only costs the current chunk instead of restarting from zero (must be a multiple of 256 KiB)
+VIDEO_UPLOAD_CHUNK_SIZE = int(os.getenv("VIDEO_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+# Files at least this large are uploaded as parallel parts instead
+VIDEO_UPLOAD_PARALLEL_THRESHOLD = int(os.getenv("VIDEO_UPLOAD_PARALLEL_THRESHOLD", 64 * 1024 * 1024))
+VIDEO_UPLOAD_PARALLEL_WORKERS = int(os.getenv("VIDEO_UPLOAD_PARALLEL_WORKERS", 8))
+
+# "firebase" uploads to the Firebase Storage bucket (or a GCS emulator via STORAGE_EMULATOR_HOST),
+# "local" writes to a directory, a fake object store for local runs and benchmarks
+VIDEO_STORE = os.getenv("VIDEO_STORE", "firebase")
+VIDEO_STORE_DIR = os.getenv("VIDEO_STORE_DIR", "video_store")
+VIDEO_STORE_BASE_URL = os.getenv("VIDEO_STORE_BASE_URL", "http://localhost:8000/video_store")
+
+
+def faststart(video_path: str) -> str:
+    """Move the moov atom to the front so playback can start before the download finishes.
+
+    Remuxes with stream copy (no re-encode) in place. If ffmpeg isn't available or fails
+    the file is left as rendered.
+    """
+    root, ext = os.path.splitext(video_path)
+    out_path = f"{root}.faststart{ext}"
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path,
+             "-c", "copy", "-map", "0", "-movflags", "+faststart", out_path],
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+    except (FileNotFoundError, subprocess.CalledProcessError) as e:
+        print(f"Warning: faststart remux failed, uploading as rendered: {e}")
+        return video_path
+    os.replace(out_path, video_path)
+    return video_path
+
+
+class FirebaseVideoStore:
+    def upload(self, local_path: str, dest_path: str, content_type: str = "video/mp4") -> str:
+        # The Cloud Storage client is slow to import and only job workers upload, not at API startup
+        from firebase_admin import storage
+        from google.api_core.exceptions import PreconditionFailed
+        from google.cloud.storage import transfer_manager
+
+        bucket = storage.bucket()
+        blob = bucket.blob(dest_path, chunk_size=VIDEO_UPLOAD_CHUNK_SIZE)
+        # A download token in the object metadata makes the Firebase download URL work right away,
+        # so there is no separate make_public round trip after the upload
+        token = str(uuid.uuid4())
+        blob.metadata = {"firebaseStorageDownloadTokens": token}
+        blob.content_type = content_type
+        # Paths are content addressed, the bytes behind a URL never change
+        blob.cache_control = "public, max-age=31536000, immutable"
+
+        try:
+            if os.path.getsize(local_path) >= VIDEO_UPLOAD_PARALLEL_THRESHOLD:
+                # Multipart uploads can't take a precondition, check for an earlier identical upload first
+                if blob.exists():
+                    raise PreconditionFailed("Object already exists")
+                transfer_manager.upload_chunks_concurrently(
+                    local_path, blob,
+                    chunk_size=VIDEO_UPLOAD_CHUNK_SIZE,
+                    worker_type=transfer_manager.THREAD,
+                    max_workers=VIDEO_UPLOAD_PARALLEL_WORKERS,
+                )
+            else:
+                # if_generation_match=0 makes retries safe: the upload can only ever create the object
+                blob.upload_from_filename(local_path, if_generation_match=0)
+        except PreconditionFailed:
+            # Same content address already uploaded (e.g. by a concurrent identical render)
+            blob.reload()
+            token = (blob.metadata or {}).get("firebaseStorageDownloadTokens", "").split(",")[0]
+
+        return (
+            f"https://firebasestorage.googleapis.com/v0/b/{bucket.name}/o/"
+            f"{quote(dest_path, safe='')}?alt=media&token={token}"
+        )
+
+
+class LocalVideoStore:
+    def __init__(self, root: str = VIDEO_STORE_DIR, base_url: str = VIDEO_STORE_BASE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def upload(self, local_path: str, dest_path: str, content_type: str = "video/mp4") -> str:
+        target = os.path.join(self.root, dest_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target + ".part")
+        os.replace(target + ".part", target)
+        return f"{self.base_url}/{dest_path}"
+
+
+def get_video_store():
+    if VIDEO_STORE == "local":
+        return LocalVideoStore()
+    return FirebaseVideoStore()
+
+
+def upload_video(video_path: str, dest_path: str) -> str:
+    """Remux video_path for progressive playback and upload it, returning its public URL"""
+    video_path = faststart(video_path)
+    return get_video_store().upload(video_path, dest_path)
+
+
+def upload_files(files, workers: int = VIDEO_UPLOAD_PARALLEL_WORKERS):
+    """Upload many small files at once, e.g. HLS segments.
+
+    files is a list of (local_path, dest_path, content_type), returns their public URLs in order.
+    """
+    store = get_video_store()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files)))) as pool:
+        return list(pool.map(lambda f: store.upload(*f), files))
@@ -4,14 +4,18 @@ import Editor from 'react-simple-code-editor';
 import { highlight, languages } from 'prismjs';
 import 'prismjs/components/prism-python';
 import 'prismjs/themes/prism-tomorrow.css';
-import { Save, Loader2, AlertCircle } from 'lucide-react';
+import { Save, Loader2, AlertCircle, Image } from 'lucide-react';
 import { auth } from '../services/firebase';
-import { getCode, updateCode } from '../services/api';
+import { getCode, updateCode, previewCode } from '../services/api';
+import { PreviewFrame } from '../types';
 //import toast from 'react-hot-toast';
 
+// Frames sampled across the scene by Preview, the last one is its final frame
+const PREVIEW_FRAMES = 4;
+
 type Props = {
   sceneFileId: string | null;
-  onUpdateVideo: (videoUrl: string) => void;
+  onUpdateVideo: (videoUrl: string, manifestUrl?: string) => void;
 };
 
 export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
@@ -20,9 +24,12 @@ export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
   const [error, setError] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
   const [isEditing, setIsEditing] = useState(false);
+  const [previewing, setPreviewing] = useState(false);
+  const [previewFrames, setPreviewFrames] = useState<PreviewFrame[]>([]);
 
   useEffect(() => {
     if (!sceneFileId) return;
+    setPreviewFrames([]);
     
     const fetchCode = async () => {
       try {
@@ -48,9 +55,10 @@ export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
       setSaving(true);
       setError(null);
       console.log("Saving code:", code);
-      await updateCode(sceneFileId, code);
-      // The video URL will be updated through the API response
-      onUpdateVideo(code);  // This will trigger a re-render of the video
+      const result = await updateCode(sceneFileId, code);
+      // The video URL comes back once the render job has finished
+      onUpdateVideo(result.video_url, result.manifest_url);  // This will trigger a re-render of the video
+      setPreviewFrames([]);
 
     } catch (err) {
       setError("Failed to save changes. Please try again.");
@@ -60,6 +68,21 @@ export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
     }
   };
 
+  const handlePreview = async () => {
+    try {
+      setPreviewing(true);
+      setError(null);
+      const result = await previewCode(sceneFileId, code, PREVIEW_FRAMES);
+      setPreviewFrames(result.frames);
+    } catch (err: any) {
+      const detail = err.response?.data?.detail;
+      setError(detail?.message || "Failed to preview the code. Please try again.");
+      console.error("Error previewing code:", err);
+    } finally {
+      setPreviewing(false);
+    }
+  };
+
   //if (!sceneFileId) return null;
 
   return (
@@ -74,6 +97,24 @@ export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
           Manim Python Code
         </h2>
         <div className="flex gap-2">
+          {isEditing && (
+            <motion.button
+              whileHover={{ scale: 1.05 }}
+              whileTap={{ scale: 0.95 }}
+              onClick={handlePreview}
+              disabled={previewing || saving}
+              className={`inline-flex items-center px-4 py-2 text-sm font-medium rounded-md text-gray-700 dark:text-gray-200 bg-gray-100 dark:bg-gray-700 hover:bg-gray-200 dark:hover:bg-gray-600 transition-colors ${
+                previewing ? 'opacity-70 cursor-not-allowed' : ''
+              }`}
+            >
+              {previewing ? (
+                <Loader2 className="w-4 h-4 mr-2 animate-spin" />
+              ) : (
+                <Image className="w-4 h-4 mr-2" />
+              )}
+              Preview
+            </motion.button>
+          )}
           {isEditing ? (
             <motion.button
               whileHover={{ scale: 1.05 }}
@@ -144,9 +185,20 @@ export default function CodeEditor({ sceneFileId, onUpdateVideo }: Props) {
         )}
       </div>
 
+      {previewFrames.length > 0 && (
+        <div className="grid grid-cols-4 gap-2 mt-3">
+          {previewFrames.map((frame) => (
+            <figure key={frame.time} className="rounded overflow-hidden bg-black">
+              <img src={frame.image} alt={`Frame at ${frame.time.toFixed(1)}s`} className="w-full aspect-video object-contain" />
+              <figcaption className="text-xs text-center text-gray-400 py-1">{frame.time.toFixed(1)}s</figcaption>
+            </figure>
+          ))}
+        </div>
+      )}
+
       {isEditing && (
         <p className="text-sm text-gray-500 dark:text-gray-400 mt-2">
-          Make your changes to the code and click "Save Changes" to update the animation.
+          Click "Preview" to see stills of your changes, then "Save Changes" to render the animation.
         </p>
       )}
     </motion.div>
@@ -39,9 +39,19 @@ const HistoryPanel: React.FC<HistoryPanelProps> = ({ history, onSelect, currentI
             }`}
           >
             <div className="flex-shrink-0 mr-3">
-              <div className="w-10 h-10 rounded bg-purple-100 dark:bg-purple-900/50 flex items-center justify-center">
-                <Film className="w-5 h-5 text-purple-600 dark:text-purple-400" />
-              </div>
+              {item.poster_url ? (
+                // The poster stands in for the video, which only loads once the item is selected
+                <img
+                  src={item.poster_url}
+                  alt=""
+                  loading="lazy"
+                  className="w-16 h-9 rounded object-cover bg-black"
+                />
+              ) : (
+                <div className="w-10 h-10 rounded bg-purple-100 dark:bg-purple-900/50 flex items-center justify-center">
+                  <Film className="w-5 h-5 text-purple-600 dark:text-purple-400" />
+                </div>
+              )}
             </div>
             <div className="min-w-0 flex-1">
               <p className="text-sm font-medium text-gray-900 dark:text-gray-100 truncate">
@@ -5,14 +5,22 @@ import { getVideoUrl } from '../services/api';
 
 interface VideoPlayerProps {
   videoUrl: string | null;
+  manifestUrl?: string | null;
   prompt: string | null;
 }
 
-const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, prompt }) => {
+// Browsers with native HLS (Safari, iOS, Android) stream the adaptive ladder, the rest play the MP4
+const supportsHls = () =>
+  typeof document !== 'undefined' &&
+  document.createElement('video').canPlayType('application/vnd.apple.mpegurl') !== '';
+
+const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, manifestUrl, prompt }) => {
   if (!videoUrl) return null;
 
   const finalVideoUrl = videoUrl.startsWith("http") ? videoUrl : getVideoUrl(videoUrl);
-  console.log('Video URL:', finalVideoUrl);
+  // Download and open links always use the MP4
+  const playbackUrl = manifestUrl && supportsHls() ? manifestUrl : finalVideoUrl;
+  console.log('Video URL:', playbackUrl);
 
   if (!finalVideoUrl) {
     return (
@@ -49,8 +57,8 @@ const VideoPlayer: React.FC<VideoPlayerProps> = ({ videoUrl, prompt }) => {
       )}
       <div className="relative rounded-lg overflow-hidden bg-black aspect-video shadow-md">
         <video
-          key={finalVideoUrl}
-          src={finalVideoUrl}
+          key={playbackUrl}
+          src={playbackUrl}
           controls
           controlsList="nodownload"
           className="w-full h-full object-contain"
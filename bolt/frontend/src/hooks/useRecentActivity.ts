@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import { getDatabase, ref, onValue } from 'firebase/database';
+import { getDatabase, ref, onValue, query, orderByChild, limitToLast } from 'firebase/database';
 import { useAuth } from '../context/AuthContext';
 
 interface Activity {
@@ -8,6 +8,7 @@ interface Activity {
   date: string;
   duration: string;
   status: string;
+  poster_url?: string;
 }
 
 export const useRecentActivity = () => {
@@ -23,7 +24,12 @@ export const useRecentActivity = () => {
     }
 
     const db = getDatabase();
-    const activitiesRef = ref(db, `users/${user.uid}/codes`);
+    // The metadata index only holds listing fields, never the code bodies
+    const activitiesRef = query(
+      ref(db, `users/${user.uid}/code_index`),
+      orderByChild('timestamp'),
+      limitToLast(10)
+    );
 
     const unsubscribe = onValue(
       activitiesRef,
@@ -36,7 +42,8 @@ export const useRecentActivity = () => {
             name: code.title || 'Untitled',
             date: code.timestamp || '',
             duration: code.render_time || '0',
-            status: code.status || 'completed'
+            status: code.status || 'completed',
+            poster_url: code.poster_url
           }));
 
           // Sort by date descending
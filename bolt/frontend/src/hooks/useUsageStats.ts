@@ -12,6 +12,12 @@ interface UsageStats {
   limit?: number;
 }
 
+// averageRenderTime is derived here, the backend only keeps atomic counters
+const withDerivedStats = (data: UsageStats): UsageStats => ({
+  ...data,
+  averageRenderTime: data.totalAnimations ? (data.totalRenderTime || 0) / data.totalAnimations : 0
+});
+
 export const useUsageStats = () => {
   const { user } = useAuth();
   const [stats, setStats] = useState<UsageStats | null>(null);
@@ -29,7 +35,7 @@ export const useUsageStats = () => {
       const snapshot = await get(statsRef);
       const data = snapshot.val();
       if (data) {
-        setStats(data);
+        setStats(withDerivedStats(data));
       } else {
         const initialStats: UsageStats = {
           totalAnimations: 0,
@@ -62,7 +68,7 @@ export const useUsageStats = () => {
       (snapshot) => {
         const data = snapshot.val();
         if (data) {
-          setStats(data);
+          setStats(withDerivedStats(data));
         } else {
           // Initialize stats if they don't exist
           const initialStats: UsageStats = {
@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Toaster } from 'react-hot-toast';
 import { AnimatePresence } from 'framer-motion';
-import { generateAnimation, getCode, fetchMyCodes } from '../services/api';
+import { streamGenerateAnimation, cancelJob, getCode, fetchMyCodes } from '../services/api';
 import { GenerationResponse, HistoryItem, Status } from '../types';
 import PromptForm from '../components/PromptForm';
 import VideoPlayer from '../components/VideoPlayer';
@@ -85,6 +85,7 @@ const SparkleBackground = () => {
 const HomePage: React.FC = () => {
   const [prompt, setPrompt] = useState<string | null>(null);
   const [videoPath, setVideoPath] = useState<string | null>(null);
+  const [manifestUrl, setManifestUrl] = useState<string | null>(null);
   const [sceneFileId, setSceneFileId] = useState<string | null>(null);
   const [code, setCode] = useState<string | null>(null);
   const [status, setStatus] = useState<Status>('idle');
@@ -93,6 +94,10 @@ const HomePage: React.FC = () => {
   const [currentId, setCurrentId] = useState<string | null>(null);
   const [showUpgradePopup, setShowUpgradePopup] = useState(false);
   const [limitInfo, setLimitInfo] = useState<{ limit: number; account_type: string } | null>(null);
+  // Code as the model writes it, and the render job it was queued as
+  const [streamedCode, setStreamedCode] = useState<string | null>(null);
+  const [jobId, setJobId] = useState<string | null>(null);
+  const cancelledRef = useRef(false);
   const { user, loading } = useAuth();
 
   useEffect(() => {
@@ -110,11 +115,18 @@ const HomePage: React.FC = () => {
     setStatus('loading');
     setError(null);
     setPrompt(promptText);
+    setStreamedCode(null);
+    setJobId(null);
+    cancelledRef.current = false;
 
     try {
-      const response: GenerationResponse = await generateAnimation(promptText);
+      const response: GenerationResponse = await streamGenerateAnimation(promptText, {
+        onCode: setStreamedCode,
+        onJob: setJobId,
+      });
       if (response.video_url) {
         setVideoPath(getCacheBustedUrl(response.video_url));
+        setManifestUrl(response.manifest_url ?? null);
       }
       setSceneFileId(response.scene_file_id !== undefined ? response.scene_file_id : null);
       setCurrentId(response.scene_file_id !== undefined ? response.scene_file_id : null);
@@ -126,6 +138,10 @@ const HomePage: React.FC = () => {
       fetchMyCodes().then(setHistory);
       setStatus('success');
     } catch (err: any) {
+      if (cancelledRef.current) {
+        setStatus('idle');
+        return;
+      }
       console.error('Error:', err);
       // Check both top-level and .detail for LIMIT_REACHED
       const code = err.response?.data?.code || err.response?.data?.detail?.code;
@@ -141,12 +157,27 @@ const HomePage: React.FC = () => {
         setError('Failed to generate animation. Please try again.');
       }
       setStatus('error');
+    } finally {
+      setStreamedCode(null);
+      setJobId(null);
+    }
+  };
+
+  const handleCancel = async () => {
+    if (!jobId) return;
+    cancelledRef.current = true;
+    try {
+      await cancelJob(jobId);
+    } catch (err) {
+      cancelledRef.current = false;
+      console.error('Error cancelling job:', err);
     }
   };
 
   const handleSelectHistoryItem = async (item: HistoryItem) => {
     setPrompt(item.prompt ?? null);
     setVideoPath(getCacheBustedUrl(item.video_url));
+    setManifestUrl(item.manifest_url ?? null);
     setSceneFileId(item.scene_file_id);
     setCurrentId(item.scene_file_id);
 
@@ -160,8 +191,9 @@ const HomePage: React.FC = () => {
   };
 
   // Update video after code update, but do not refetch history
-  const handleUpdateVideo = (videoUrl: string) => {
+  const handleUpdateVideo = (videoUrl: string, manifest?: string) => {
     setVideoPath(getCacheBustedUrl(videoUrl));
+    setManifestUrl(manifest ?? null);
   };
 
   return (
@@ -176,6 +208,26 @@ const HomePage: React.FC = () => {
             <FunHomeSubheadline />
             <PromptForm onSubmit={handleGenerateAnimation} status={status} />
 
+            {status === 'loading' && (streamedCode || jobId) && (
+              <div className="mb-8">
+                {streamedCode && (
+                  <pre className="max-h-64 overflow-auto p-4 rounded-lg bg-gray-900 text-gray-100 text-sm font-mono">
+                    {streamedCode}
+                  </pre>
+                )}
+                {jobId && (
+                  <div className="flex justify-end mt-2">
+                    <button
+                      onClick={handleCancel}
+                      className="py-2 px-4 rounded-lg bg-gray-200 dark:bg-gray-800 text-gray-800 dark:text-gray-100 hover:bg-gray-300 dark:hover:bg-gray-700 transition-colors"
+                    >
+                      Cancel render
+                    </button>
+                  </div>
+                )}
+              </div>
+            )}
+
             <AnimatePresence>
               {error && (
                 <ErrorMessage
@@ -187,7 +239,7 @@ const HomePage: React.FC = () => {
 
             <div className="flex flex-col lg:flex-row gap-4">
               <div className="w-full lg:w-1/2">
-                <VideoPlayer videoUrl={videoPath} prompt={prompt} />
+                <VideoPlayer videoUrl={videoPath} manifestUrl={manifestUrl} prompt={prompt} />
               </div>
               <div className="w-full lg:w-1/2">
                 <CodeEditor
@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import { Settings, Bell, Lock, Globe, Moon, Sun, ChevronDown, Eye, EyeOff } from 'lucide-react';
 import { useTheme } from '../context/ThemeContext';
 import BackButton from '../components/BackButton';
-import { getDatabase, ref, onValue, remove, set, update } from 'firebase/database';
+import { getDatabase, ref, onValue, set, update } from 'firebase/database';
 import { useAuth } from '../context/AuthContext';
 import { getAuth, deleteUser, updatePassword, signOut } from 'firebase/auth';
 
@@ -78,8 +78,8 @@ const SettingsPage: React.FC = () => {
     setDeleteSuccess(false);
     try {
       const db = getDatabase();
-      const codesRef = ref(db, `users/${user.uid}/codes`);
-      await remove(codesRef);
+      // The listing index goes with the codes, so the history doesn't show deleted chats
+      await update(ref(db, `users/${user.uid}`), { codes: null, code_index: null });
       setDeleteSuccess(true);
     } catch (err: any) {
       setDeleteError(err.message || 'Failed to delete chats.');
@@ -95,10 +95,15 @@ const SettingsPage: React.FC = () => {
     setDeleteAccountError(null);
     setDeleteAccountSuccess(false);
     try {
-      // Delete user data from Realtime Database
+      // Delete user data from Realtime Database. Only the children the client may write are
+      // removed, the plan and quota nodes are server-owned.
       const db = getDatabase();
-      const userRef = ref(db, `users/${user.uid}`);
-      await remove(userRef);
+      await update(ref(db, `users/${user.uid}`), {
+        codes: null,
+        code_index: null,
+        animations: null,
+        settings: null,
+      });
       // Delete user from Firebase Auth
       const auth = getAuth();
       if (auth.currentUser) {
@@ -209,7 +209,17 @@ const UsagePage: React.FC = () => {
                       className="border-b border-gray-200 dark:border-gray-700 last:border-0"
                     >
                       <td className="py-4 text-gray-900 dark:text-white font-medium truncate max-w-xs">
-                        {activity.name}
+                        <div className="flex items-center gap-3">
+                          {activity.poster_url && (
+                            <img
+                              src={activity.poster_url}
+                              alt=""
+                              loading="lazy"
+                              className="w-16 h-9 rounded object-cover bg-black flex-shrink-0"
+                            />
+                          )}
+                          <span className="truncate">{activity.name}</span>
+                        </div>
                       </td>
                       <td className="py-4 text-gray-600 dark:text-gray-400">
                         {new Date(activity.date).toLocaleString()}
@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { GenerationResponse, CodeResponse } from '../types';
+import { GenerationResponse, CodeResponse, JobResponse, PreviewResponse } from '../types';
 import { getAuth } from 'firebase/auth';
 
 const API_URL = 'https://promptmotion-backend-v1.onrender.com';
@@ -50,16 +50,101 @@ api.interceptors.response.use(
   }
 );
 
-export const generateAnimation = async (prompt: string): Promise<GenerationResponse> => {
-  try {
-    const response = await api.post<GenerationResponse>('/generate', { prompt });
-    return response.data;
-  } catch (error: any) {
-    console.error('Error generating animation:', error.response?.data || error.message);
-    throw error;
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Renders run in a background worker pool, poll the job until it finishes
+export const waitForJob = async (jobId: string): Promise<JobResponse> => {
+  while (true) {
+    const response = await api.get<JobResponse>(`/jobs/${jobId}`);
+    const job = response.data;
+    if (job.status === 'done') {
+      return job;
+    }
+    if (job.status === 'failed' || job.status === 'killed') {
+      throw new Error(job.error || 'Render job failed');
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
   }
 };
 
+export const cancelJob = async (jobId: string): Promise<JobResponse> => {
+  const response = await api.post<JobResponse>(`/jobs/${jobId}/cancel`);
+  return response.data;
+};
+
+export interface StreamCallbacks {
+  onCode?: (code: string) => void;
+  onSceneClass?: (className: string) => void;
+  // The render job, once the code is done and queued. Pass it to cancelJob to stop the render.
+  onJob?: (jobId: string) => void;
+}
+
+// Errors carry the server's JSON body as error.response.data, like axios errors do
+const streamError = (message: string, status: number | undefined, data: any) =>
+  Object.assign(new Error(message), { response: { status, data } });
+
+// Streams the generated code over server-sent events, then waits for the render job
+export const streamGenerateAnimation = async (
+  prompt: string,
+  { onCode, onSceneClass, onJob }: StreamCallbacks = {}
+): Promise<GenerationResponse> => {
+  const user = getAuth().currentUser;
+  const token = user ? await user.getIdToken() : null;
+  const response = await fetch(`${API_URL}/generate/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      'Accept': 'text/event-stream',
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+    body: JSON.stringify({ prompt }),
+  });
+  if (!response.ok || !response.body) {
+    const data = await response.json().catch(() => null);
+    throw streamError(`Streaming generation failed with status ${response.status}`, response.status, data);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let code = '';
+  let done: JobResponse | null = null;
+
+  while (!done) {
+    const { value, done: streamClosed } = await reader.read();
+    if (streamClosed) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = message.match(/^event: (.*)$/m)?.[1];
+      const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] || '{}');
+      if (event === 'code') {
+        code += data.delta;
+        onCode?.(code);
+      } else if (event === 'reset') {
+        code = data.code;
+        onCode?.(code);
+      } else if (event === 'scene') {
+        onSceneClass?.(data.class_name);
+      } else if (event === 'error') {
+        throw streamError(data.message, undefined, data);
+      } else if (event === 'done') {
+        done = data;
+      }
+    }
+  }
+  if (!done) {
+    throw new Error('Stream closed before generation finished');
+  }
+
+  onJob?.(done.job_id);
+  const job = await waitForJob(done.job_id);
+  return { video_url: job.video_url || '', manifest_url: job.manifest_url, scene_file_id: job.scene_file_id };
+};
+
 export const getCode = async (sceneFileId: string): Promise<string> => {
   try {
     const response = await api.get<CodeResponse>(`/code/${sceneFileId}`);
@@ -70,9 +155,11 @@ export const getCode = async (sceneFileId: string): Promise<string> => {
   }
 };
 
-export const updateCode = async (sceneFileId: string, code: string): Promise<void> => {
+export const updateCode = async (sceneFileId: string, code: string): Promise<GenerationResponse> => {
   try {
-    await api.put(`/code/${sceneFileId}`, { code });
+    const response = await api.put<JobResponse>(`/code/${sceneFileId}`, { code });
+    const job = await waitForJob(response.data.job_id);
+    return { video_url: job.video_url || '', manifest_url: job.manifest_url, scene_file_id: job.scene_file_id };
   } catch (error: any) {
     console.error('Error updating code:', error.response?.data || error.message);
     throw error;
@@ -87,10 +174,18 @@ export const getVideoUrl = (videoPath: string): string => {
   return `${API_URL}${videoPath}`;
 };
 
+// /my-codes is paged newest first, follow next_cursor until the last page
 export const fetchMyCodes = async () => {
   try {
-    const response = await api.get('/my-codes');
-    return response.data.codes || [];
+    const codes: any[] = [];
+    let cursor: string | null = null;
+    do {
+      const response: { data: { codes?: any[]; next_cursor?: string | null } } =
+        await api.get('/my-codes', { params: { limit: 100, ...(cursor ? { cursor } : {}) } });
+      codes.push(...(response.data.codes || []));
+      cursor = response.data.next_cursor || null;
+    } while (cursor);
+    return codes;
   } catch (error: any) {
     console.error('Error fetching codes:', error.response?.data || error.message);
     return [];
@@ -126,4 +221,15 @@ export const cancelSubscription = async () => {
   }
 };
 
-export default api;
\ No newline at end of file
+export default api;
+
+// Stills of the edited code in about a second, without saving it or rendering the video
+export const previewCode = async (sceneFileId: string, code: string, frames = 1): Promise<PreviewResponse> => {
+  try {
+    const response = await api.post<PreviewResponse>(`/code/${sceneFileId}/preview`, { code, frames });
+    return response.data;
+  } catch (error: any) {
+    console.error('Error previewing code:', error.response?.data || error.message);
+    throw error;
+  }
+};
@@ -1,8 +1,32 @@
 export interface GenerationResponse {
   video_url: string;
+  manifest_url?: string;
   scene_file_id: string;
 }
 
+export type JobStatus = 'queued' | 'generating' | 'rendering' | 'uploading' | 'done' | 'failed' | 'killed';
+
+export interface JobResponse {
+  job_id: string;
+  status: JobStatus;
+  scene_file_id: string;
+  video_url?: string;
+  manifest_url?: string;
+  poster_url?: string;
+  error?: string;
+  kill_reason?: string;
+}
+
+export interface PreviewFrame {
+  time: number;
+  image: string;
+}
+
+export interface PreviewResponse {
+  frames: PreviewFrame[];
+  poster_url?: string;
+}
+
 export interface CodeResponse {
   code: string;
 }
@@ -13,6 +37,8 @@ export interface HistoryItem {
   timestamp: string;
   status: string;
   video_url: string;
+  manifest_url?: string;
+  poster_url?: string;
   prompt?: string;
   title?: string;
 }